@@ -0,0 +1,200 @@
+"""
+Measures the throughput and latency of every task route.
+
+Usage: python -m benchmark --engine memory --sizes 1000,100000 --transport both --output results.json
+
+Insert batching under bursts: python -m benchmark --routes add --requests 5000 --concurrency 64 --insert-batching both
+--write-latency 5
+
+Results are printed (or written to "--output") as JSON, so they can be compared between commits.
+"""
+# The docstring comes before the imports, as it is the description of "--help"
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from benchmark import stats
+from benchmark.latency import WriteLatency
+from benchmark.scenarios import Scenarios
+from benchmark.scenarios import seed_requests
+from benchmark.transports import HttpTransport
+from benchmark.transports import TestClientTransport
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    results = {'commit': _git_commit(),
+               'python': platform.python_version(),
+               'parameters': vars(args),
+               'runs': []}
+
+    for insert_batching in args.insert_batching:
+        for collection_size in args.sizes:
+            for payload_size in args.payload_sizes:
+                results['runs'].extend(run(args, collection_size, payload_size, insert_batching))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+def run(args, collection_size: int, payload_size: int, insert_batching: bool):
+    """ Seeds the collection and runs every route with every transport, returning one result per route """
+
+    app = _create_app(args, insert_batching) if args.url is None else None
+    transports = [_create_transport(name, app, args.url) for name in args.transports]
+    description = 'd' * payload_size
+
+    try:
+        # Seeds through the first transport, as it is the only way to reach an external server
+        for method, path, body in seed_requests(collection_size, description):
+            status_code = transports[0].request(method, path, body)
+            if status_code != 200:
+                raise RuntimeError(f'Seeding failed with status {status_code} on {method} {path}')
+
+        runs = []
+        for transport in transports:
+            scenarios = Scenarios(collection_size, description, args.page_size, args.bulk_size, transport.name)
+            for route, expected_status_code in scenarios.routes():
+                if args.routes and route not in args.routes:
+                    continue
+
+                measures = measure(transport, scenarios, route, expected_status_code, args.requests,
+                                   args.concurrency)
+                runs.append(dict({'route': route, 'transport': transport.name, 'engine': args.engine,
+                                  'collection_size': collection_size, 'payload_size': payload_size,
+                                  'insert_batching': insert_batching}, **measures))
+                print(f'{transport.name:>6} {route:>13} size={collection_size} payload={payload_size} '
+                      f'batching={"on" if insert_batching else "off"}: '
+                      f'{measures["requests_per_second"]} req/s, p99 {measures["p99_ms"]} ms', file=sys.stderr)
+        return runs
+    finally:
+        for transport in transports:
+            transport.close()
+
+
+def measure(transport, scenarios: Scenarios, route: str, expected_status_code: int, requests: int,
+            concurrency: int):
+    """ Sends "requests" requests to "route" from "concurrency" threads and summarizes their latencies """
+
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        thread_latencies = []
+        thread_errors = 0
+        for i in iter(lambda: next(counter), None):
+            if i >= requests:
+                break
+            method, path, body = scenarios.request(route, i)
+
+            start = time.perf_counter()
+            status_code = transport.request(method, path, body)
+            thread_latencies.append(time.perf_counter() - start)
+
+            thread_errors += status_code != expected_status_code
+        with lock:
+            latencies.extend(thread_latencies)
+            errors.append(thread_errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return stats.summarize(latencies, elapsed, sum(errors))
+
+
+def _create_app(args, insert_batching: bool):
+    """
+    Creates the app with the chosen storage engine and insert batching, without the cost of request logs and with
+    the simulated latency of writes
+    """
+
+    os.environ['STORAGE_ENGINE'] = args.engine
+    os.environ['INSERT_BATCH_ENABLED'] = str(insert_batching).lower()
+    from todo_list.flask_app import create_app
+    from todo_list.repositories import task_repository
+
+    app = create_app()
+    logging.getLogger(os.environ.get('LOGGER_NAME')).setLevel(args.log_level)
+    if args.write_latency:
+        task_repository.engine = WriteLatency(task_repository.engine, args.write_latency / 1000,
+                                              args.write_concurrency)
+    return app
+
+
+def _create_transport(name: str, app, url: str):
+    if name == 'client':
+        if app is None:
+            raise SystemExit('The client transport runs the app in-process, so it can not be used with --url')
+        return TestClientTransport(app)
+    return HttpTransport(app, url)
+
+
+def _git_commit():
+    """ Returns the commit being measured, if this is a git repository """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=['memory', 'mongo'], default='memory',
+                        help='storage engine of the in-process app (mongo uses the MONGO_* variables)')
+    parser.add_argument('--transport', dest='transports', choices=['client', 'http', 'both'], default='both',
+                        help='flask test client, real HTTP or both')
+    parser.add_argument('--url', help='base URL of a running app (e.g. http://localhost:5000), instead of the '
+                                      'in-process one. Its collection is emptied and seeded')
+    parser.add_argument('--sizes', type=_integers, default=[1000],
+                        help='comma separated collection sizes, e.g. 1000,100000,1000000')
+    parser.add_argument('--payload-sizes', type=_integers, default=[32],
+                        help='comma separated lengths of the task descriptions')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=1, help='threads sending requests')
+    parser.add_argument('--page-size', type=int, default=100,
+                        help='"limit" of get_all and get_by_status (0 reads the whole collection)')
+    parser.add_argument('--bulk-size', type=int, default=100, help='tasks per request of the bulk routes')
+    parser.add_argument('--routes', type=lambda value: value.split(','), help='comma separated routes to run')
+    parser.add_argument('--insert-batching', choices=['off', 'on', 'both'], default='off',
+                        help='whether the in-process app batches concurrent inserts (both compares them)')
+    parser.add_argument('--write-latency', type=float, default=0,
+                        help='milliseconds added to each write of the in-process app, as the round trip of a database')
+    parser.add_argument('--write-concurrency', type=int, default=4,
+                        help='writes served at a time when --write-latency is set, as the connections of a database')
+    parser.add_argument('--log-level', default='WARNING', help='level of the app logger during the run')
+    parser.add_argument('--output', help='file where the JSON results are written (default: stdout)')
+
+    args = parser.parse_args(argv)
+    args.transports = ['client', 'http'] if args.transports == 'both' else [args.transports]
+    args.insert_batching = {'off': [False], 'on': [True], 'both': [False, True]}[args.insert_batching]
+    if args.url is not None:
+        args.transports = ['http']
+    return args
+
+
+def _integers(value: str):
+    return [int(number) for number in value.split(',')]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import threading
+import time
+
+"""
+This module simulates the latency of a database on the in-process storage engines, so the benchmark can measure
+optimizations that save round trips (e.g. insert batching) without a database
+"""
+
+# Methods of the storage engines that write tasks
+write_methods = {'update', 'update_many', 'update_by_status', 'insert', 'insert_many', 'delete', 'delete_many',
+                 'delete_by_status'}
+
+
+class WriteLatency:
+    """
+    Wraps a storage engine so each write takes "latency" seconds more, as the round trip and journal of a write.
+
+    At most "concurrency" writes are served at a time, as by the connection pool of a database, so the writes of
+    many threads wait for each other instead of all sleeping at once.
+    """
+
+    def __init__(self, engine, latency: float, concurrency: int):
+        self.engine = engine
+        self.latency = latency
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    def __getattr__(self, name):
+        method = getattr(self.engine, name)
+        if name not in write_methods:
+            return method
+
+        def write(*args, **kwargs):
+            with self.slots:
+                time.sleep(self.latency)
+                return method(*args, **kwargs)
+
+        return write
@@ -0,0 +1,100 @@
+import random
+
+from todo_list.models.task import Task
+from todo_list.routes import urls
+
+"""
+This module defines the requests sent to each route by the benchmark.
+
+Reads and updates target the seeded tasks ("task_<number>"). Tasks created by add and add_bulk are removed again by
+delete and delete_bulk, so the collection keeps its size between runs.
+"""
+
+route_prefix = '/task'
+
+# Number of tasks sent by each seeding request
+seed_chunk_size = 10000
+
+
+def seed_requests(collection_size: int, description: str):
+    """ Yields the requests that empty the collection and then add "collection_size" tasks to it """
+
+    for status in Task.expected_status:
+        yield 'DELETE', route_prefix + urls.delete_tasks_in_bulk, {'status': status}
+
+    for start in range(0, collection_size, seed_chunk_size):
+        yield 'POST', route_prefix + urls.add_tasks_in_bulk, \
+            [_task(seeded_name(i), description, i) for i in range(start, min(start + seed_chunk_size, collection_size))]
+
+
+def seeded_name(number: int):
+    """ Returns the name of a seeded task """
+    return f'task_{number:08d}'
+
+
+class Scenarios:
+    """ Creates the request of each route for the i-th iteration of a run """
+
+    def __init__(self, collection_size: int, description: str, page_size: int, bulk_size: int, tag: str):
+        self.collection_size = collection_size
+        self.description = description
+        self.page_size = page_size
+        self.bulk_size = bulk_size
+        self.tag = tag
+        self.random = random.Random(collection_size)
+
+    def routes(self):
+        """ Returns the routes in the order they must run, with the status code each request should return """
+        return [('get_by_name', 200), ('get_by_status', 200), ('get_all', 200), ('update', 200),
+                ('update_bulk', 200), ('add', 201), ('add_bulk', 200), ('delete', 200), ('delete_bulk', 200)]
+
+    def request(self, route: str, i: int):
+        """ Returns the (method, path, body) of the i-th request to "route" """
+        return getattr(self, route)(i)
+
+    def get_by_name(self, i):
+        return 'GET', route_prefix + urls.get_task_by_name + '/' + self._seeded_name(), None
+
+    def get_by_status(self, i):
+        status = Task.expected_status[i % len(Task.expected_status)]
+        return 'GET', route_prefix + urls.get_task_by_status + '/' + status + self._page(), None
+
+    def get_all(self, i):
+        return 'GET', route_prefix + urls.get_all_tasks + self._page(), None
+
+    def update(self, i):
+        name = self._seeded_name()
+        return 'PUT', route_prefix + urls.update_task + '/' + name, _task(name, self.description, i)
+
+    def update_bulk(self, i):
+        names = [self._seeded_name() for _ in range(self.bulk_size)]
+        return 'PUT', route_prefix + urls.update_tasks_in_bulk, \
+            [{'task_name': name, 'task': _task(name, self.description, i)} for name in set(names)]
+
+    def add(self, i):
+        return 'POST', route_prefix + urls.add_task, _task(self._added_name(i), self.description, i)
+
+    def add_bulk(self, i):
+        return 'POST', route_prefix + urls.add_tasks_in_bulk, \
+            [_task(self._added_name(i, j), self.description, j) for j in range(self.bulk_size)]
+
+    def delete(self, i):
+        return 'DELETE', route_prefix + urls.delete_task + '/' + self._added_name(i), None
+
+    def delete_bulk(self, i):
+        return 'DELETE', route_prefix + urls.delete_tasks_in_bulk, \
+            [self._added_name(i, j) for j in range(self.bulk_size)]
+
+    def _seeded_name(self):
+        return seeded_name(self.random.randrange(self.collection_size)) if self.collection_size else 'task_missing'
+
+    def _added_name(self, i, j=None):
+        return f'{self.tag}_added_{i}' if j is None else f'{self.tag}_bulk_{i}_{j}'
+
+    def _page(self):
+        return f'?limit={self.page_size}' if self.page_size else ''
+
+
+def _task(name: str, description: str, number: int):
+    """ Returns the payload of a task """
+    return {'name': name, 'description': description, 'status': Task.expected_status[number % 3]}
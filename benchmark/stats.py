@@ -0,0 +1,40 @@
+import resource
+import sys
+
+"""
+This module summarizes the measures taken by the benchmark
+"""
+
+
+def percentile(sorted_values: list, fraction: float):
+    """ Returns the value below which "fraction" of the (sorted) values fall, using the nearest rank """
+
+    if not sorted_values:
+        return None
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: list, elapsed: float, errors: int):
+    """ Returns the requests/sec and the p50, p95 and p99 latencies (in milliseconds) of a run """
+
+    latencies = sorted(latencies)
+    return {'requests': len(latencies),
+            'errors': errors,
+            'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+            'p50_ms': _milliseconds(percentile(latencies, 0.50)),
+            'p95_ms': _milliseconds(percentile(latencies, 0.95)),
+            'p99_ms': _milliseconds(percentile(latencies, 0.99)),
+            'peak_rss_kib': peak_rss_kib()}
+
+
+def peak_rss_kib():
+    """ Returns the peak resident set size of this process (it includes the app when it runs in-process) """
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes while Linux reports kibibytes
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
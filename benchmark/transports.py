@@ -0,0 +1,83 @@
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit
+from werkzeug.serving import WSGIRequestHandler
+from werkzeug.serving import make_server
+
+"""
+This module sends the benchmark requests, through flask's test client or over real HTTP
+"""
+
+
+class TestClientTransport:
+    """ Calls the app in-process through flask's test client, measuring the app without any network """
+
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, body=None, content_type: str = 'application/json'):
+        """ Sends a request and returns its status code, reading the whole body """
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        response = self.local.client.open(path, method=method, data=_encode(body), content_type=content_type)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """
+    Sends requests over HTTP (one keep-alive connection per thread).
+
+    If no "url" is informed, the app is served in a background thread by werkzeug's threaded server.
+    """
+
+    name = 'http'
+
+    def __init__(self, app=None, url: str = None):
+        self.server = None
+        if url is None:
+            self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{self.server.server_port}'
+
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, body=None, content_type: str = 'application/json'):
+        """ Sends a request and returns its status code, reading the whole body """
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection(self.host, self.port)
+
+        headers = {'Content-Type': content_type} if body is not None else {}
+        self.local.connection.request(method, self.prefix + path, body=_encode(body), headers=headers)
+        response = self.local.connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """ Serves requests without logging each one, which would dominate the measured latency """
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _encode(body):
+    """ Returns the bytes of a request body: lists and dicts as JSON, strings as they are """
+    if body is None or isinstance(body, (bytes, str)):
+        return body
+    return json.dumps(body)
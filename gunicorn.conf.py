@@ -0,0 +1,21 @@
+"""
+Settings of gunicorn, read from the working directory when the server starts (e.g. "gunicorn flaskr:app"). Other
+settings can still be set by the command line or by "GUNICORN_CMD_ARGS".
+
+The app is created once by the master and workers are forked with it, so they start at once. MongoDb clients are
+not fork-safe, so each worker forgets the ones created by the master and creates its own on first use: the modules of
+the clients (todo_list.dbs) reset them after every fork.
+
+Each worker also keeps its own limits of admission control, so they are shared between the workers once they start.
+"""
+
+# Creates the app before forking the workers
+preload_app = True
+
+
+def post_worker_init(worker):
+    """ Shares the limits of admission control between the workers (see routes.admission.configure_workers) """
+    from todo_list.routes import admission
+
+    # The sync worker handles one request at a time. With threads, gunicorn uses the gthread worker instead
+    admission.configure_workers(worker.cfg.workers, worker.cfg.worker_class_str != 'sync')
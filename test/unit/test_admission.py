@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from test.unit import test_utils
+from todo_list.flask_app import create_app
+from todo_list.monitoring import metrics
+from todo_list.routes import admission
+from todo_list.routes.admission import AsyncConcurrencyLimiter
+from todo_list.routes.admission import ConcurrencyLimiter
+from todo_list.routes.admission import RateLimiter
+from todo_list.services import task_messages
+
+
+class TestAdmission(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the admission control of task requests
+    """
+
+    def test_limiter_queue(self):
+        """
+        It should admit up to the limit, queue the next requests until a slot is freed and shed the ones over the queue
+        """
+
+        limiter = ConcurrencyLimiter('test_route', limit=1, queue_size=1, queue_timeout=5)
+        self.assertIsNone(limiter.acquire())
+
+        results = []
+        queued = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        queued.start()
+        while limiter.waiting == 0:
+            pass
+
+        self.assertEqual(limiter.acquire(), 'queue_full')
+        limiter.release()
+        queued.join(5)
+        self.assertEqual(results, [None])
+        self.assertEqual(limiter.active, 1)
+
+        limiter.queue_timeout = 0.01
+        self.assertEqual(limiter.acquire(), 'queue_timeout')
+
+    def test_async_limiter(self):
+        """
+        It should hand the freed slots over to the queued coroutines, even when one of them was cancelled
+        """
+
+        async def acquire():
+            limiter = AsyncConcurrencyLimiter('test_route', limit=1, queue_size=2, queue_timeout=5)
+            await limiter.acquire()
+            cancelled = asyncio.ensure_future(limiter.acquire())
+            queued = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            limiter.release()
+            return await queued, limiter.active
+
+        self.assertEqual(asyncio.run(acquire()), (None, 1))
+
+    def test_async_limiter_timeout_after_handover(self):
+        """
+        It should admit a queued coroutine whose wait timed out after the freed slot was handed over to it
+        """
+
+        async def wait_for(waiter, timeout):
+            # As asyncio.wait_for of Python 3.12+ may do, the timeout is raised after the waiter got its result
+            await waiter
+            raise asyncio.TimeoutError
+
+        async def acquire():
+            limiter = AsyncConcurrencyLimiter('test_route', limit=1, queue_size=1, queue_timeout=5)
+            await limiter.acquire()
+            queued = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            limiter.release()
+            return await queued, limiter.active
+
+        with patch.object(admission.asyncio, 'wait_for', wait_for):
+            self.assertEqual(asyncio.run(acquire()), (None, 1))
+
+    def test_rate_limiter(self):
+        """
+        It should allow bursts of requests of a client and tell how long it should wait when it is over its rate
+        """
+
+        limiter = RateLimiter(rate=1, burst=2, max_clients=10)
+
+        self.assertEqual([limiter.take('client') for _ in range(2)], [0, 0])
+        self.assertGreater(limiter.take('client'), 0.9)
+        self.assertEqual(limiter.take('other_client'), 0)
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    @patch('todo_list.repositories.task_repository.version', return_value=(1, None))
+    @patch('todo_list.repositories.task_repository.prepare')
+    def test_shed_request(self, mocked_prepare, mocked_version, mocked_get_by_name):
+        """
+        It should answer 503 with "Retry-After" when the route is saturated, without reaching the repository
+        """
+
+        mocked_get_by_name.return_value = test_utils.task_with_valid_body
+        with patch.dict(os.environ, {'ADMISSION_ENABLED': 'true', 'ADMISSION_LIMITS': 'get_by_name=1',
+                                     'ADMISSION_QUEUE_SIZE': '0', 'ADMISSION_RETRY_AFTER': '2'}):
+            test_client = create_app().test_client()
+        self.addCleanup(admission.configure, False)
+
+        # The slot is freed once the response is sent, i.e. closed by the server
+        response = test_client.get('/task/get_by_name/test_name')
+        self.assertEqual(admission.limiters['get_by_name'].active, 1)
+        response.close()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(admission.limiters['get_by_name'].active, 0)
+
+        # Another request holds the only slot of the route
+        admission.limiters['get_by_name'].acquire()
+        response = test_client.get('/task/get_by_name/test_name')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+        self.assertEqual(response.get_json()['Message'], task_messages.overloaded)
+        self.assertEqual(mocked_get_by_name.call_count, 1)
+        self.assertIn('todo_list_admission_rejected_total{route="get_by_name",reason="queue_full"}', metrics.render())
+
+    def test_configure_workers(self):
+        """
+        It should share the limits and rates between the workers, disabling the limits on workers without concurrency
+        """
+
+        admission.configure(True, {'get_all': 8}, new_default_limit=2)
+        admission.configure_rate_limit(8, 4)
+        self.addCleanup(admission.configure, False)
+        self.addCleanup(admission.configure_rate_limit, 0)
+        self.addCleanup(admission.configure_workers, 1)
+
+        admission.configure_workers(4)
+        self.assertEqual(admission._limiter('get_all').limit, 2)
+        self.assertEqual(admission._limiter('get_by_name').limit, 1)
+        self.assertEqual((admission.rate_limiter.rate, admission.rate_limiter.burst), (2, 1))
+
+        with self.assertLogs(admission.logger, 'WARNING'):
+            admission.configure_workers(4, concurrent=False)
+        self.assertIsNone(admission._limiter('get_all'))
+        self.assertIsNotNone(admission.rate_limiter)
@@ -0,0 +1,175 @@
+import asyncio
+import importlib.util
+import json
+import os
+from datetime import datetime
+from datetime import timezone
+from unittest import skipUnless
+from unittest.mock import patch
+
+from test.unit import test_task_route
+from test.unit import test_utils
+from todo_list.flask_app import create_app
+from todo_list.repositories import idempotency_keys
+from todo_list.repositories import task_repository
+from todo_list.repositories.engines.async_engine import AsyncEngine
+from todo_list.repositories.idempotency_keys import MemoryKeyStore
+
+# Functions of async_task_repository, which are replaced by ones calling (the mocked) task_repository
+repository_functions = ['ensure_indexes', 'configure_events', 'is_registered', 'get_by_name', 'get_by_status', 'get_all',
+                        'search', 'export', 'count_by_status', 'version', 'watch', 'update',
+                        'update_many', 'update_by_status', 'insert', 'insert_many', 'upsert_many', 'delete',
+                        'delete_many', 'delete_by_status']
+
+
+@skipUnless(importlib.util.find_spec('quart'), 'quart is not installed')
+class TestAsyncTaskRoute(test_task_route.TestTaskRoute):
+    """
+    This class runs the tests of task's routes against the async stack
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        from todo_list.repositories import async_task_repository
+
+        # Makes async repository use the mocks of the sync one
+        for name in repository_functions:
+            repository_patcher = patch.object(async_task_repository, name, new=_call_task_repository(name))
+            repository_patcher.start()
+            self.addCleanup(repository_patcher.stop)
+
+        # Avoids reaching MongoDb when reading the version of the tasks
+        self.version = (7, datetime(2019, 5, 1, 12, 30, tzinfo=timezone.utc))
+        version_patcher = patch.object(task_repository, 'version', return_value=self.version)
+        version_patcher.start()
+        self.addCleanup(version_patcher.stop)
+
+        # Avoids reaching MongoDb when preparing it on the first request
+        for name in ['ensure_indexes', 'configure_events']:
+            prepare_patcher = patch.object(task_repository, name)
+            prepare_patcher.start()
+            self.addCleanup(prepare_patcher.stop)
+
+        next_page_token_patcher = patch.object(async_task_repository, 'next_page_token',
+                                               new=lambda t: task_repository.next_page_token(t))
+        next_page_token_patcher.start()
+        self.addCleanup(next_page_token_patcher.stop)
+
+        # Creates quart app
+        with patch.dict(os.environ, {'APP_STACK': 'async'}):
+            self.app = create_app()
+        self.app.testing = True
+
+        # Keeps the responses to idempotency keys in memory instead of MongoDb
+        self.key_store = MemoryKeyStore(100, 60)
+        idempotency_keys.configure(AsyncEngine(self.key_store))
+        self.addCleanup(idempotency_keys.configure, None)
+
+        # Gets quart "test_client" with the interface of flask's one
+        self.test_client = SyncTestClient(self.app.test_client())
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_import_over_max_content_length(self, mocked_task_repository_insert_many):
+        """
+        It should import bodies larger than MAX_CONTENT_LENGTH, which still bounds the bodies of other routes
+        """
+
+        mocked_task_repository_insert_many.return_value = []
+        self.app.config['MAX_CONTENT_LENGTH'] = 1000
+        body = '\n'.join(json.dumps(dict(test_utils.task_with_valid_body, name=str(i))) for i in range(100))
+
+        response = self.test_client.post(test_task_route.import_route, data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['Created'], 100)
+
+        response = self.test_client.post(test_task_route.add_bulk_route,
+                                         json=[dict(test_utils.task_with_valid_body, name=str(i)) for i in range(100)])
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_import_over_max_import_content_length(self):
+        """
+        It should return 413 if the body of an import is larger than MAX_IMPORT_CONTENT_LENGTH
+        """
+
+        from todo_list.routes import async_requests
+
+        body = '\n'.join(json.dumps(dict(test_utils.task_with_valid_body, name=str(i))) for i in range(100))
+
+        with patch.object(async_requests, 'max_import_content_length', 1000):
+            response = self.test_client.post(test_task_route.import_route, data=body,
+                                             content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 413)
+
+
+def _call_task_repository(name):
+    """ Returns a coroutine function that calls the function "name" of task_repository """
+
+    async def call(*args, **kwargs):
+        result = getattr(task_repository, name)(*args, **kwargs)
+        if name in ('get_all', 'get_by_status', 'search', 'export', 'watch'):
+            return AsyncCursor(result)
+        return result
+
+    return call
+
+
+class AsyncCursor:
+    """ Iterates asynchronously over a list, as MongoDb asyncio cursors """
+
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class SyncTestClient:
+    """ Wraps quart's test client with the (synchronous) interface of flask's one """
+
+    def __init__(self, test_client):
+        self.test_client = test_client
+
+    def open(self, path, method, content_type=None, **kwargs):
+        if content_type is not None:
+            kwargs['headers'] = dict(kwargs.get('headers', {}), **{'Content-Type': content_type})
+        return SyncResponse(asyncio.run(self.test_client.open(path, method=method, **kwargs)))
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, 'PUT', **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+
+
+class SyncResponse:
+    """ Wraps quart's response with the (synchronous) interface of flask's one """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.mimetype = response.mimetype
+
+    def get_json(self):
+        return asyncio.run(self.response.get_json())
+
+    def get_data(self, as_text=False):
+        return asyncio.run(self.response.get_data(as_text=as_text))
@@ -0,0 +1,60 @@
+from datetime import datetime
+from datetime import timezone
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from pymongo.errors import DuplicateKeyError
+
+from todo_list.repositories import idempotency_keys
+from todo_list.repositories.idempotency_keys import MemoryKeyStore
+from todo_list.repositories.idempotency_keys import MongoKeyStore
+
+
+class TestIdempotencyKeys(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the stores of the responses by idempotency key
+    """
+
+    def test_memory_claim(self):
+        """
+        It should return the record of the first request to a key until it expires, or until it is released
+        """
+
+        store = MemoryKeyStore(max_size=2, ttl=60)
+
+        self.assertIsNone(store.claim('first', 'request'))
+        self.assertEqual(store.claim('first', 'request'), {'fingerprint': 'request', 'status': None, 'body': None})
+        store.save('first', 201, b'{}')
+        self.assertEqual(store.claim('first', 'other')['status'], 201)
+
+        self.assertIsNone(store.claim('second', 'request'))
+        store.release('second')
+        self.assertIsNone(store.claim('second', 'request'))
+
+        # A claim never saved (e.g. of a worker that died) is claimable after "claim_timeout"
+        with patch.object(idempotency_keys, 'claim_timeout', 0):
+            self.assertIsNone(store.claim('second', 'request'))
+
+        # The oldest key is evicted when the store is full
+        store.claim('third', 'request')
+        self.assertIsNone(store.claim('first', 'request'))
+
+    def test_mongo_claim(self):
+        """
+        It should claim a key by upserting it and return the record of the previous request when the key is taken
+        """
+
+        tasks = MagicMock()
+        keys = tasks.database.__getitem__.return_value
+        store = MongoKeyStore(tasks, ttl=60)
+
+        self.assertIsNone(store.claim('test_key', 'request'))
+        query = keys.update_one.call_args[0][0]
+        self.assertEqual(query['_id'], 'test_key')
+        self.assertLess(query['$or'][0]['created']['$lt'], datetime.now(timezone.utc))
+        keys.create_index.assert_called_once()
+
+        keys.update_one.side_effect = DuplicateKeyError('E11000')
+        keys.find_one.return_value = {'fingerprint': 'request', 'status': 201, 'body': b'{}'}
+        self.assertEqual(store.claim('test_key', 'request')['status'], 201)
+        keys.create_index.assert_called_once()
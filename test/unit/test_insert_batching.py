@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from todo_list.models.task import Task
+from todo_list.repositories.errors import DuplicatedTaskError
+from todo_list.repositories.insert_batching import AsyncInsertBatcher
+from todo_list.repositories.insert_batching import InsertBatcher
+
+
+class TestInsertBatching(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the batching of concurrent inserts
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        # The second task of every batch has a registered name
+        self.insert_many = MagicMock(return_value=[1])
+        self.tasks = [Task(f'task_{i}', 'test_description', 'to_do') for i in range(4)]
+
+    def test_insert_full_batches(self):
+        """
+        It should write the tasks inserted by concurrent threads in full batches, failing only the duplicated ones
+        """
+
+        batcher = InsertBatcher(self.insert_many, max_size=2, max_delay=10)
+        results = {}
+
+        def insert(task):
+            try:
+                results[task.name] = batcher.insert(task)
+            except DuplicatedTaskError as error:
+                results[task.name] = error
+
+        threads = [threading.Thread(target=insert, args=(task,)) for task in self.tasks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.insert_many.call_count, 2)
+        self.assertEqual(sum(isinstance(result, DuplicatedTaskError) for result in results.values()), 2)
+        self.assertEqual(len(results), 4)
+
+    def test_insert_after_max_delay(self):
+        """
+        It should write a batch that is not full once its first task waited "max_delay" seconds
+        """
+
+        batcher = InsertBatcher(self.insert_many, max_size=100, max_delay=0.01)
+
+        batcher.insert(self.tasks[0])
+
+        self.insert_many.assert_called_once_with([self.tasks[0]])
+
+    def test_insert_async(self):
+        """
+        It should write the tasks inserted by concurrent coroutines with a single write, even if one is cancelled
+        """
+
+        async def insert_many(tasks_to_insert):
+            return self.insert_many(tasks_to_insert)
+
+        async def insert():
+            batcher = AsyncInsertBatcher(insert_many, max_size=100, max_delay=0.01)
+            inserts = [asyncio.ensure_future(batcher.insert(task)) for task in self.tasks[:3]]
+            await asyncio.sleep(0)
+            inserts[2].cancel()
+            return await asyncio.gather(*inserts, return_exceptions=True)
+
+        results = asyncio.run(insert())
+
+        self.insert_many.assert_called_once_with(self.tasks[:3])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], DuplicatedTaskError)
+        self.assertIsInstance(results[2], asyncio.CancelledError)
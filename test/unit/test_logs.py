@@ -0,0 +1,48 @@
+import json
+import logging
+from unittest import TestCase
+
+from todo_list.monitoring import logs
+
+
+class TestLogs(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the application logs
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        self.record = logging.LogRecord('logger', logging.INFO, 'task_service.py', 10, 'Looking for "%s"',
+                                        ('test_name',), None, 'get_by_name')
+
+    def test_json_formatter(self):
+        """
+        It should format a record as a JSON object with its interpolated message
+        """
+
+        log = json.loads(logs.JsonFormatter().format(self.record))
+
+        self.assertEqual(log['level'], 'INFO')
+        self.assertEqual(log['message'], 'Looking for "test_name"')
+        self.assertEqual(log['function'], 'get_by_name')
+
+    def test_sample_filter(self):
+        """
+        It should drop the records of requests to routes whose logs are not kept
+        """
+
+        logs.sample_rates = logs.parse_sample_rates('get_by_name=0, get_all=1')
+        self.addCleanup(setattr, logs, 'sample_rates', {})
+        sample_filter = logs.SampleFilter()
+
+        logs._sample('task.get_all')
+        self.assertTrue(sample_filter.filter(self.record))
+
+        logs._sample('task.get_by_name')
+        self.assertFalse(sample_filter.filter(self.record))
+
+        logs._sample(None)
+        self.assertTrue(sample_filter.filter(self.record))
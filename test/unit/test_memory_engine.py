@@ -0,0 +1,158 @@
+from unittest import TestCase
+
+from test.unit import test_utils
+from todo_list.models.task import Task
+from todo_list.repositories.engines.memory_engine import MemoryEngine
+from todo_list.repositories.errors import DuplicatedTaskError
+
+
+class TestMemoryEngine(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the in-memory storage engine
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        self.engine = MemoryEngine()
+        for name, status in [('c', 'to_do'), ('a', 'doing'), ('b', 'to_do'), ('d', 'done')]:
+            self.engine.insert(Task(name, 'test_description', status))
+
+    def test_count_by_status(self):
+        """
+        It should return the number of tasks of each status
+        """
+
+        self.engine.delete('d')
+
+        self.assertEqual(self.engine.count_by_status(), {'to_do': 2, 'doing': 1})
+
+    def test_get_by_name(self):
+        """
+        It should return the task with the informed name or None
+        """
+
+        self.assertEqual(self.engine.get_by_name('a'), {'name': 'a', 'description': 'test_description',
+                                                        'status': 'doing'})
+        self.assertIsNone(self.engine.get_by_name('i_dont_exist'))
+
+    def test_get_all_pages(self):
+        """
+        It should return pages of tasks ordered by name
+        """
+
+        self.assertEqual([t['name'] for t in self.engine.get_all(None, None)], ['a', 'b', 'c', 'd'])
+        self.assertEqual([t['name'] for t in self.engine.get_all(2, None)], ['a', 'b'])
+        self.assertEqual([t['name'] for t in self.engine.get_all(2, 'b')], ['c', 'd'])
+
+    def test_get_by_status(self):
+        """
+        It should return only tasks with matching status, ordered by name
+        """
+
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('to_do', None, None)], ['b', 'c'])
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('to_do', 1, 'b')], ['c'])
+        self.assertEqual(self.engine.get_by_status('invalid', None, None), [])
+
+    def test_search_by_prefix(self):
+        """
+        It should return pages of the tasks whose names start with the prefix, ordered by name
+        """
+
+        for name in ['ab', 'abc', 'b_other']:
+            self.engine.insert(Task(name, 'test_description', 'to_do'))
+
+        self.assertEqual([t['name'] for t in self.engine.search_by_prefix('a', None, None)], ['a', 'ab', 'abc'])
+        self.assertEqual([t['name'] for t in self.engine.search_by_prefix('ab', 1, 'ab')], ['abc'])
+        self.assertEqual(self.engine.search_by_prefix('z', None, None), [])
+
+    def test_search_text(self):
+        """
+        It should return the tasks with any of the words, the most relevant first, and forget the changed words
+        """
+
+        self.engine.insert(Task('buy_milk', 'Buy milk and some bread', 'to_do'))
+        self.engine.insert(Task('bread', 'Bake bread', 'to_do'))
+        self.engine.insert(Task('call', 'Ask bakery for bread', 'doing'))
+
+        self.assertEqual([t['name'] for t in self.engine.search_text(['bread'], None, None, 0)],
+                         ['bread', 'call', 'buy_milk'])
+        self.assertEqual([t['name'] for t in self.engine.search_text(['bread', 'milk'], 'b', 1, 1)], ['buy_milk'])
+
+        self.engine.update('bread', Task('bread', 'Bake a cake', 'to_do'))
+        self.engine.delete('call')
+        self.assertEqual([t['name'] for t in self.engine.search_text(['bake'], None, None, 0)], ['bread'])
+        self.assertNotIn('bakery', self.engine._names_by_word)
+
+    def test_insert_duplicated(self):
+        """
+        It should raise DuplicatedTaskError if there is a task with the same name
+        """
+
+        with self.assertRaises(DuplicatedTaskError):
+            self.engine.insert(Task('a', 'test_description', 'to_do'))
+
+        self.assertEqual(self.engine.insert_many([Task('e', 'test_description', 'to_do'),
+                                                  Task('a', 'test_description', 'to_do')]), [1])
+        self.assertTrue(self.engine.is_registered('e'))
+
+    def test_upsert_many(self):
+        """
+        It should insert the new tasks and replace the registered ones, moving them to the list of their new status
+        """
+
+        self.assertEqual(self.engine.upsert_many([Task('a', 'new_description', 'done'),
+                                                  Task('e', 'test_description', 'to_do'),
+                                                  Task('b', 'test_description', 'to_do')]), ([1], 2, []))
+
+        self.assertEqual(self.engine.get_by_name('a')['description'], 'new_description')
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('done', None, None)], ['a', 'd'])
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('to_do', None, None)], ['b', 'c', 'e'])
+
+    def test_update_moves_status(self):
+        """
+        It should move a renamed task to the list of its new status
+        """
+
+        self.assertTrue(self.engine.update('a', Task(**test_utils.task_with_valid_body)))
+
+        self.assertFalse(self.engine.is_registered('a'))
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('to_do', None, None)], ['b', 'c', 'test_name'])
+        self.assertEqual(self.engine.get_by_status('doing', None, None), [])
+
+    def test_update_not_found_or_duplicated(self):
+        """
+        It should return False if the task does not exist and raise DuplicatedTaskError on a registered name
+        """
+
+        self.assertFalse(self.engine.update('i_dont_exist', Task('a', 'test_description', 'to_do')))
+
+        with self.assertRaises(DuplicatedTaskError):
+            self.engine.update('a', Task('b', 'test_description', 'to_do'))
+
+        self.assertEqual(self.engine.update_many([('a', Task('b', 'test_description', 'to_do')),
+                                                  ('c', Task('c', 'new_description', 'to_do')),
+                                                  ('d', Task('d', 'test_description', 'done'))]), (2, 1, [0]))
+
+    def test_update_by_status(self):
+        """
+        It should set the values on all tasks with the status
+        """
+
+        self.assertEqual(self.engine.update_by_status('to_do', {'status': 'done'}), (2, 2))
+
+        self.assertEqual([t['name'] for t in self.engine.get_by_status('done', None, None)], ['b', 'c', 'd'])
+
+    def test_delete(self):
+        """
+        It should delete tasks by name and by status
+        """
+
+        self.assertTrue(self.engine.delete('a'))
+        self.assertFalse(self.engine.delete('a'))
+        self.assertEqual(self.engine.delete_many(['b', 'i_dont_exist']), 1)
+        self.assertEqual(self.engine.delete_by_status('to_do'), 1)
+
+        self.assertEqual([t['name'] for t in self.engine.get_all(None, None)], ['d'])
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from todo_list.monitoring import instrumentation
+from todo_list.monitoring import metrics
+
+
+class TestMetrics(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the metrics served on "/metrics"
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        # Starts without metrics and without sharing them with other processes
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        self.addCleanup(metrics.configure, None)
+
+    def test_render_histogram(self):
+        """
+        It should render cumulative buckets, the sum and the count of histograms
+        """
+
+        for value in [0.0002, 0.003, 20]:
+            metrics.registry.observe('todo_list_repository_call_duration_seconds', (('function', 'insert'),), value)
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn('# TYPE todo_list_repository_call_duration_seconds histogram', lines)
+        self.assertIn('todo_list_repository_call_duration_seconds_bucket{function="insert",le="0.0005"} 1', lines)
+        self.assertIn('todo_list_repository_call_duration_seconds_bucket{function="insert",le="0.005"} 2', lines)
+        self.assertIn('todo_list_repository_call_duration_seconds_bucket{function="insert",le="+Inf"} 3', lines)
+        self.assertIn('todo_list_repository_call_duration_seconds_count{function="insert"} 3', lines)
+
+    def test_render_adds_up_processes(self):
+        """
+        It should add up the metrics of all processes, ignoring the gauges of processes that are not running
+        """
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        metrics.configure(directory.name, 60)
+
+        labels = (('address', 'db:27017'),)
+        metrics.registry.increment('todo_list_mongo_pool_cleared_total', labels)
+        metrics.registry.add('todo_list_mongo_pool_connections', labels, 2)
+
+        other_process = metrics.Metrics()
+        other_process.increment('todo_list_mongo_pool_cleared_total', labels, 2)
+        other_process.add('todo_list_mongo_pool_connections', labels, 5)
+        with open(os.path.join(directory.name, 'metrics_999999999.json'), 'w') as metrics_file:
+            json.dump(other_process.snapshot(), metrics_file)
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn('todo_list_mongo_pool_cleared_total{address="db:27017"} 3', lines)
+        self.assertIn('todo_list_mongo_pool_connections{address="db:27017"} 2', lines)
+
+    def test_timed_reads(self):
+        """
+        It should record the latency of a function that returns an iterable once the iterable is read
+        """
+
+        @instrumentation.timed_reads
+        def get_all():
+            return iter([{'name': 'test_name'}])
+
+        tasks = get_all()
+        self.assertEqual(metrics.registry.histograms, {})
+
+        self.assertEqual(list(tasks), [{'name': 'test_name'}])
+        key = ('todo_list_repository_call_duration_seconds', (('function', 'get_all'), ('outcome', 'ok')))
+        self.assertEqual(sum(metrics.registry.histograms[key][:-1]), 1)
@@ -0,0 +1,74 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from todo_list.dbs import mongo
+from todo_list.flask_app import create_app
+from todo_list.monitoring import instrumentation
+
+
+class TestMongo(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the MongoDb client of each process
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        # Starts without the client of other tests
+        mongo.reset()
+        self.addCleanup(mongo.reset)
+
+    def test_created_on_first_use(self):
+        """
+        It should not create the client when the app is created, only when the tasks are first used
+        """
+
+        with patch.object(mongo, 'MongoClient') as mocked_mongo_client:
+            create_app()
+            self.assertFalse(mocked_mongo_client.called)
+
+            mongo.tasks.find_one({'name': 'test_name'})
+            mongo.tasks.find_one({'name': 'test_name'})
+
+        self.assertEqual(mocked_mongo_client.call_count, 1)
+
+    def test_recreated_after_reset(self):
+        """
+        It should create another client after a fork forgets the one of the parent process
+        """
+
+        with patch.object(mongo, 'MongoClient') as mocked_mongo_client:
+            mongo.get_client()
+            mongo.reset()
+            mongo.get_client()
+
+        self.assertEqual(mocked_mongo_client.call_count, 2)
+
+    def test_client_options(self):
+        """
+        It should set the options of the client from the environment, keeping the defaults of the unset ones
+        """
+
+        with patch.dict(os.environ, {'MONGO_MAX_POOL_SIZE': '20', 'MONGO_COMPRESSORS': 'zlib',
+                                     'MONGO_WRITE_CONCERN': 'majority', 'MONGO_JOURNAL': 'true',
+                                     'MONGO_SOCKET_TIMEOUT_MS': ''}):
+            options = mongo.client_options()
+
+        self.assertEqual(options['maxPoolSize'], 20)
+        self.assertEqual(options['compressors'], 'zlib')
+        self.assertEqual(options['w'], 'majority')
+        self.assertTrue(options['journal'])
+        self.assertNotIn('socketTimeoutMS', options)
+
+    def test_client_options_without_pool_events(self):
+        """
+        It should not register the listener of the pools when pymongo does not report their events
+        """
+
+        self.assertIsInstance(mongo.client_options()['event_listeners'][0], instrumentation.PoolListener)
+
+        with patch.object(instrumentation, 'pool_events_supported', False):
+            self.assertNotIn('event_listeners', mongo.client_options())
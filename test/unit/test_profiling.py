@@ -0,0 +1,140 @@
+import asyncio
+import importlib.util
+import marshal
+import os
+from unittest import TestCase
+from unittest import skipUnless
+from unittest.mock import patch
+
+from test.unit import test_utils
+from todo_list.flask_app import create_app
+from todo_list.monitoring import profiling
+from todo_list.services import task_messages
+
+
+class TestProfiling(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the profiles of requests served on "/profiles"
+    """
+
+    def setUp(self):
+        with patch.dict(os.environ, {'PROFILING_ENABLED': 'true', 'PROFILING_TOKEN': 'test_token',
+                                     'PROFILING_BUFFER_SIZE': '2', 'PROFILING_TOP_SIZE': '5'}):
+            self.test_client = create_app().test_client()
+        self.addCleanup(profiling.configure, False)
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    @patch('todo_list.repositories.task_repository.version', return_value=(1, None))
+    @patch('todo_list.repositories.task_repository.prepare')
+    def test_profile_request(self, mocked_prepare, mocked_version, mocked_get_by_name):
+        """
+        It should profile the requests with the header, keeping their top functions and the split of their time
+        """
+
+        mocked_get_by_name.return_value = test_utils.task_with_valid_body
+
+        # The profile is kept once the response is sent, i.e. closed by the server
+        response = self.test_client.get('/task/get_by_name/test_name', headers={'X-Profile': 'test_token'})
+        response.close()
+        profile_id = response.headers['X-Profile-Id']
+
+        profiles = self.test_client.get('/profiles', headers={'X-Profile': 'test_token'}).get_json()
+        self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+        self.assertEqual(profiles[0]['route'], 'get_by_name')
+        self.assertEqual(profiles[0]['status'], 200)
+        self.assertEqual(len(profiles[0]['top']), 5)
+        self.assertEqual(set(profiles[0]['split']), {'mongo', 'validation', 'json', 'logging', 'other'})
+        self.assertGreater(profiles[0]['split']['json'], 0)
+
+        response = self.test_client.get(f'/profiles/{profile_id}', headers={'X-Profile': 'test_token'})
+        self.assertEqual(response.headers['Content-Disposition'], f'attachment; filename="{profile_id}.pstats"')
+        self.assertIsInstance(marshal.loads(response.data), dict)
+
+        # The ring buffer keeps only the last profiles
+        for _ in range(2):
+            self.test_client.get('/task/get_by_name/test_name', headers={'X-Profile': 'test_token'}).close()
+        response = self.test_client.get(f'/profiles/{profile_id}', headers={'X-Profile': 'test_token'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['Message'], task_messages.profile_not_found)
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    @patch('todo_list.repositories.task_repository.version', return_value=(1, None))
+    @patch('todo_list.repositories.task_repository.prepare')
+    def test_unprofiled_request(self, mocked_prepare, mocked_version, mocked_get_by_name):
+        """
+        It should not profile the requests without the header or with the wrong token, nor serve them the profiles
+        """
+
+        mocked_get_by_name.return_value = test_utils.task_with_valid_body
+
+        for headers in ({}, {'X-Profile': 'wrong_token'}):
+            response = self.test_client.get('/task/get_by_name/test_name', headers=headers)
+            response.close()
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Id', response.headers)
+
+            response = self.test_client.get('/profiles', headers=headers)
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(response.get_json()['Message'], task_messages.profiling_forbidden)
+
+        self.assertEqual(self.test_client.get('/profiles', headers={'X-Profile': 'test_token'}).get_json(), [])
+
+    @patch('todo_list.repositories.async_task_repository.get_by_name')
+    @patch('todo_list.repositories.async_task_repository.version', return_value=(1, None))
+    @patch('todo_list.repositories.async_task_repository.prepare')
+    @skipUnless(importlib.util.find_spec('quart'), 'quart is not installed')
+    def test_profile_async_request(self, mocked_prepare, mocked_version, mocked_get_by_name):
+        """
+        It should profile the requests of the async stack, unless profiling is disabled
+        """
+
+        mocked_get_by_name.return_value = test_utils.task_with_valid_body
+
+        async def profile():
+            with patch.dict(os.environ, {'APP_STACK': 'async', 'PROFILING_ENABLED': 'true',
+                                         'PROFILING_TOKEN': 'test_token'}):
+                test_client = create_app().test_client()
+            response = await test_client.get('/task/get_by_name/test_name', headers={'X-Profile': 'test_token'})
+            profiles = await (await test_client.get('/profiles', headers={'X-Profile': 'test_token'})).get_json()
+            return response.headers['X-Profile-Id'], profiles
+
+        profile_id, profiles = asyncio.run(profile())
+        self.assertEqual([profile['id'] for profile in profiles], [profile_id])
+        self.assertEqual(profiles[0]['route'], 'get_by_name')
+
+        profiling.configure(False)
+        response = self.test_client.get('/profiles')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['Message'], task_messages.profiling_disabled)
+
+    def test_enabled_without_token(self):
+        """
+        It should not enable profiling without a token, as anyone could read the profiles
+        """
+
+        with patch.dict(os.environ, {'PROFILING_ENABLED': 'true', 'PROFILING_TOKEN': ''}):
+            with self.assertLogs(profiling.logger, 'WARNING'):
+                test_client = create_app().test_client()
+
+        response = test_client.get('/profiles', headers={'X-Profile': ''})
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(profiling.profiles)
+
+    def test_time_split(self):
+        """
+        It should charge the time of builtins without a category to their callers, and not the time of other functions
+        """
+
+        service = ('/app/todo_list/services/task_service.py', 1, 'get_by_name')
+        engine = ('/app/todo_list/repositories/engines/mongo_engine.py', 1, 'get_by_name')
+        lock = ('/usr/lib/python3.11/threading.py', 1, 'wait')
+        socket = ('~', 0, "<method 'recv_into' of '_socket.socket' objects>")
+        stats = {service: (1, 1, 0.1, 1.0, {}),
+                 engine: (1, 1, 0.2, 0.9, {service: (1, 1, 0.2, 0.9)}),
+                 lock: (1, 1, 0.05, 0.05, {engine: (1, 1, 0.05, 0.05)}),
+                 socket: (1, 1, 0.7, 0.7, {engine: (1, 1, 0.7, 0.7)})}
+
+        split = profiling.time_split(stats)
+
+        self.assertAlmostEqual(split['mongo'], 0.9)
+        self.assertAlmostEqual(split['other'], 0.15)
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from test.unit import test_utils
+from todo_list.monitoring import instrumentation
+from todo_list.repositories.engines.async_engine import AsyncIterable
+from todo_list.repositories.single_flight import AsyncSingleFlight
+from todo_list.repositories.single_flight import SharedTasks
+from todo_list.repositories.single_flight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the coalescing of identical concurrent reads
+    """
+
+    def test_read_once(self):
+        """
+        It should read a query once for the threads that ask for it while it is in flight, but not after a write
+        """
+
+        flights = SingleFlight()
+        reading = threading.Event()
+        release = threading.Event()
+        reads = []
+
+        def read():
+            reads.append(1)
+            reading.set()
+            release.wait(5)
+            return [test_utils.task_with_valid_body]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.read(('get_all', None, None), read)))
+                   for _ in range(3)]
+        coalesced = threading.Semaphore(0)
+        with patch.object(instrumentation, 'record_coalesced', side_effect=lambda name: coalesced.release()):
+            threads[0].start()
+            reading.wait(5)
+            for thread in threads[1:]:
+                thread.start()
+            for _ in threads[1:]:
+                coalesced.acquire(timeout=5)
+
+            # Callers that come after a write read the query again
+            flights.invalidate()
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(len(reads), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        self.assertEqual(flights.read(('get_all', None, None), read), [test_utils.task_with_valid_body])
+        self.assertEqual(len(reads), 2)
+
+    def test_read_async_once(self):
+        """
+        It should read a query once for the coroutines that ask for it, even if the first one is cancelled
+        """
+
+        read = MagicMock()
+
+        async def read_tasks():
+            read()
+            await asyncio.sleep(0.01)
+            return AsyncIterable([test_utils.task_with_valid_body])
+
+        async def coalesce():
+            flights = AsyncSingleFlight()
+            callers = [asyncio.ensure_future(flights.read(('get_all', None, None), read_tasks)) for _ in range(3)]
+            await asyncio.sleep(0)
+            callers[0].cancel()
+            return await asyncio.gather(*callers[1:])
+
+        results = asyncio.run(coalesce())
+
+        self.assertEqual(read.call_count, 1)
+        self.assertIs(results[0], results[1])
+        self.assertEqual(results[0], [test_utils.task_with_valid_body])
+
+    def test_encoded_once(self):
+        """
+        It should encode the shared tasks only once
+        """
+
+        encode = MagicMock(return_value=b'[]')
+        tasks = SharedTasks([])
+
+        self.assertEqual([tasks.encoded(encode) for _ in range(2)], [b'[]', b'[]'])
+        self.assertEqual(encode.call_count, 1)
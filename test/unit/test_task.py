@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+from test.unit import test_utils
+from todo_list.models.task import Task
+
+
+class TestTask(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the task model
+    """
+
+    def test_immutable(self):
+        """
+        It should not allow changing the fields of a task nor adding others
+        """
+
+        task = Task(**test_utils.task_with_valid_body)
+
+        for field in ['status', 'other_field']:
+            with self.assertRaises(AttributeError):
+                setattr(task, field, 'done')
+
+    def test_document(self):
+        """
+        It should convert a task to a new document and back, ignoring the other fields of the document
+        """
+
+        task = Task(**test_utils.task_with_valid_body)
+        document = task.to_document()
+        document['_id'] = 'test_id'
+
+        self.assertEqual(Task.from_document(document), task)
+        self.assertIsNot(task.to_document(), task.to_document())
@@ -0,0 +1,114 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from test.unit import test_utils
+from todo_list.monitoring import metrics
+from todo_list.repositories.task_cache import TaskCache
+
+
+class TestTaskCache(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the cache of tasks
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        self.cache = TaskCache(max_size=2, ttl=10)
+
+    def test_get_missing(self):
+        """
+        It should return TaskCache.missing and count a miss when the name is not cached
+        """
+
+        self.assertIs(self.cache.get('test_name'), TaskCache.missing)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_get_not_found(self):
+        """
+        It should cache tasks that were not found
+        """
+
+        self.cache.put('i_dont_exist', None)
+
+        self.assertIsNone(self.cache.get('i_dont_exist'))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_evicts_least_recently_used(self):
+        """
+        It should evict the least recently used entry when it is full
+        """
+
+        self.cache.put('first', test_utils.task_with_valid_body)
+        self.cache.put('second', test_utils.task_with_valid_body)
+        self.cache.get('first')
+        self.cache.put('third', test_utils.task_with_valid_body)
+
+        self.assertIs(self.cache.get('second'), TaskCache.missing)
+        self.assertEqual(self.cache.get('first'), test_utils.task_with_valid_body)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    @patch('todo_list.repositories.task_cache.time.monotonic')
+    def test_expires(self, mocked_monotonic):
+        """
+        It should not return entries older than the TTL
+        """
+
+        mocked_monotonic.return_value = 100
+        self.cache.put('test_name', test_utils.task_with_valid_body)
+
+        mocked_monotonic.return_value = 111
+
+        self.assertIs(self.cache.get('test_name'), TaskCache.missing)
+
+    def test_invalidate(self):
+        """
+        It should remove the entries of the informed names
+        """
+
+        self.cache.put('old_name', test_utils.task_with_valid_body)
+        self.cache.put('new_name', None)
+
+        self.cache.invalidate('old_name', 'new_name')
+
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_put_after_invalidate(self):
+        """
+        It should not cache a task read before a write invalidated its name, even after the name was forgotten
+        """
+
+        generation = self.cache.generation()
+        self.cache.invalidate('test_name')
+        self.cache.put('test_name', test_utils.task_with_valid_body, generation)
+        self.assertIs(self.cache.get('test_name'), TaskCache.missing)
+
+        # The cache keeps the generations of "max_size" names, so older reads are never cached
+        generation = self.cache.generation()
+        self.cache.invalidate('test_name', 'first', 'second')
+        self.cache.put('test_name', test_utils.task_with_valid_body, generation)
+        self.cache.put('other_name', test_utils.task_with_valid_body, generation)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+        self.cache.put('test_name', test_utils.task_with_valid_body, self.cache.generation())
+        self.assertEqual(self.cache.get('test_name'), test_utils.task_with_valid_body)
+
+    def test_metrics(self):
+        """
+        It should report its hits, misses and evictions on "/metrics"
+        """
+
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+        for name in ['first', 'second', 'third']:
+            self.cache.put(name, None)
+        self.cache.get('first')
+        self.cache.get('third')
+
+        lines = metrics.render().splitlines()
+        self.assertIn('todo_list_task_cache_lookups_total{result="hit"} 1', lines)
+        self.assertIn('todo_list_task_cache_lookups_total{result="miss"} 1', lines)
+        self.assertIn('todo_list_task_cache_evictions_total 1', lines)
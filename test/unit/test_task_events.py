@@ -0,0 +1,142 @@
+import asyncio
+from unittest import TestCase
+
+from test.unit import test_utils
+from todo_list.models.task import Task
+from todo_list.repositories import async_task_repository
+from todo_list.repositories import task_events
+from todo_list.repositories import task_repository
+from todo_list.repositories.engines import mongo_engine
+from todo_list.repositories.engines.async_engine import AsyncEngine
+from todo_list.repositories.engines.memory_engine import MemoryEngine
+from todo_list.repositories.task_events import EventHub
+
+
+class TestTaskEvents(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the in-process feed of changes of tasks
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        self.hub = EventHub(history_size=2)
+        self.task = Task(**test_utils.task_with_valid_body)
+
+    def test_watch(self):
+        """
+        It should yield the published events of tasks with matching status and None while there are none
+        """
+
+        changes = self.hub.watch('to_do', timeout=0.01)
+
+        self.assertIsNone(next(changes))
+        self.hub.publish('create', task=dict(test_utils.task_with_valid_body, status='done'))
+        self.hub.publish('create', task=test_utils.task_with_valid_body)
+
+        event = next(changes)
+        self.assertEqual(event['type'], 'create')
+        self.assertEqual(event['data'], {'task': test_utils.task_with_valid_body})
+        changes.close()
+        self.assertEqual(self.hub._subscribers, set())
+
+    def test_watch_async(self):
+        """
+        It should yield the published events without blocking the event loop
+        """
+
+        async def watch():
+            changes = self.hub.watch_async(timeout=0.01)
+            self.assertIsNone(await changes.__anext__())
+            self.hub.publish('delete', name='test_name')
+            event = await changes.__anext__()
+            await changes.aclose()
+            return event
+
+        self.assertEqual(asyncio.run(watch())['data'], {'name': 'test_name'})
+
+    def test_resume(self):
+        """
+        It should yield the events published after the informed one, or a reset event if they are not kept anymore
+        """
+
+        for name in ['first', 'second', 'third']:
+            self.hub.publish('delete', name=name)
+
+        missed = self.hub.subscribe(lambda event: None, self.hub.id + '-2')
+        self.assertEqual([event['data']['name'] for event in missed], ['third'])
+
+        for after in [self.hub.id + '-0', 'other-3', 'not_a_token']:
+            missed = self.hub.subscribe(lambda event: None, after)
+            self.assertEqual([event['type'] for event in missed], ['reset'])
+            self.assertEqual(missed[0]['id'], self.hub.id + '-3')
+
+    def test_matches_status(self):
+        """
+        It should match the tasks created with the status, bulk changes of the status and all single changes
+        """
+
+        self.assertFalse(task_events.matches({'type': 'create', 'data': {'task': test_utils.task_with_valid_body}},
+                                             'done'))
+        self.assertTrue(task_events.matches({'type': 'update', 'data': {'status': 'doing', 'set': {'status': 'to_do'}}},
+                                            'to_do'))
+        self.assertTrue(task_events.matches({'type': 'delete', 'data': {'name': 'test_name'}}, 'to_do'))
+        self.assertFalse(task_events.matches({'type': 'delete', 'data': {'status': 'done'}}, 'to_do'))
+
+    def test_repository_publishes_writes(self):
+        """
+        It should publish the writes of the repository, except the rejected ones, when the hub is enabled
+        """
+
+        task_repository.configure(MemoryEngine())
+        task_repository.configure_events('auto')
+        self.addCleanup(task_events.configure, False)
+        changes = task_repository.watch()
+
+        task_repository.insert_many([self.task, self.task])
+        task_repository.update('test_name', Task('test_name', 'new_description', 'done'))
+        task_repository.delete('i_dont_exist')
+        task_repository.delete_by_status('done')
+
+        self.assertEqual([(event['type'], event['data']) for event in [next(changes) for _ in range(3)]],
+                         [('create', {'task': test_utils.task_with_valid_body}),
+                          ('update', {'name': 'test_name', 'task': {'name': 'test_name',
+                                                                    'description': 'new_description',
+                                                                    'status': 'done'}}),
+                          ('delete', {'status': 'done'})])
+        changes.close()
+
+    def test_forced_change_streams_unsupported(self):
+        """
+        It should use the hub and log a warning if change streams are forced but the engine does not support them
+        """
+
+        self.addCleanup(task_events.configure, False)
+
+        task_repository.configure(MemoryEngine())
+        with self.assertLogs(task_repository.logger, 'WARNING'):
+            task_repository.configure_events('change_streams')
+        self.assertIsNotNone(task_events.hub)
+
+        task_events.configure(False)
+        async_task_repository.configure(AsyncEngine(MemoryEngine()))
+        with self.assertLogs(task_repository.logger, 'WARNING'):
+            asyncio.run(async_task_repository.configure_events('change_streams'))
+        self.assertIsNotNone(task_events.hub)
+
+    def test_change_stream_events(self):
+        """
+        It should turn the changes of MongoDb change streams into events, even without the deleted documents
+        """
+
+        change = {'_id': {'_data': '8263'}, 'operationType': 'update',
+                  'fullDocument': dict(test_utils.task_with_valid_body, _id=1),
+                  'fullDocumentBeforeChange': {'name': 'old_name'}}
+        self.assertEqual(mongo_engine.change_event(change),
+                         {'id': '8263', 'type': 'update',
+                          'data': {'name': 'old_name', 'task': test_utils.task_with_valid_body}})
+
+        change = {'_id': {'_data': '8264'}, 'operationType': 'delete', 'documentKey': {'_id': 1}}
+        self.assertEqual(mongo_engine.change_event(change), {'id': '8264', 'type': 'delete', 'data': {'name': None}})
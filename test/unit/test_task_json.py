@@ -0,0 +1,48 @@
+import json
+from unittest import TestCase
+
+from test.unit import test_utils
+from todo_list.repositories import task_cache
+from todo_list.repositories import task_repository
+from todo_list.services import task_json
+
+
+class TestTaskJson(TestCase):
+    """
+    This class contains tests to guarantee the behavior of the JSON encoding of tasks
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        # Starts with the cache of the JSON of tasks
+        task_cache.configure_fragments(True)
+        self.addCleanup(task_cache.configure_fragments, False)
+
+        self.task = dict(test_utils.task_with_valid_body)
+
+    def test_encode_tasks_keeps_field_order(self):
+        """
+        It should encode a list of tasks keeping the order of their fields
+        """
+
+        encoded = task_json.encode_tasks([self.task, dict(self.task, name='other_name')])
+
+        self.assertEqual(json.loads(encoded)[1]['name'], 'other_name')
+        self.assertTrue(encoded.startswith(b'[{"name":"test_name","description":'))
+
+    def test_fragment_cached(self):
+        """
+        It should reuse the JSON of a task until the task is written or read with other fields
+        """
+
+        first = task_json.fragment(self.task)
+        self.assertIs(task_json.fragment(dict(self.task)), first)
+
+        changed_task = dict(self.task, status='done')
+        self.assertIn(b'"done"', task_json.fragment(changed_task))
+
+        task_repository.invalidate_cache(self.task['name'])
+        self.assertIsNone(task_cache.fragments.get(self.task['name']))
@@ -0,0 +1,259 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
+
+from test.unit import test_utils
+from todo_list.models.task import Task
+from todo_list.repositories import task_cache
+from todo_list.repositories import task_repository
+from todo_list.repositories.engines import mongo_engine
+from todo_list.repositories.engines.mongo_engine import MongoEngine
+from todo_list.repositories.errors import DuplicatedTaskError
+from todo_list.repositories.errors import InvalidPageTokenError
+
+
+class TestTaskRepository(TestCase):
+    """
+    This class contains tests to guarantee the behavior of task's repository, storing tasks in MongoDb
+    """
+
+    def setUp(self):
+        """
+        Runs before tests to setup the necessary configs
+        """
+
+        # Stores tasks in a mocked MongoDb collection
+        self.mocked_tasks = MagicMock()
+        engine_patcher = patch.object(task_repository, 'engine', MongoEngine(self.mocked_tasks))
+        engine_patcher.start()
+        self.addCleanup(engine_patcher.stop)
+
+        # Starts without cache
+        task_cache.configure(False)
+        self.addCleanup(task_cache.configure, False)
+
+        self.task = Task(**test_utils.task_with_valid_body)
+
+    def test_ensure_indexes_duplicated_names(self):
+        """
+        It should create the other indexes and log the duplicated names when the unique index on name cannot be created
+        """
+
+        def create_index(keys, unique=False, **options):
+            if unique:
+                raise OperationFailure('E11000 duplicate key error', mongo_engine.duplicate_key_error_code)
+
+        self.mocked_tasks.create_index.side_effect = create_index
+        self.mocked_tasks.aggregate.return_value = [{'_id': 'test_name', 'count': 2}]
+
+        with self.assertLogs(task_repository.logger, 'ERROR') as logs:
+            task_repository.ensure_indexes()
+
+        self.assertEqual(self.mocked_tasks.create_index.call_count, len(mongo_engine.indexes))
+        self.assertIn('"test_name"', logs.output[0])
+
+        # Other failures are still raised, so the next request tries again
+        self.mocked_tasks.create_index.side_effect = OperationFailure('not authorized', 13)
+        with self.assertRaises(OperationFailure):
+            task_repository.ensure_indexes()
+
+    def test_insert_duplicated(self):
+        """
+        It should raise DuplicatedTaskError when the unique index rejects the name
+        """
+
+        self.mocked_tasks.insert_one.side_effect = DuplicateKeyError('E11000')
+
+        with self.assertRaises(DuplicatedTaskError):
+            task_repository.insert(self.task)
+
+    def test_insert_does_not_change_task(self):
+        """
+        It should not add MongoDb "_id" to the task, inserting a new document of it
+        """
+
+        task_repository.insert(self.task)
+
+        # MongoDb adds "_id" to the inserted document
+        self.mocked_tasks.insert_one.call_args[0][0]['_id'] = 'test_id'
+        self.assertEqual(self.task.to_document(), test_utils.task_with_valid_body)
+
+    def test_insert_many_duplicated(self):
+        """
+        It should return the positions of the tasks rejected by the unique index
+        """
+
+        self.mocked_tasks.insert_many.side_effect = BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000}]})
+
+        duplicated = task_repository.insert_many([self.task, Task('other_name', 'test_description', 'to_do')])
+
+        self.assertEqual(duplicated, [1])
+        self.assertFalse(self.mocked_tasks.insert_many.call_args[1]['ordered'])
+
+    def test_update_not_found(self):
+        """
+        It should return False if there is no task with the informed name
+        """
+
+        self.mocked_tasks.find_one_and_update.return_value = None
+
+        self.assertFalse(task_repository.update('i_dont_exist', self.task))
+
+    def test_update_duplicated(self):
+        """
+        It should raise DuplicatedTaskError when renaming to a registered name
+        """
+
+        self.mocked_tasks.find_one_and_update.side_effect = DuplicateKeyError('E11000')
+
+        with self.assertRaises(DuplicatedTaskError):
+            task_repository.update('old_name', self.task)
+
+    def test_update_many_duplicated(self):
+        """
+        It should return the counts and the positions of the updates rejected by the unique index
+        """
+
+        self.mocked_tasks.bulk_write.side_effect = BulkWriteError({'nMatched': 1, 'nModified': 1,
+                                                                   'writeErrors': [{'index': 0, 'code': 11000}]})
+
+        result = task_repository.update_many([('old_name', self.task), ('test_name', self.task)])
+
+        self.assertEqual(result, (1, 1, [0]))
+        self.assertFalse(self.mocked_tasks.bulk_write.call_args[1]['ordered'])
+
+    def test_delete(self):
+        """
+        It should return whether a task was deleted
+        """
+
+        self.mocked_tasks.delete_one.return_value.deleted_count = 1
+        self.assertTrue(task_repository.delete('test_name'))
+
+        self.mocked_tasks.delete_one.return_value.deleted_count = 0
+        self.assertFalse(task_repository.delete('test_name'))
+
+    @patch.object(task_repository, '_version', None)
+    @patch.object(task_repository, 'track_version', True)
+    def test_writes_bump_version(self):
+        """
+        It should reuse the version of the tasks until this process writes a task
+        """
+
+        versions = self.mocked_tasks.database[mongo_engine.versions_collection]
+        versions.find_one.return_value = None
+
+        self.assertEqual(task_repository.version(), (0, None))
+        task_repository.version()
+        task_repository.insert(self.task)
+        task_repository.version()
+
+        self.assertEqual(versions.update_one.call_args[0][1], mongo_engine.bump_version_update)
+        self.assertEqual(versions.find_one.call_count, 2)
+
+    def test_writes_without_version(self):
+        """
+        It should write tasks with a single round trip when the version of the tasks is not kept
+        """
+
+        versions = self.mocked_tasks.database[mongo_engine.versions_collection]
+
+        task_repository.insert(self.task)
+
+        self.assertIsNone(task_repository.version())
+        self.assertFalse(versions.update_one.called)
+        self.assertFalse(versions.find_one.called)
+
+    def test_get_by_name_cached(self):
+        """
+        It should read found and not found tasks from the cache when it is enabled
+        """
+
+        task_cache.configure(True)
+        self.mocked_tasks.find_one.side_effect = [test_utils.task_with_valid_body, None]
+
+        for _ in range(2):
+            self.assertEqual(task_repository.get_by_name('test_name'), test_utils.task_with_valid_body)
+            self.assertIsNone(task_repository.get_by_name('i_dont_exist'))
+
+        self.assertEqual(self.mocked_tasks.find_one.call_count, 2)
+        self.assertEqual(task_cache.stats()['hits'], 2)
+
+    def test_get_by_name_cached_at_version(self):
+        """
+        It should only read from the cache the tasks cached at the informed version of the tasks
+        """
+
+        task_cache.configure(True)
+        self.mocked_tasks.find_one.side_effect = [test_utils.task_with_valid_body, None]
+
+        self.assertEqual(task_repository.get_by_name('test_name', (1, None)), test_utils.task_with_valid_body)
+        self.assertEqual(task_repository.get_by_name('test_name', (1, None)), test_utils.task_with_valid_body)
+
+        # Another process removed the task, changing the version
+        self.assertIsNone(task_repository.get_by_name('test_name', (2, None)))
+        self.assertEqual(self.mocked_tasks.find_one.call_count, 2)
+
+    def test_writes_invalidate_cache(self):
+        """
+        It should remove from the cache the names changed by insert, update and delete
+        """
+
+        task_cache.configure(True)
+        for name in ['test_name', 'old_name', 'deleted_name']:
+            task_cache.cache.put(name, None)
+        self.mocked_tasks.delete_one.return_value.deleted_count = 1
+
+        task_repository.insert(self.task)
+        task_repository.update('old_name', self.task)
+        task_repository.delete('deleted_name')
+
+        self.assertEqual(task_cache.stats()['size'], 0)
+
+    @patch.object(task_repository, '_counts', None)
+    def test_count_by_status_reused(self):
+        """
+        It should count the tasks by status with one aggregation and reuse the counts until they expire
+        """
+
+        self.mocked_tasks.aggregate.return_value = [{'_id': 'to_do', 'count': 3}, {'_id': 'done', 'count': 2}]
+
+        for _ in range(2):
+            self.assertEqual(task_repository.count_by_status(), {'to_do': 3, 'done': 2})
+
+        self.assertEqual(self.mocked_tasks.aggregate.call_count, 1)
+
+    def test_get_by_status_well_formed_tasks(self):
+        """
+        It should ask MongoDb only for the returned fields of tasks with all the necessary fields filled
+        """
+
+        task_repository.get_by_status('to_do')
+
+        query, projection = self.mocked_tasks.find.call_args[0]
+        self.assertEqual(query['status'], 'to_do')
+        for field in ['name', 'description']:
+            self.assertEqual(query[field], {'$exists': True, '$ne': ''})
+        self.assertEqual(projection, {'_id': False, 'name': True, 'description': True, 'status': True})
+
+    def test_get_all_after_page_token(self):
+        """
+        It should read the tasks after the one that created the page token
+        """
+
+        task_repository.get_all(10, task_repository.next_page_token(test_utils.task_with_valid_body))
+
+        query = self.mocked_tasks.find.call_args[0][0]
+        self.assertEqual(query['name']['$gt'], test_utils.task_with_valid_body['name'])
+        self.mocked_tasks.find.return_value.sort.return_value.batch_size.return_value.limit.assert_called_with(10)
+
+    def test_get_all_invalid_page_token(self):
+        """
+        It should raise InvalidPageTokenError if the page token was not created by the repository
+        """
+
+        with self.assertRaises(InvalidPageTokenError):
+            task_repository.get_all(10, 'not_a_token')
@@ -1,20 +1,39 @@
+import gzip
+import json
+from datetime import datetime
+from datetime import timezone
 from unittest import TestCase
 from todo_list.flask_app import create_app
 from unittest.mock import patch
 from test.unit import test_utils
 
+from todo_list.monitoring import metrics
+from todo_list.repositories import idempotency_keys
+from todo_list.repositories import task_repository
+from todo_list.repositories.idempotency_keys import MemoryKeyStore
+from todo_list.repositories.errors import DuplicatedTaskError
+from todo_list.repositories.errors import InvalidPageTokenError
 from todo_list.services import task_messages
+from todo_list.services import task_transfer
 from todo_list.routes import urls
 
 # Sets routes values for tests
 route_prefix = '/task'
 
 add_route = route_prefix + urls.add_task
+add_bulk_route = route_prefix + urls.add_tasks_in_bulk
 get_by_name_route = route_prefix + urls.get_task_by_name + '/'
 get_by_status_route = route_prefix + urls.get_task_by_status + '/'
 get_all_route = route_prefix + urls.get_all_tasks
 update_route = route_prefix + urls.update_task + '/'
+update_bulk_route = route_prefix + urls.update_tasks_in_bulk
 delete_route = route_prefix + urls.delete_task + '/'
+delete_bulk_route = route_prefix + urls.delete_tasks_in_bulk
+stats_route = route_prefix + urls.task_stats
+events_route = route_prefix + urls.task_events
+search_route = route_prefix + urls.search_tasks
+export_route = route_prefix + urls.export_tasks
+import_route = route_prefix + urls.import_tasks
 
 
 class TestTaskRoute(TestCase):
@@ -27,10 +46,31 @@ class TestTaskRoute(TestCase):
         Runs before tests to setup the necessary configs
         """
 
+        # Avoids reaching MongoDb when ensuring indexes
+        ensure_indexes_patcher = patch('todo_list.repositories.task_repository.ensure_indexes')
+        ensure_indexes_patcher.start()
+        self.addCleanup(ensure_indexes_patcher.stop)
+
+        # Avoids reaching MongoDb when reading the version of the tasks
+        self.version = (7, datetime(2019, 5, 1, 12, 30, tzinfo=timezone.utc))
+        version_patcher = patch('todo_list.repositories.task_repository.version', return_value=self.version)
+        version_patcher.start()
+        self.addCleanup(version_patcher.stop)
+
+        # Avoids reaching MongoDb when verifying if it supports change streams
+        configure_events_patcher = patch('todo_list.repositories.task_repository.configure_events')
+        configure_events_patcher.start()
+        self.addCleanup(configure_events_patcher.stop)
+
         # Creates flask app
         self.app = create_app()
         self.app.testing = True
 
+        # Keeps the responses to idempotency keys in memory instead of MongoDb
+        self.key_store = MemoryKeyStore(100, 60)
+        idempotency_keys.configure(self.key_store)
+        self.addCleanup(idempotency_keys.configure, None)
+
         # Gets flask "test_client"
         self.test_client = self.app.test_client()
 
@@ -39,14 +79,11 @@ class TestTaskRoute(TestCase):
     """
 
     @patch('todo_list.repositories.task_repository.insert')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_add(self, mocked_task_repository_is_registered, mocked_task_repository_insert):
+    def test_add(self, mocked_task_repository_insert):
         """
         It should return 201 when a task is created
         """
 
-        mocked_task_repository_is_registered.return_value = False
-
         response = self.test_client.post(add_route,
                                          json=test_utils.task_with_valid_body)
         response_json = response.get_json()
@@ -55,6 +92,48 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response_json['Message'], task_messages.created)
         self.assertEqual(response.status_code, 201)
 
+    @patch('todo_list.repositories.task_repository.insert')
+    def test_add_idempotent(self, mocked_task_repository_insert):
+        """
+        It should replay the response of the first request to the retries with the same "Idempotency-Key" header
+        """
+
+        headers = {'Idempotency-Key': 'test_key'}
+        responses = [self.test_client.post(add_route, json=test_utils.task_with_valid_body, headers=headers)
+                     for _ in range(2)]
+
+        self.assertEqual(mocked_task_repository_insert.call_count, 1)
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(responses[1].get_json()['Message'], task_messages.created)
+        self.assertEqual(responses[1].headers['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', responses[0].headers)
+
+    @patch('todo_list.repositories.task_repository.update')
+    @patch('todo_list.repositories.task_repository.insert')
+    def test_add_idempotency_key_reused(self, mocked_task_repository_insert, mocked_task_repository_update):
+        """
+        It should return 422 when a key is sent again with another request and 409 while its request is in progress
+        """
+
+        headers = {'Idempotency-Key': 'test_key'}
+        self.test_client.post(add_route, json=test_utils.task_with_valid_body, headers=headers)
+        response = self.test_client.put(update_route + 'test_name', json=test_utils.task_with_valid_body,
+                                        headers=headers)
+
+        self.assertFalse(mocked_task_repository_update.called)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.get_json()['Message'], task_messages.idempotency_key_reused)
+
+        # The response of the first request is not saved, as if it was still in progress
+        with patch.object(self.key_store, 'save'):
+            headers = {'Idempotency-Key': 'other_key'}
+            self.test_client.post(add_route, json=test_utils.task_with_valid_body, headers=headers)
+        response = self.test_client.post(add_route, json=test_utils.task_with_valid_body, headers=headers)
+
+        self.assertEqual(mocked_task_repository_insert.call_count, 2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
     @patch('todo_list.repositories.task_repository.insert')
     def test_add_invalid_body(self, mocked_task_repository_insert):
         """
@@ -70,14 +149,11 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response.status_code, 400)
 
     @patch('todo_list.repositories.task_repository.insert')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_add_invalid_status(self, mocked_task_repository_is_registered, mocked_task_repository_insert):
+    def test_add_invalid_status(self, mocked_task_repository_insert):
         """
         It should return 400 when trying to add a task with invalid status
         """
 
-        mocked_task_repository_is_registered.return_value = False
-
         response = self.test_client.post(add_route,
                                          json=test_utils.task_with_invalid_status)
         response_json = response.get_json()
@@ -87,31 +163,43 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response.status_code, 400)
 
     @patch('todo_list.repositories.task_repository.insert')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_add_duplicated(self, mocked_task_repository_is_registered, mocked_task_repository_insert):
+    def test_add_field_errors(self, mocked_task_repository_insert):
+        """
+        It should return 400 with the error of each invalid field
+        """
+
+        response = self.test_client.post(add_route, json={'name': '', 'status': 'this_is_invalid'})
+        response_json = response.get_json()
+
+        self.assertFalse(mocked_task_repository_insert.called)
+        self.assertEqual(response_json['Message'], task_messages.incorrect_parameters)
+        self.assertEqual(response_json['Errors'], {'name': task_messages.not_a_string,
+                                                   'description': task_messages.required_field,
+                                                   'status': task_messages.not_a_status})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('todo_list.repositories.task_repository.insert')
+    def test_add_duplicated(self, mocked_task_repository_insert):
         """
         It should return 400 when trying to add a task that already exists
         """
 
-        mocked_task_repository_is_registered.return_value = True
+        mocked_task_repository_insert.side_effect = DuplicatedTaskError(test_utils.task_with_valid_body['name'])
 
         response = self.test_client.post(add_route,
                                          json=test_utils.task_with_valid_body)
         response_json = response.get_json()
 
-        self.assertFalse(mocked_task_repository_insert.called)
+        self.assertTrue(mocked_task_repository_insert.called)
         self.assertEqual(response_json['Message'], task_messages.duplicated)
         self.assertEqual(response.status_code, 400)
 
     @patch('todo_list.repositories.task_repository.insert')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_add_status_upper_case(self, mocked_task_repository_is_registered, mocked_task_repository_insert):
+    def test_add_status_upper_case(self, mocked_task_repository_insert):
         """
         It should set status to lower case (.lower()) before saving the task
         """
 
-        mocked_task_repository_is_registered.return_value = False
-
         response = self.test_client.post(add_route,
                                          json=test_utils.task_with_valid_body)
 
@@ -121,6 +209,67 @@ class TestTaskRoute(TestCase):
                          test_utils.task_with_status_upper_case['status'].lower())
         self.assertEqual(response.status_code, 201)
 
+    """
+    Add bulk route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_add_bulk(self, mocked_task_repository_insert_many):
+        """
+        It should return the result of each task, in the order they were sent
+        """
+
+        mocked_task_repository_insert_many.return_value = [1]
+        registered_task = dict(test_utils.task_with_valid_body, name='registered_name')
+
+        response = self.test_client.post(add_bulk_route,
+                                         json=[test_utils.task_with_valid_body,
+                                               test_utils.task_with_invalid_body,
+                                               test_utils.task_with_invalid_status,
+                                               test_utils.task_with_status_upper_case,
+                                               registered_task])
+        response_json = response.get_json()
+
+        tasks_used_by_mock = mocked_task_repository_insert_many.call_args[0][0]
+
+        self.assertEqual(mocked_task_repository_insert_many.call_count, 1)
+        self.assertEqual([t.name for t in tasks_used_by_mock], ['test_name', 'registered_name'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['Status'] for r in response_json], [201, 400, 400, 400, 400])
+        self.assertEqual([r['Message'] for r in response_json],
+                         [task_messages.created, task_messages.incorrect_parameters, task_messages.invalid_status,
+                          task_messages.duplicated, task_messages.duplicated])
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_add_bulk_ndjson(self, mocked_task_repository_insert_many):
+        """
+        It should accept one task per line and report lines that are not JSON
+        """
+
+        mocked_task_repository_insert_many.return_value = []
+
+        response = self.test_client.post(add_bulk_route,
+                                         data=json.dumps(test_utils.task_with_valid_body) + '\n{not json\n',
+                                         content_type='application/x-ndjson')
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['Status'] for r in response_json], [201, 400])
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_add_bulk_invalid_body(self, mocked_task_repository_insert_many):
+        """
+        It should return 400 if the body is not a list
+        """
+
+        response = self.test_client.post(add_bulk_route,
+                                         json=test_utils.task_with_valid_body)
+        response_json = response.get_json()
+
+        self.assertFalse(mocked_task_repository_insert_many.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.incorrect_parameters)
+
     """
     Get by name route tests
     """
@@ -202,21 +351,6 @@ class TestTaskRoute(TestCase):
         self.assertEqual(status_used_by_mock, 'to_do')
         self.assertEqual(response.status_code, 200)
 
-    @patch('todo_list.repositories.task_repository.get_by_status')
-    def test_get_by_status_invalid_task(self, mocked_task_repository_get_by_status):
-        """
-        It should not return something that is not a Task
-        """
-
-        mocked_task_repository_get_by_status.return_value = [test_utils.task_with_valid_body,
-                                                             test_utils.task_with_invalid_body]
-
-        response = self.test_client.get(get_by_status_route + 'to_do')
-        response_json = response.get_json()
-
-        self.assertEqual(len(response_json), 1)
-        self.assertEqual(response.status_code, 200)
-
     """
     Get all route tests
     """
@@ -238,32 +372,250 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response_json[0], test_utils.task_with_valid_body)
 
     @patch('todo_list.repositories.task_repository.get_all')
-    def test_get_all_invalid_task(self, mocked_task_repository_get_all):
+    def test_get_all_compressed(self, mocked_task_repository_get_all):
+        """
+        It should compress large lists, streamed or not, with an encoding accepted by the client
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body] * 100
+
+        for query_string in ['', '?stream=ndjson']:
+            response = self.test_client.get(get_all_route + query_string, headers={'Accept-Encoding': 'gzip'})
+
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+            self.assertEqual(gzip.decompress(response.get_data()).count(b'test_name'), 100)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_compressed_changed(self, mocked_task_repository_get_all):
+        """
+        It should not send the cached compression of another body, even if the version of the tasks did not change
+        """
+
+        for description in ['first_description', 'second_description']:
+            task = dict(test_utils.task_with_valid_body, description=description)
+            mocked_task_repository_get_all.return_value = [task] * 100
+
+            response = self.test_client.get(get_all_route, headers={'Accept-Encoding': 'gzip'})
+
+            self.assertEqual(gzip.decompress(response.get_data()).count(description.encode()), 100)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_compressed_cache_metrics(self, mocked_task_repository_get_all):
+        """
+        It should not count the lookups of the cache of compressed responses as lookups of the cache of tasks
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body] * 100
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+        for _ in range(2):
+            response = self.test_client.get(get_all_route, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+        self.assertFalse([name for name, _ in metrics.registry.counters if name.startswith('todo_list_task_cache_')])
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_small_not_compressed(self, mocked_task_repository_get_all):
+        """
+        It should not compress small responses
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body]
+
+        response = self.test_client.get(get_all_route, headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_json()[0], test_utils.task_with_valid_body)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_validators(self, mocked_task_repository_get_all):
         """
-        It should not return something that is not a Task
+        It should return the version of the tasks on "ETag" and "Last-Modified" headers
         """
 
-        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body,
-                                                       test_utils.task_with_invalid_body]
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body]
 
         response = self.test_client.get(get_all_route)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['ETag'].startswith('W/"7-'))
+        self.assertEqual(response.headers['Last-Modified'], 'Wed, 01 May 2019 12:30:00 GMT')
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_not_modified(self, mocked_task_repository_get_all):
+        """
+        It should return 304 without reading the tasks when the client has the current version
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body]
+        etag = self.test_client.get(get_all_route).headers['ETag']
+        mocked_task_repository_get_all.reset_mock()
+
+        response = self.test_client.get(get_all_route, headers={'If-None-Match': etag})
+
+        self.assertFalse(mocked_task_repository_get_all.called)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    def test_get_by_name_field_order(self, mocked_task_repository_get_by_name):
+        """
+        It should return the fields of the task in their order, not sorted
+        """
+
+        mocked_task_repository_get_by_name.return_value = test_utils.task_with_valid_body
+
+        response = self.test_client.get(get_by_name_route + 'test_name')
+
+        self.assertEqual(list(json.loads(response.get_data(as_text=True))), ['name', 'description', 'status'])
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    def test_get_by_name_modified_since(self, mocked_task_repository_get_by_name):
+        """
+        It should return 304 if the tasks did not change since "If-Modified-Since" and 200 otherwise
+        """
+
+        mocked_task_repository_get_by_name.return_value = test_utils.task_with_valid_body
+
+        response = self.test_client.get(get_by_name_route + 'test_name',
+                                        headers={'If-Modified-Since': 'Wed, 01 May 2019 12:30:00 GMT'})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(mocked_task_repository_get_by_name.called)
+
+        response = self.test_client.get(get_by_name_route + 'test_name',
+                                        headers={'If-Modified-Since': 'Wed, 01 May 2019 12:29:59 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    @patch('todo_list.repositories.task_repository.next_page_token')
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_paginated(self, mocked_task_repository_get_all, mocked_task_repository_next_page_token):
+        """
+        It should return the cursor of the next page when the page is full
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body]
+        mocked_task_repository_next_page_token.return_value = 'next_page'
+
+        response = self.test_client.get(get_all_route + '?limit=1&after=this_page')
+
+        self.assertEqual(mocked_task_repository_get_all.call_args[0], (1, 'this_page'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Next-Cursor'], 'next_page')
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_last_page(self, mocked_task_repository_get_all):
+        """
+        It should not return the cursor of a next page when the page is not full
+        """
+
+        mocked_task_repository_get_all.return_value = [test_utils.task_with_valid_body]
+
+        response = self.test_client.get(get_all_route + '?limit=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_invalid_page(self, mocked_task_repository_get_all):
+        """
+        It should return 400 if the pagination parameters are invalid
+        """
+
+        response = self.test_client.get(get_all_route + '?limit=0')
         response_json = response.get_json()
 
-        self.assertEqual(len(response_json), 1)
+        self.assertFalse(mocked_task_repository_get_all.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.invalid_page)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_invalid_cursor(self, mocked_task_repository_get_all):
+        """
+        It should return 400 if the cursor was not created by the repository
+        """
+
+        mocked_task_repository_get_all.side_effect = InvalidPageTokenError('not_a_cursor')
+
+        response = self.test_client.get(get_all_route + '?after=not_a_cursor')
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.invalid_page)
+
+    @patch('todo_list.repositories.task_repository.get_all')
+    def test_get_all_stream_json(self, mocked_task_repository_get_all):
+        """
+        It should stream a JSON array
+        """
+
+        mocked_task_repository_get_all.return_value = iter([test_utils.task_with_valid_body,
+                                                            test_utils.task_with_valid_body])
+
+        response = self.test_client.get(get_all_route + '?stream=json')
+
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [test_utils.task_with_valid_body, test_utils.task_with_valid_body])
+
+    @patch('todo_list.repositories.task_repository.get_by_status')
+    def test_get_by_status_stream_ndjson(self, mocked_task_repository_get_by_status):
+        """
+        It should stream one task per line
+        """
+
+        mocked_task_repository_get_by_status.return_value = iter([test_utils.task_with_valid_body])
+
+        response = self.test_client.get(get_by_status_route + 'to_do?stream=ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in lines], [test_utils.task_with_valid_body])
+
+    """
+    Search route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.search')
+    def test_search(self, mocked_task_repository_search):
+        """
+        It should return 200 with the tasks found and, on a full page of a text search, the cursor of the next page
+        """
+
+        mocked_task_repository_search.return_value = [test_utils.task_with_valid_body]
+        after = task_repository.next_search_token('test', None, [{}, {}])
+
+        response = self.test_client.get(search_route + '?prefix=test&q=test+description&limit=1&after=' + after)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [test_utils.task_with_valid_body])
+        self.assertEqual(task_repository.parse_offset_token(response.headers['X-Next-Cursor']), 3)
+        mocked_task_repository_search.assert_called_with('test', 'test description', 1, after)
+
+    @patch('todo_list.repositories.task_repository.search')
+    def test_search_without_parameters(self, mocked_task_repository_search):
+        """
+        It should return 400 when neither a prefix nor a text are informed
+        """
+
+        response = self.test_client.get(search_route + '?q=')
+
+        self.assertFalse(mocked_task_repository_search.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['Message'], task_messages.invalid_search)
 
     """
     Update route tests
     """
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update(self, mocked_task_repository_update):
         """
         It should return 200 and update the task
         """
 
-        mocked_task_repository_is_registered.return_value = True
+        mocked_task_repository_update.return_value = True
 
         response = self.test_client.put(update_route + test_utils.task_with_valid_body['name'],
                                         json=test_utils.task_with_valid_body)
@@ -273,32 +625,27 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response_json['Message'], task_messages.updated)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_not_found(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_not_found(self, mocked_task_repository_update):
         """
         It should return 404 if the task does not exist
         """
 
-        mocked_task_repository_is_registered.return_value = False
+        mocked_task_repository_update.return_value = False
 
         response = self.test_client.put(update_route + 'i_dont_exist',
                                         json=test_utils.task_with_valid_body)
         response_json = response.get_json()
 
-        self.assertFalse(mocked_task_repository_update.called)
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response_json['Message'], task_messages.not_found)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_invalid_body(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_invalid_body(self, mocked_task_repository_update):
         """
         It should return 400 if the body is invalid
         """
 
-        mocked_task_repository_is_registered.return_value = True
-
         response = self.test_client.put(update_route + 'i_have_an_invalid_body',
                                         json=test_utils.task_with_invalid_body)
         response_json = response.get_json()
@@ -307,15 +654,12 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response_json['Message'], task_messages.incorrect_parameters)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_invalid_status(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_invalid_status(self, mocked_task_repository_update):
         """
         It should return 400 if the status is invalid
         """
 
-        mocked_task_repository_is_registered.return_value = True
-
         response = self.test_client.put(update_route + test_utils.task_with_invalid_status['name'],
                                         json=test_utils.task_with_invalid_status)
         response_json = response.get_json()
@@ -324,50 +668,46 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response_json['Message'], task_messages.invalid_status)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_duplicated(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_duplicated(self, mocked_task_repository_update):
         """
         It should return 400 if there is a task with the new name
         """
 
-        mocked_task_repository_is_registered.return_value = True
+        mocked_task_repository_update.side_effect = DuplicatedTaskError(test_utils.task_with_valid_body['name'])
 
         response = self.test_client.put(update_route + test_utils.task_with_valid_body['name'] + '_new',
                                         json=test_utils.task_with_valid_body)
         response_json = response.get_json()
 
-        self.assertFalse(mocked_task_repository_update.called)
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response_json['Message'], task_messages.duplicated)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_change_name(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_change_name(self, mocked_task_repository_update):
         """
         It should return 200 and update if there is not a task with the new name
         """
 
-        # Returns True on first call and False on second one
-        # Returns True when verifying if 'old_name' exists and returns False when verifying if new name exists
-        mocked_task_repository_is_registered.side_effect = [True, False]
+        mocked_task_repository_update.return_value = True
 
         response = self.test_client.put(update_route + 'old_name',
                                         json=test_utils.task_with_valid_body)
         response_json = response.get_json()
 
-        self.assertTrue(mocked_task_repository_update.called)
+        # Updates "old_name" with the new values
+        self.assertEqual(mocked_task_repository_update.call_args[0][0], 'old_name')
+        self.assertEqual(mocked_task_repository_update.call_args[0][1].name, test_utils.task_with_valid_body['name'])
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response_json['Message'], task_messages.updated)
 
-    @patch('todo_list.repositories.task_repository.is_registered')
     @patch('todo_list.repositories.task_repository.update')
-    def test_update_upper_case(self, mocked_task_repository_update, mocked_task_repository_is_registered):
+    def test_update_upper_case(self, mocked_task_repository_update):
         """
         It should set status to lower case (.lower()) before updating the task
         """
 
-        mocked_task_repository_is_registered.return_value = True
+        mocked_task_repository_update.return_value = True
 
         response = self.test_client.put(update_route + test_utils.task_with_valid_body['name'],
                                         json=test_utils.task_with_status_upper_case)
@@ -378,18 +718,88 @@ class TestTaskRoute(TestCase):
         self.assertEqual(task_used_by_mock.status,
                          test_utils.task_with_status_upper_case['status'].lower())
 
+    """
+    Update bulk route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.update_many')
+    def test_update_bulk(self, mocked_task_repository_update_many):
+        """
+        It should update the valid items with a single write and return the result of rejected items
+        """
+
+        mocked_task_repository_update_many.return_value = (2, 1, [1])
+        renamed_task = dict(test_utils.task_with_valid_body, name='registered_name')
+
+        response = self.test_client.put(update_bulk_route,
+                                        json=[{'task_name': 'test_name', 'task': test_utils.task_with_valid_body},
+                                              {'task_name': 'other_name', 'task': test_utils.task_with_invalid_body},
+                                              {'task_name': 'other_name', 'task': renamed_task},
+                                              {'task_name': 'another_name', 'task': renamed_task}])
+        response_json = response.get_json()
+
+        updates_used_by_mock = mocked_task_repository_update_many.call_args[0][0]
+
+        self.assertEqual([(task_name, t.name) for task_name, t in updates_used_by_mock],
+                         [('test_name', 'test_name'), ('other_name', 'registered_name')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response_json['Matched'], response_json['Modified']), (2, 1))
+        self.assertEqual([(r['Position'], r['Message']) for r in response_json['Results']],
+                         [(1, task_messages.incorrect_parameters), (2, task_messages.duplicated),
+                          (3, task_messages.duplicated)])
+
+    @patch('todo_list.repositories.task_repository.update_by_status')
+    def test_update_bulk_by_status(self, mocked_task_repository_update_by_status):
+        """
+        It should set the values on all tasks with the status
+        """
+
+        mocked_task_repository_update_by_status.return_value = (3, 3)
+
+        response = self.test_client.put(update_bulk_route, json={'status': 'DOING', 'set': {'status': 'Done'}})
+        response_json = response.get_json()
+
+        mocked_task_repository_update_by_status.assert_called_with('doing', {'status': 'done'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response_json['Matched'], response_json['Modified']), (3, 3))
+
+    @patch('todo_list.repositories.task_repository.update_by_status')
+    def test_update_bulk_by_status_rename(self, mocked_task_repository_update_by_status):
+        """
+        It should return 400 when trying to set the same name on all tasks with the status
+        """
+
+        response = self.test_client.put(update_bulk_route, json={'status': 'doing', 'set': {'name': 'test_name'}})
+        response_json = response.get_json()
+
+        self.assertFalse(mocked_task_repository_update_by_status.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.incorrect_parameters)
+
+    @patch('todo_list.repositories.task_repository.update_by_status')
+    def test_update_bulk_by_status_invalid_status(self, mocked_task_repository_update_by_status):
+        """
+        It should return 400 if the new status is invalid
+        """
+
+        response = self.test_client.put(update_bulk_route, json={'status': 'doing', 'set': {'status': 'invalid'}})
+        response_json = response.get_json()
+
+        self.assertFalse(mocked_task_repository_update_by_status.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.invalid_status)
+
     """
     Delete route tests
     """
 
     @patch('todo_list.repositories.task_repository.delete')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_delete(self, mocked_task_repository_is_registered, mocked_task_repository_delete):
+    def test_delete(self, mocked_task_repository_delete):
         """
         It should return 200 and delete the task
         """
 
-        mocked_task_repository_is_registered.return_value = True
+        mocked_task_repository_delete.return_value = True
 
         response = self.test_client.delete(delete_route + 'test_name')
         response_json = response.get_json()
@@ -399,17 +809,248 @@ class TestTaskRoute(TestCase):
         self.assertEqual(response_json['Message'], task_messages.deleted)
 
     @patch('todo_list.repositories.task_repository.delete')
-    @patch('todo_list.repositories.task_repository.is_registered')
-    def test_delete_not_found(self, mocked_task_repository_is_registered, mocked_task_repository_delete):
+    def test_delete_not_found(self, mocked_task_repository_delete):
         """
         It should return 404 if the task does not exist
         """
 
-        mocked_task_repository_is_registered.return_value = False
+        mocked_task_repository_delete.return_value = False
 
         response = self.test_client.delete(delete_route + 'test_task')
         response_json = response.get_json()
 
-        self.assertFalse(mocked_task_repository_delete.called)
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response_json['Message'], task_messages.not_found)
+
+    @patch('todo_list.repositories.task_repository.delete_many')
+    def test_delete_bulk(self, mocked_task_repository_delete_many):
+        """
+        It should delete the tasks with the informed names and return how many were deleted
+        """
+
+        mocked_task_repository_delete_many.return_value = 1
+
+        response = self.test_client.delete(delete_bulk_route, json=['test_name', 'i_dont_exist'])
+        response_json = response.get_json()
+
+        mocked_task_repository_delete_many.assert_called_with(['test_name', 'i_dont_exist'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['Deleted'], 1)
+
+    @patch('todo_list.repositories.task_repository.delete_by_status')
+    def test_delete_bulk_by_status(self, mocked_task_repository_delete_by_status):
+        """
+        It should delete all tasks with the status
+        """
+
+        mocked_task_repository_delete_by_status.return_value = 5
+
+        response = self.test_client.delete(delete_bulk_route, json={'status': 'DONE'})
+        response_json = response.get_json()
+
+        mocked_task_repository_delete_by_status.assert_called_with('done')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['Deleted'], 5)
+
+    @patch('todo_list.repositories.task_repository.delete_many')
+    def test_delete_bulk_invalid_body(self, mocked_task_repository_delete_many):
+        """
+        It should return 400 if the body is not a list of names nor a status
+        """
+
+        response = self.test_client.delete(delete_bulk_route, json=['test_name', 1])
+        response_json = response.get_json()
+
+        self.assertFalse(mocked_task_repository_delete_many.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.incorrect_parameters)
+
+    """
+    Stats route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.count_by_status')
+    def test_stats(self, mocked_task_repository_count_by_status):
+        """
+        It should return 200 with the count of every status, including the ones without tasks, and the total
+        """
+
+        mocked_task_repository_count_by_status.return_value = {'to_do': 3, 'done': 2}
+
+        response = self.test_client.get(stats_route)
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json, {'to_do': 3, 'doing': 0, 'done': 2, 'Total': 5})
+
+    """
+    Export and import route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.count_by_status')
+    @patch('todo_list.repositories.task_repository.export')
+    def test_export(self, mocked_task_repository_export, mocked_task_repository_count_by_status):
+        """
+        It should stream all the tasks as gzip-compressed NDJSON, with how many tasks there should be
+        """
+
+        tasks = [dict(test_utils.task_with_valid_body, name=f'test_name_{i}') for i in range(5)]
+        mocked_task_repository_export.return_value = iter(tasks)
+        mocked_task_repository_count_by_status.return_value = {'to_do': 5}
+
+        with patch.object(task_transfer, 'chunk_size', 2):
+            response = self.test_client.get(export_route + '?compress=gzip')
+        lines = gzip.decompress(response.get_data()).decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, task_transfer.gzip_mimetype)
+        self.assertEqual(response.headers['X-Estimated-Count'], '5')
+        self.assertIn('tasks.ndjson.gz', response.headers['Content-Disposition'])
+        self.assertEqual([json.loads(line) for line in lines], tasks)
+
+    @patch('todo_list.repositories.task_repository.export')
+    def test_export_invalid_compression(self, mocked_task_repository_export):
+        """
+        It should return 400 if the compression is not gzip
+        """
+
+        response = self.test_client.get(export_route + '?compress=zip')
+
+        self.assertFalse(mocked_task_repository_export.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['Message'], task_messages.invalid_export)
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_import(self, mocked_task_repository_insert_many):
+        """
+        It should write the tasks in chunks, skipping the registered and repeated names and reporting invalid lines
+        """
+
+        mocked_task_repository_insert_many.side_effect = [[], [0]]
+        lines = [json.dumps(dict(test_utils.task_with_valid_body, name='a')), '',
+                 json.dumps(dict(test_utils.task_with_valid_body, name='b')),
+                 json.dumps(dict(test_utils.task_with_valid_body, name='b')),
+                 json.dumps(dict(test_utils.task_with_valid_body, name='a')), '{not json',
+                 json.dumps(dict(test_utils.task_with_valid_body, name='c', status='invalid'))]
+
+        with patch.object(task_transfer, 'chunk_size', 3):
+            response = self.test_client.post(import_route, data='\n'.join(lines),
+                                             content_type='application/x-ndjson')
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['Message'], task_messages.imported)
+        self.assertEqual([response_json[count] for count in ('Read', 'Created', 'Updated', 'Skipped', 'Invalid')],
+                         [6, 2, 0, 2, 2])
+        self.assertEqual([(error['Line'], error['Message']) for error in response_json['Errors']],
+                         [(5, task_messages.incorrect_parameters), (6, task_messages.invalid_status)])
+        self.assertEqual([[t.name for t in call.args[0]] for call in mocked_task_repository_insert_many.call_args_list],
+                         [['a', 'b'], ['a']])
+
+    @patch('todo_list.repositories.task_repository.upsert_many')
+    def test_import_upsert_gzip(self, mocked_task_repository_upsert_many):
+        """
+        It should read a gzip-compressed body and replace the registered tasks
+        """
+
+        mocked_task_repository_upsert_many.return_value = ([1], 1, [])
+        body = gzip.compress(b''.join(json.dumps(dict(test_utils.task_with_valid_body, name=name)).encode() + b'\n'
+                                      for name in ('a', 'b')))
+
+        response = self.test_client.post(import_route + '?mode=upsert', data=body,
+                                         content_type=task_transfer.gzip_mimetype)
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([response_json[count] for count in ('Read', 'Created', 'Updated', 'Skipped', 'Invalid')],
+                         [2, 1, 1, 0, 0])
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_import_truncated_gzip(self, mocked_task_repository_insert_many):
+        """
+        It should return 400 on a truncated gzip body, after importing the lines read before the error
+        """
+
+        mocked_task_repository_insert_many.return_value = []
+        body = gzip.compress(b''.join(json.dumps(dict(test_utils.task_with_valid_body, name=str(i))).encode() + b'\n'
+                                      for i in range(100)))
+
+        response = self.test_client.post(import_route, data=body[:len(body) // 2],
+                                         headers={'Content-Encoding': 'gzip'})
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_json['Message'], task_messages.invalid_import_body)
+        self.assertGreater(response_json['Created'], 0)
+
+    @patch('todo_list.repositories.task_repository.insert_many')
+    def test_import_invalid_mode(self, mocked_task_repository_insert_many):
+        """
+        It should return 400 if the mode is neither skip nor upsert
+        """
+
+        response = self.test_client.post(import_route + '?mode=replace', data='')
+
+        self.assertFalse(mocked_task_repository_insert_many.called)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['Message'], task_messages.invalid_import)
+
+    """
+    Events route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.watch')
+    def test_events(self, mocked_task_repository_watch):
+        """
+        It should stream the changes of tasks as Server-Sent Events, resuming after the "Last-Event-ID" header
+        """
+
+        mocked_task_repository_watch.return_value = iter([
+            {'id': 'hub-2', 'type': 'create', 'data': {'task': test_utils.task_with_valid_body}},
+            None,
+            {'id': 'hub-3', 'type': 'delete', 'data': {'name': 'test_name'}}])
+
+        response = self.test_client.get(events_route + '?status=TO_DO', headers={'Last-Event-ID': 'hub-1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(response.get_data(as_text=True),
+                         ': keep-alive\n\n'
+                         'id: hub-2\nevent: create\ndata: {"task":' + json.dumps(test_utils.task_with_valid_body,
+                                                                               separators=(',', ':')) + '}\n\n'
+                         ': keep-alive\n\n'
+                         'id: hub-3\nevent: delete\ndata: {"name":"test_name"}\n\n')
+        mocked_task_repository_watch.assert_called_with('to_do', 'hub-1')
+
+    @patch('todo_list.repositories.task_repository.watch')
+    def test_events_invalid_status(self, mocked_task_repository_watch):
+        """
+        It should return 400 when filtering the changes by an invalid status
+        """
+
+        response = self.test_client.get(events_route + '?status=invalid_status')
+
+        self.assertFalse(mocked_task_repository_watch.called)
+        self.assertEqual(response.get_json()['Message'], task_messages.invalid_status)
+        self.assertEqual(response.status_code, 400)
+
+    """
+    Metrics route tests
+    """
+
+    @patch('todo_list.repositories.task_repository.get_by_name')
+    def test_metrics(self, mocked_task_repository_get_by_name):
+        """
+        It should return the latency of requests by route and status in the Prometheus text format
+        """
+
+        mocked_task_repository_get_by_name.return_value = None
+        self.test_client.get(get_by_name_route + 'i_dont_exist')
+
+        response = self.test_client.get(urls.metrics)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('todo_list_http_request_duration_seconds_count{route="' + get_by_name_route +
+                      '<string:task_name>",method="GET",status="404"}', response.get_data(as_text=True))
@@ -0,0 +1,59 @@
+import os
+from pymongo import AsyncMongoClient
+
+from todo_list.dbs import mongo
+
+"""
+This module creates instances to manipulate database from asyncio code (used by the async stack).
+
+As in dbs.mongo, the client is created on first use, once per process, with the same options.
+"""
+
+# Client of this process and its collection of tasks, None until first used
+_client = None
+_tasks = None
+
+
+class LazyCollection:
+    """ The collection of tasks of the asyncio client of the current process, which is created when it is first used """
+
+    def __getattr__(self, name):
+        return getattr(get_tasks(), name)
+
+
+# Gets the collection of tasks, whose client (and its connection pool, reported on "/metrics") is created on first use
+tasks = LazyCollection()
+
+
+def get_client():
+    """ Returns the asyncio client of this process, creating it on first use """
+    global _client, _tasks
+    if _client is None:
+        client = AsyncMongoClient(os.environ.get("MONGO_CONNECTION"), **mongo.client_options())
+        _tasks = client[os.environ.get("MONGO_DATABASE")][os.environ.get("MONGO_TASK_COLLECTION")]
+        _client = client
+    return _client
+
+
+def get_tasks():
+    """ Returns the collection of tasks of the asyncio client of this process """
+    get_client()
+    return _tasks
+
+
+def reset():
+    """ Forgets the client of the parent process in a forked child (e.g. a gunicorn worker), without closing it """
+    global _client, _tasks
+    _client = None
+    _tasks = None
+
+
+async def close():
+    """ Closes the client of this process, if it was created. The next use creates another one """
+    client = _client
+    reset()
+    if client is not None:
+        await client.close()
+
+
+os.register_at_fork(after_in_child=reset)
@@ -1,15 +1,90 @@
 import os
+import threading
 from pymongo import MongoClient
 
+from todo_list.monitoring import instrumentation
+
 """
-This module creates instances to manipulate database
+This module creates instances to manipulate database.
+
+The client is created on first use, once per process: MongoClient is not fork-safe, so a client created before
+gunicorn forks its workers (e.g. by a preloaded app) is forgotten by each worker, which creates its own.
 """
 
-# Gets instance of MongoDb client
-client = MongoClient(os.environ.get("MONGO_CONNECTION"))
+# Options of the clients set by environment variables: (variable, option of MongoClient, parser). Options whose
+# variables are not set keep the defaults of pymongo (or the ones of "MONGO_CONNECTION")
+client_settings = [('MONGO_MAX_POOL_SIZE', 'maxPoolSize', int),
+                   ('MONGO_MIN_POOL_SIZE', 'minPoolSize', int),
+                   ('MONGO_MAX_IDLE_TIME_MS', 'maxIdleTimeMS', int),
+                   ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'waitQueueTimeoutMS', int),
+                   ('MONGO_CONNECT_TIMEOUT_MS', 'connectTimeoutMS', int),
+                   ('MONGO_SOCKET_TIMEOUT_MS', 'socketTimeoutMS', int),
+                   ('MONGO_SERVER_SELECTION_TIMEOUT_MS', 'serverSelectionTimeoutMS', int),
+                   ('MONGO_COMPRESSORS', 'compressors', str),
+                   ('MONGO_ZLIB_COMPRESSION_LEVEL', 'zlibCompressionLevel', int),
+                   ('MONGO_WRITE_CONCERN', 'w', lambda value: int(value) if value.isdigit() else value),
+                   ('MONGO_JOURNAL', 'journal', lambda value: value.lower() == 'true'),
+                   ('MONGO_APP_NAME', 'appname', str)]
+
+# Client of this process and its collection of tasks, None until first used
+_client = None
+_tasks = None
+_lock = threading.Lock()
+
+
+class LazyCollection:
+    """ The collection of tasks of the client of the current process, which is created when it is first used """
+
+    def __getattr__(self, name):
+        return getattr(get_tasks(), name)
+
+
+# Gets the collection of tasks, whose client (and its connection pool, reported on "/metrics") is created on first use
+tasks = LazyCollection()
+
+
+def client_options():
+    """ Returns the options of the clients set by "client_settings", reporting their pools when pymongo supports it """
+    options = {'event_listeners': [instrumentation.PoolListener()]} if instrumentation.pool_events_supported else {}
+    for variable, option, parse in client_settings:
+        value = os.environ.get(variable)
+        if value:
+            options[option] = parse(value)
+    return options
+
+
+def get_client():
+    """ Returns the client of this process, creating it on first use """
+    global _client, _tasks
+    if _client is None:
+        with _lock:
+            if _client is None:
+                client = MongoClient(os.environ.get("MONGO_CONNECTION"), **client_options())
+                _tasks = client[os.environ.get("MONGO_DATABASE")][os.environ.get("MONGO_TASK_COLLECTION")]
+                _client = client
+    return _client
+
+
+def get_tasks():
+    """ Returns the collection of tasks of the client of this process """
+    get_client()
+    return _tasks
+
+
+def reset():
+    """ Forgets the client of the parent process in a forked child (e.g. a gunicorn worker), without closing it """
+    global _client, _tasks, _lock
+    _client = None
+    _tasks = None
+    _lock = threading.Lock()
+
+
+def close():
+    """ Closes the client of this process, if it was created. The next use creates another one """
+    client = _client
+    reset()
+    if client is not None:
+        client.close()
 
-# Gets instance of a database from MongoDb
-database = client[os.environ.get("MONGO_DATABASE")]
 
-# Gets instance of a collection from database
-tasks = database[os.environ.get("MONGO_TASK_COLLECTION")]
+os.register_at_fork(after_in_child=reset)
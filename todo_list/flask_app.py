@@ -1,12 +1,37 @@
 import logging
 import os
 from flask import Flask
+from flask import request
 
+from todo_list.monitoring import instrumentation
+from todo_list.monitoring import logs
+from todo_list.monitoring import metrics
+from todo_list.monitoring import profiling
+from todo_list.repositories import idempotency_keys
+from todo_list.repositories import task_cache
+from todo_list.repositories import task_repository
+from todo_list.repositories.engines.memory_engine import MemoryEngine
+from todo_list.repositories.engines.mongo_engine import MongoEngine
+from todo_list.routes import admission
+from todo_list.routes import compression
+from todo_list.routes import urls
+from todo_list.routes.json_provider import TaskJSONProvider
+from todo_list.services import task_json
+from todo_list.services import task_transfer
+from todo_list.routes.monitoring_routes import monitoring
 from todo_list.routes.task_routes import task
 
 
 def create_app():
-    """ Creates and returns a flask instance. Also sets some configurations """
+    """
+    Creates and returns a flask instance. Also sets some configurations
+
+    If "APP_STACK" is "async", a quart instance (an ASGI app with the same routes, served by async views and an
+    asyncio MongoDb client) is returned instead.
+    """
+    if os.environ.get('APP_STACK', 'sync') == 'async':
+        return create_async_app()
+
     app = Flask(__name__)
 
     # Adds task blueprint
@@ -15,21 +40,350 @@ def create_app():
     # Disable alphabetically sort on flask.jsonify()
     app.config['JSON_SORT_KEYS'] = False
 
+    # Encodes JSON with orjson, when it is installed, keeping the order of keys
+    app.json = TaskJSONProvider(app)
+
     # Enabling log in application
     setup_log()
+    if logs.is_sampling():
+        app.before_request(logs.sample_request)
+
+    # Records the metrics of requests and serves them on "/metrics"
+    setup_metrics()
+    app.register_blueprint(monitoring)
+    app.before_request(instrumentation.start_request)
+    app.after_request(instrumentation.record_status)
+    app.teardown_request(instrumentation.end_request)
+
+    # Profiles the requests that ask for it (or a sample of them), serving the profiles on "/profiles"
+    if setup_profiling():
+        app.before_request(profiling.start_request)
+        app.after_request(profiling.record_response)
+        app.teardown_request(profiling.end_request)
+
+    # Compresses the responses accepted compressed by clients
+    if setup_compression():
+        app.after_request(compression.compress_response)
+
+    # Sheds the task requests over the limits of their routes or of their clients, before they reach MongoDb
+    if setup_admission():
+        app.before_request(admission.admit_request)
+        app.after_request(admission.release_request)
+        app.teardown_request(admission.end_request)
+
+    # Enables the cache of tasks by name
+    setup_cache()
+
+    # Sets where tasks are stored
+    task_repository.configure(create_engine(), counts_ttl(), version_ttl(), conditional_requests_enabled())
+    task_repository.configure_insert_batching(*insert_batching_parameters())
+    task_repository.configure_read_coalescing(read_coalescing_enabled())
+    task_transfer.configure(*transfer_parameters())
+
+    # Sets where the responses of the requests with an "Idempotency-Key" header are kept
+    idempotency_keys.configure(create_key_store())
+
+    # Ensures the unique index on task name, which the writes rely on, and sets where "/task/events" gets the changes
+    # of tasks from on the first task request of each process, so starting the app does not wait for MongoDb
+    events = events_parameters()
+
+    def prepare():
+        if request.blueprint == task.name:
+            task_repository.prepare(*events)
+
+    app.before_request(prepare)
 
     return app
 
 
-def setup_log():
-    """ Sets a pattern to 'logger' log """
-    logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
+def create_async_app():
+    """ Creates and returns a quart instance, the async stack. It needs quart to be installed """
+    from quart import Quart
+    from quart import request as quart_request
+    from todo_list.repositories import async_task_repository
+    from todo_list.repositories.engines.async_engine import AsyncEngine
+    from todo_list.routes import async_requests
+    from todo_list.routes.async_monitoring_routes import monitoring as async_monitoring
+    from todo_list.routes.async_task_routes import task as async_task
+
+    app = Quart(__name__)
+
+    # Adds task blueprint
+    app.register_blueprint(async_task, url_prefix='/task')
+
+    # Bounds the bodies of imports, which are read in chunks, by "MAX_IMPORT_CONTENT_LENGTH" instead of quart's
+    # MAX_CONTENT_LENGTH
+    app.request_class = async_requests.TaskRequest
+    async_requests.configure(['/task' + urls.import_tasks], max_import_content_length())
+
+    # Disable alphabetically sort on jsonify()
+    app.config['JSON_SORT_KEYS'] = False
+
+    # Encodes JSON with orjson, when it is installed, keeping the order of keys
+    app.json = TaskJSONProvider(app)
+
+    # Enabling log in application
+    setup_log()
+    if logs.is_sampling():
+        app.before_request(logs.sample_async_request)
+
+    # Records the metrics of requests and serves them on "/metrics"
+    setup_metrics()
+    app.register_blueprint(async_monitoring)
+    app.before_request(instrumentation.start_async_request)
+    app.after_request(instrumentation.record_async_status)
+    app.teardown_request(instrumentation.end_async_request)
+
+    # Profiles the requests that ask for it (or a sample of them), serving the profiles on "/profiles"
+    if setup_profiling():
+        app.before_request(profiling.start_async_request)
+        app.after_request(profiling.record_async_response)
+        app.teardown_request(profiling.end_async_request)
+
+    # Compresses the responses accepted compressed by clients
+    if setup_compression():
+        app.after_request(compression.compress_async_response)
+
+    # Sheds the task requests over the limits of their routes or of their clients, before they reach MongoDb
+    if setup_admission(async_stack=True):
+        app.before_request(admission.admit_async_request)
+        app.teardown_request(admission.end_async_request)
+
+    # Enables the cache of tasks by name
+    setup_cache()
+
+    # Sets where tasks are stored
+    if os.environ.get('STORAGE_ENGINE', 'mongo') == 'memory':
+        async_task_repository.configure(AsyncEngine(create_engine()), counts_ttl(), version_ttl(),
+                                        conditional_requests_enabled())
+    else:
+        from todo_list.dbs import async_mongo
+        from todo_list.repositories.engines.async_mongo_engine import AsyncMongoEngine
+        async_task_repository.configure(AsyncMongoEngine(async_mongo.tasks), counts_ttl(), version_ttl(),
+                                        conditional_requests_enabled())
+        app.after_serving(async_mongo.close)
+    async_task_repository.configure_insert_batching(*insert_batching_parameters())
+    async_task_repository.configure_read_coalescing(read_coalescing_enabled())
+    task_transfer.configure(*transfer_parameters())
+
+    # Sets where the responses of the requests with an "Idempotency-Key" header are kept
+    idempotency_keys.configure(create_key_store(async_stack=True))
+
+    # Ensures the unique index on task name, which the writes rely on, and sets where "/task/events" gets the changes
+    # of tasks from on the first task request of each process, so starting the app does not wait for MongoDb
+    events = events_parameters()
+
+    async def prepare():
+        if quart_request.blueprint == async_task.name:
+            await async_task_repository.prepare(*events)
+
+    app.before_request(prepare)
+
+    return app
+
+
+def create_engine():
+    """
+    Creates the storage engine set by "STORAGE_ENGINE": "mongo" (default) or "memory".
+
+    The memory engine keeps tasks in the process, so they are lost on restart and not shared between workers.
+    """
+    if os.environ.get('STORAGE_ENGINE', 'mongo') == 'memory':
+        return MemoryEngine()
 
-    my_formatter = logging.Formatter("%(asctime)s %(levelname)7s "
-                                     "[%(filename)s:%(lineno)s - %(funcName)20s()] %(message)s")
+    from todo_list.dbs.mongo import tasks
+    return MongoEngine(tasks)
 
-    my_handler = logging.StreamHandler()
-    my_handler.setFormatter(my_formatter)
 
-    logger.addHandler(my_handler)
-    logger.setLevel(logging.DEBUG)
+def create_key_store(async_stack=False):
+    """
+    Creates the store of the responses of requests with an "Idempotency-Key" header, kept for "IDEMPOTENCY_TTL"
+    seconds (default one day), or None if "IDEMPOTENCY_ENABLED" is false.
+
+    With the memory engine, each process keeps up to "IDEMPOTENCY_MAX_SIZE" keys, so a retry only gets the first
+    response if it reaches the same worker. With MongoDb, the keys are shared by all processes.
+    """
+    if os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() != 'true':
+        return None
+
+    ttl = float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    if os.environ.get('STORAGE_ENGINE', 'mongo') == 'memory':
+        store = idempotency_keys.MemoryKeyStore(int(os.environ.get('IDEMPOTENCY_MAX_SIZE', 10000)), ttl)
+        if async_stack:
+            from todo_list.repositories.engines.async_engine import AsyncEngine
+            return AsyncEngine(store)
+        return store
+
+    if async_stack:
+        from todo_list.dbs import async_mongo
+        return idempotency_keys.AsyncMongoKeyStore(async_mongo.tasks, ttl)
+
+    from todo_list.dbs.mongo import tasks
+    return idempotency_keys.MongoKeyStore(tasks, ttl)
+
+
+def counts_ttl():
+    """ Returns for how many seconds "/task/stats" may reuse the counts of tasks ("TASK_STATS_TTL") """
+    return float(os.environ.get('TASK_STATS_TTL', 5))
+
+
+def conditional_requests_enabled():
+    """
+    Returns whether the version of the tasks is kept to answer conditional requests ("CONDITIONAL_REQUESTS_ENABLED",
+    default false). It costs every write a round trip more, to change the version
+    """
+    return os.environ.get('CONDITIONAL_REQUESTS_ENABLED', 'false').lower() == 'true'
+
+
+def version_ttl():
+    """
+    Returns for how many seconds the version of the tasks, which answers conditional requests, may be reused
+    ("TASK_VERSION_TTL"). It bounds how long writes made by other workers take to be seen.
+    """
+    return float(os.environ.get('TASK_VERSION_TTL', 1))
+
+
+def insert_batching_parameters():
+    """
+    Returns whether concurrent inserts of single tasks are written together ("INSERT_BATCH_ENABLED", default false),
+    how many tasks are written at once ("INSERT_BATCH_MAX_SIZE") and how many seconds an insert may wait for others
+    ("INSERT_BATCH_MAX_DELAY"). Larger values trade the latency of "/task/add" for throughput under bursts.
+    """
+    return (os.environ.get('INSERT_BATCH_ENABLED', 'false').lower() == 'true',
+            int(os.environ.get('INSERT_BATCH_MAX_SIZE', 100)),
+            float(os.environ.get('INSERT_BATCH_MAX_DELAY', 0.005)))
+
+
+def read_coalescing_enabled():
+    """
+    Returns whether identical concurrent reads of lists of tasks share one query and one encoded response
+    ("READ_COALESCING_ENABLED", default false). Coalesced lists are read whole, even when streamed.
+    """
+    return os.environ.get('READ_COALESCING_ENABLED', 'false').lower() == 'true'
+
+
+def transfer_parameters():
+    """
+    Returns how many tasks "/task/import" writes at once and "/task/export" sends at once ("TRANSFER_CHUNK_SIZE") and
+    how many invalid lines an import reports ("IMPORT_MAX_REPORTED_ERRORS"). Larger chunks mean fewer round trips to
+    MongoDb, but more memory per request.
+    """
+    return (int(os.environ.get('TRANSFER_CHUNK_SIZE', 1000)),
+            int(os.environ.get('IMPORT_MAX_REPORTED_ERRORS', 100)))
+
+
+def max_import_content_length():
+    """
+    Returns the maximum size (in bytes) of the body of "/task/import" on the async stack ("MAX_IMPORT_CONTENT_LENGTH")
+    or None (default) if it is not bound. Imports are read in chunks, so their size does not change the memory they use.
+    """
+    max_size = int(os.environ.get('MAX_IMPORT_CONTENT_LENGTH', 0))
+    return max_size if max_size > 0 else None
+
+
+def events_parameters():
+    """
+    Returns where "/task/events" gets the changes of tasks from ("TASK_EVENTS_SOURCE"): "change_streams" (MongoDb
+    change streams, which need a replica set), "hub" (the writes of the worker itself) or "auto" (default, change
+    streams when available), how many events the hub keeps for reconnecting clients ("TASK_EVENTS_HISTORY") and
+    after how many seconds without events a keep-alive is sent ("TASK_EVENTS_HEARTBEAT").
+    """
+    return (os.environ.get('TASK_EVENTS_SOURCE', 'auto').lower(),
+            int(os.environ.get('TASK_EVENTS_HISTORY', 1000)),
+            float(os.environ.get('TASK_EVENTS_HEARTBEAT', 15)))
+
+
+def setup_compression():
+    """
+    Sets the compression of responses from "COMPRESSION_*" variables, returning if it is enabled
+    ("COMPRESSION_ENABLED", default true).
+    """
+    compression.configure(int(os.environ.get('COMPRESSION_LEVEL', 6)),
+                          int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+                          int(os.environ.get('COMPRESSION_CACHE_SIZE', 128)),
+                          float(os.environ.get('COMPRESSION_CACHE_TTL', 60)))
+    return os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+
+
+def setup_admission(async_stack=False):
+    """
+    Sets the admission control of task requests from "ADMISSION_*" and "RATE_LIMIT*" variables, returning if any
+    limit is enabled.
+
+    With "ADMISSION_ENABLED" (default false), each route handles at most its limit in "ADMISSION_LIMITS" (e.g.
+    "get_by_name=64,get_all=8") or "ADMISSION_DEFAULT_LIMIT" requests at once in the whole server (each worker gets
+    its share, see admission.configure_workers), and up to "ADMISSION_QUEUE_SIZE" requests per worker wait
+    "ADMISSION_QUEUE_TIMEOUT" seconds for a slot. The others get 503 with "Retry-After: ADMISSION_RETRY_AFTER".
+    "RATE_LIMIT" (requests per second, default 0, disabled) limits each client, told by "RATE_LIMIT_CLIENT_HEADER" or
+    by address, allowing bursts of "RATE_LIMIT_BURST" requests.
+    """
+    admission.configure(os.environ.get('ADMISSION_ENABLED', 'false').lower() == 'true',
+                        admission.parse_limits(os.environ.get('ADMISSION_LIMITS', '')),
+                        int(os.environ.get('ADMISSION_DEFAULT_LIMIT', 32)),
+                        int(os.environ.get('ADMISSION_QUEUE_SIZE', 16)),
+                        float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 0.5)),
+                        int(os.environ.get('ADMISSION_RETRY_AFTER', 1)),
+                        async_stack)
+    admission.configure_rate_limit(float(os.environ.get('RATE_LIMIT', 0)),
+                                   float(os.environ.get('RATE_LIMIT_BURST', 0)) or None,
+                                   os.environ.get('RATE_LIMIT_CLIENT_HEADER') or None)
+    return admission.limiters is not None or admission.rate_limiter is not None
+
+
+def setup_cache():
+    """
+    Enables the cache of tasks by name if "TASK_CACHE_ENABLED" is true.
+
+    Also enables the cache of the JSON of tasks if "TASK_JSON_CACHE_ENABLED" is true or, by default ("auto"), if
+    orjson is not installed, as encoding a list with orjson is faster than joining the cached JSON of its tasks.
+    """
+    task_cache.configure(os.environ.get('TASK_CACHE_ENABLED', 'false').lower() == 'true',
+                         int(os.environ.get('TASK_CACHE_MAX_SIZE', 1024)),
+                         float(os.environ.get('TASK_CACHE_TTL', 5)))
+
+    json_cache_enabled = os.environ.get('TASK_JSON_CACHE_ENABLED', 'auto').lower()
+    task_cache.configure_fragments(json_cache_enabled == 'true' or
+                                   (json_cache_enabled == 'auto' and task_json.orjson is None),
+                                   int(os.environ.get('TASK_JSON_CACHE_MAX_SIZE', 100000)))
+
+
+def setup_metrics():
+    """
+    Sets where metrics are shared by the processes of the server ("METRICS_DIR"), so "/metrics" adds up all gunicorn
+    workers. Without it, each worker reports only its own metrics.
+    """
+    metrics.configure(os.environ.get('METRICS_DIR') or None, float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)))
+
+
+def setup_profiling():
+    """
+    Sets the profiling of requests from "PROFILING_*" variables, returning if it is enabled ("PROFILING_ENABLED",
+    default false, and a "PROFILING_TOKEN", without which it stays disabled).
+
+    Requests with the "X-Profile" header, whose value must be "PROFILING_TOKEN", and a fraction
+    "PROFILING_SAMPLE_RATE" (default 0) of the others run under cProfile. The last "PROFILING_BUFFER_SIZE" profiles,
+    with their "PROFILING_TOP_SIZE" slowest functions, are served on "/profiles" and dumped as pstats files to
+    "PROFILING_DIR", if it is set.
+    """
+    profiling.configure(os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true',
+                        os.environ.get('PROFILING_TOKEN') or None,
+                        float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+                        int(os.environ.get('PROFILING_BUFFER_SIZE', 32)),
+                        int(os.environ.get('PROFILING_TOP_SIZE', 20)),
+                        os.environ.get('PROFILING_DIR') or None)
+    return profiling.profiles is not None
+
+
+def setup_log():
+    """
+    Sets 'logger' to write records with at least "LOG_LEVEL" (default INFO), as text or as JSON ("LOG_FORMAT"), from a
+    background thread.
+
+    "LOG_SAMPLE_RATES" (e.g. "get_by_name=0.01") keeps the logs of only a fraction of the requests to some routes, and
+    "LOG_SAMPLE_RATE" of the requests to the others.
+    """
+    logs.configure(logging.getLogger(os.environ.get('LOGGER_NAME')),
+                   os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                   os.environ.get('LOG_FORMAT', 'text').lower() == 'json',
+                   logs.parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', '')),
+                   float(os.environ.get('LOG_SAMPLE_RATE', 1)))
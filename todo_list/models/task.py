@@ -1,8 +1,40 @@
-class Task:
+from operator import itemgetter
 
-    expected_status = ['to_do', 'doing', 'done']
 
-    def __init__(self, name, description, status):
-        self.name = name
-        self.description = description
-        self.status = status
+class Task(tuple):
+    """
+    A task, uniquely identified by its name.
+
+    Tasks are immutable (name, description, status) tuples without a per-instance dict, so they are cheap to create
+    and compare. Writes build new tasks and storage engines convert them with to_document() and from_document().
+    """
+
+    __slots__ = ()
+
+    # Status a task may have, in the order they are reported
+    expected_status = ('to_do', 'doing', 'done')
+
+    # The same status, for membership tests
+    valid_status = frozenset(expected_status)
+
+    def __new__(cls, name, description, status):
+        return tuple.__new__(cls, (name, description, status))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __repr__(self):
+        return f'Task({self[0]!r}, {self[1]!r}, {self[2]!r})'
+
+    name = property(itemgetter(0), doc='Unique name of the task')
+    description = property(itemgetter(1), doc='Description of the task')
+    status = property(itemgetter(2), doc='One of "expected_status"')
+
+    def to_document(self):
+        """ Returns a new dict with the fields of the task, in the order they are stored and returned """
+        return {'name': self[0], 'description': self[1], 'status': self[2]}
+
+    @classmethod
+    def from_document(cls, document):
+        """ Returns the task of a stored dict (e.g. a MongoDb document), ignoring any other field """
+        return cls(document['name'], document['description'], document['status'])
@@ -0,0 +1,279 @@
+import functools
+import inspect
+import time
+import flask
+from pymongo import monitoring
+
+from todo_list.monitoring import metrics
+
+"""
+This module records the metrics of requests, admission control, task repository functions, the cache of tasks and
+the MongoDb connection pool.
+
+Recording a value is a dict update under a lock, so instrumentation can be left on all the time.
+"""
+
+
+def start_request():
+    """ Runs before each request of the flask app (see flask_app.setup_metrics) """
+    _start_request(flask.g, flask.request)
+
+
+def record_status(response):
+    """ Runs after each request of the flask app that returned a response, keeping its status code """
+    flask.g.metrics_status = response.status_code
+    return response
+
+
+def end_request(error=None):
+    """ Runs at the end of each request of the flask app, even when it failed, recording its latency """
+    _end_request(flask.g)
+
+
+async def start_async_request():
+    """ Runs before each request of the quart app """
+    import quart
+    _start_request(quart.g, quart.request)
+
+
+async def record_async_status(response):
+    """ Runs after each request of the quart app that returned a response, keeping its status code """
+    import quart
+    quart.g.metrics_status = response.status_code
+    return response
+
+
+async def end_async_request(error=None):
+    """ Runs at the end of each request of the quart app, even when it failed, recording its latency """
+    import quart
+    _end_request(quart.g)
+
+
+def _start_request(g, request):
+    # Labels by the rule of the route, so task names do not become labels
+    g.metrics_labels = ('route', request.url_rule.rule if request.url_rule is not None else 'unmatched'), \
+        ('method', request.method)
+    g.metrics_start = time.perf_counter()
+    metrics.registry.add('todo_list_http_requests_in_progress', g.metrics_labels, 1)
+
+
+def _end_request(g):
+    if 'metrics_start' not in g:
+        return
+
+    metrics.registry.add('todo_list_http_requests_in_progress', g.metrics_labels, -1)
+    metrics.registry.observe('todo_list_http_request_duration_seconds',
+                             g.metrics_labels + (('status', str(g.get('metrics_status', 500))),),
+                             time.perf_counter() - g.metrics_start)
+
+
+def record_admission(labels, waited):
+    """ Records a request admitted by a limiter of routes.admission after waiting "waited" seconds for a slot """
+    metrics.registry.add('todo_list_admission_active_requests', labels, 1)
+    metrics.registry.observe('todo_list_admission_wait_seconds', labels, waited)
+
+
+def record_release(labels):
+    """ Records the end of a request admitted by a limiter of routes.admission """
+    metrics.registry.add('todo_list_admission_active_requests', labels, -1)
+
+
+def record_queued(labels, amount):
+    """ Records requests that started (1) or stopped (-1) waiting for a slot of a limiter of routes.admission """
+    metrics.registry.add('todo_list_admission_queued_requests', labels, amount)
+
+
+def record_rejection(labels, reason):
+    """ Records a request shed by routes.admission ("queue_full", "queue_timeout" or "rate_limited") """
+    metrics.registry.increment('todo_list_admission_rejected_total', labels + (('reason', reason),))
+
+
+def record_coalesced(function_name):
+    """ Records a call to a repository function that shared the result of an identical call in flight """
+    metrics.registry.increment('todo_list_repository_coalesced_calls_total', (('function', function_name),))
+
+
+def record_cache_lookup(hit):
+    """ Records a lookup of the cache of tasks by name (see repositories.task_cache) """
+    metrics.registry.increment('todo_list_task_cache_lookups_total', (('result', 'hit' if hit else 'miss'),))
+
+
+def record_cache_eviction():
+    """ Records an entry evicted from the full cache of tasks by name """
+    metrics.registry.increment('todo_list_task_cache_evictions_total', ())
+
+
+def timed(function):
+    """
+    Records the latency and outcome ("ok" or "error") of each call to a repository function, which may be a
+    coroutine function.
+    """
+    labels = (('function', function.__name__),)
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = await function(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                _observe_call(labels, outcome, time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = function(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            _observe_call(labels, outcome, time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed_reads(function):
+    """
+    Records the latency and outcome of a repository function that returns an iterable (e.g. a MongoDb cursor), or
+    an asynchronous iterable for coroutine functions.
+
+    Cursors only query MongoDb when they are read, so the latency adds the time spent getting each item. It is
+    recorded once the iterable is exhausted or discarded, or at once for lists, which were already read.
+    """
+    labels = (('function', function.__name__),)
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                items = await function(*args, **kwargs)
+            except Exception:
+                _observe_call(labels, 'error', time.perf_counter() - start)
+                raise
+            if isinstance(items, list):
+                _observe_call(labels, 'ok', time.perf_counter() - start)
+                return items
+            return _timed_async_items(labels, items, time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            items = function(*args, **kwargs)
+        except Exception:
+            _observe_call(labels, 'error', time.perf_counter() - start)
+            raise
+        if isinstance(items, list):
+            _observe_call(labels, 'ok', time.perf_counter() - start)
+            return items
+        return _timed_items(labels, items, time.perf_counter() - start)
+
+    return wrapper
+
+
+def _timed_items(labels, items, elapsed):
+    outcome = 'error'
+    try:
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                outcome = 'ok'
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    except GeneratorExit:
+        outcome = 'ok'
+        raise
+    finally:
+        _observe_call(labels, outcome, elapsed)
+
+
+async def _timed_async_items(labels, items, elapsed):
+    outcome = 'error'
+    try:
+        iterator = items.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                outcome = 'ok'
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    except GeneratorExit:
+        outcome = 'ok'
+        raise
+    finally:
+        _observe_call(labels, outcome, elapsed)
+
+
+def _observe_call(labels, outcome, elapsed):
+    metrics.registry.observe('todo_list_repository_call_duration_seconds', labels + (('outcome', outcome),), elapsed)
+
+
+# Whether pymongo reports the events of connection pools (pymongo 3.9 and later)
+pool_events_supported = hasattr(monitoring, 'ConnectionPoolListener')
+
+
+class PoolListener(monitoring.ConnectionPoolListener if pool_events_supported else object):
+    """
+    Keeps the gauges and counters of the connection pools of a MongoDb client (see dbs.mongo). It is only registered
+    when "pool_events_supported"
+    """
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.registry.increment('todo_list_mongo_pool_cleared_total', _address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.registry.add('todo_list_mongo_pool_connections', _address(event), 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.registry.add('todo_list_mongo_pool_connections', _address(event), -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        metrics.registry.increment('todo_list_mongo_pool_checkout_failures_total', _address(event))
+
+    def connection_checked_out(self, event):
+        metrics.registry.add('todo_list_mongo_pool_checked_out_connections', _address(event), 1)
+
+        # Only informed by recent versions of pymongo
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            metrics.registry.observe('todo_list_mongo_pool_checkout_duration_seconds', _address(event), duration)
+
+    def connection_checked_in(self, event):
+        metrics.registry.add('todo_list_mongo_pool_checked_out_connections', _address(event), -1)
+
+
+def _address(event):
+    return (('address', '%s:%s' % event.address),)
@@ -0,0 +1,134 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import flask
+from datetime import datetime
+from datetime import timezone
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+"""
+This module sets up the application logs.
+
+Records are put in a queue by the request threads and written by a background thread, so requests never wait for
+stderr. Records of requests are sampled by route (see sample_request()).
+"""
+
+# Pattern of text logs
+text_format = "%(asctime)s %(levelname)7s [%(filename)s:%(lineno)s - %(funcName)20s()] %(message)s"
+
+# Whether the logs of the current request are kept, decided once per request
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+# Route (the name of its view) -> rate of requests whose logs are kept
+sample_rates = {}
+
+# Rate of the routes that are not in "sample_rates"
+default_sample_rate = 1.0
+
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats records as one JSON object per line """
+
+    def format(self, record):
+        log = {'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+               'level': record.levelname,
+               'logger': record.name,
+               'message': record.getMessage(),
+               'file': record.filename,
+               'line': record.lineno,
+               'function': record.funcName}
+        if record.exc_info:
+            log['exception'] = self.formatException(record.exc_info)
+        return json.dumps(log)
+
+
+class SampleFilter(logging.Filter):
+    """ Drops the records of requests that were not sampled """
+
+    def filter(self, record):
+        return _sampled.get()
+
+
+def configure(logger, level='INFO', json_output=False, new_sample_rates=None, new_default_sample_rate=1.0):
+    """
+    Makes "logger" write records with at least "level" to stderr, as text or as JSON, through a queue.
+
+    Calling it again replaces the previous setup.
+    """
+    global _listener, _handler, sample_rates, default_sample_rate
+    sample_rates = new_sample_rates or {}
+    default_sample_rate = new_default_sample_rate
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if json_output else logging.Formatter(text_format))
+
+    if _listener is not None:
+        _listener.stop()
+        logger.removeHandler(_handler)
+
+    records = queue.SimpleQueue()
+    _handler = QueueHandler(records)
+    _handler.addFilter(SampleFilter())
+    _listener = QueueListener(records, stream_handler)
+    _listener.start()
+
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+
+
+def is_sampling():
+    """ Verifies if the logs of some route are sampled """
+    return default_sample_rate < 1 or any(rate < 1 for rate in sample_rates.values())
+
+
+def sample_request():
+    """ Runs before each request of the flask app, deciding if its logs are kept (see flask_app.setup_log) """
+    _sample(flask.request.endpoint)
+
+
+async def sample_async_request():
+    """ Runs before each request of the quart app, deciding if its logs are kept """
+    import quart
+    _sample(quart.request.endpoint)
+
+
+def _sample(endpoint):
+    # Routes are named by their views, without the blueprint
+    route = endpoint.rsplit('.', 1)[-1] if endpoint else None
+    _sampled.set(random.random() < sample_rates.get(route, default_sample_rate))
+
+
+def parse_sample_rates(text):
+    """ Reads rates written as "route=rate,route=rate" (e.g. "get_by_name=0.01,get_all=0.1") """
+    rates = {}
+    for item in text.split(','):
+        if item.strip():
+            route, rate = item.split('=')
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+def _stop():
+    """ Writes the records left in the queue when the process exits """
+    if _listener is not None:
+        _listener.stop()
+
+
+def _after_fork():
+    """ A forked process (e.g. a gunicorn worker of a preloaded app) needs its own thread writing the records """
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers)
+        _listener.start()
+
+
+atexit.register(_stop)
+os.register_at_fork(after_in_child=_after_fork)
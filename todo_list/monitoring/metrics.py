@@ -0,0 +1,226 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+"""
+This module keeps the metrics of the process (latency histograms, counters and gauges) and renders them in the
+Prometheus text format.
+
+When a directory is configured (see configure()), every process (e.g. each gunicorn worker) periodically writes its
+metrics to a file in it, and render() adds up the files of all processes, so a scrape reaching any worker sees the
+whole server. Gauges of processes that are no longer running are ignored; counters and histograms are kept, so they
+never go backwards. The directory must be emptied before the server starts.
+"""
+
+# Upper bounds (in seconds) of the latency histograms' buckets
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Type and help of each metric
+descriptions = {
+    'todo_list_http_request_duration_seconds': ('histogram', 'Time spent handling requests, by route and status'),
+    'todo_list_http_requests_in_progress': ('gauge', 'Requests being handled, by route'),
+    'todo_list_admission_active_requests': ('gauge', 'Requests admitted by the limiter of their route, by route'),
+    'todo_list_admission_queued_requests': ('gauge', 'Requests waiting for a slot of the limiter of their route'),
+    'todo_list_admission_wait_seconds': ('histogram', 'Time admitted requests waited for a slot, by route'),
+    'todo_list_admission_rejected_total': ('counter', 'Requests shed by admission control, by route and reason'),
+    'todo_list_repository_call_duration_seconds': ('histogram', 'Time spent in task repository functions, '
+                                                                'including reading their results'),
+    'todo_list_repository_coalesced_calls_total': ('counter', 'Calls to task repository functions that shared the '
+                                                              'result of an identical call in flight'),
+    'todo_list_task_cache_lookups_total': ('counter', 'Lookups of the cache of tasks by name, by result (hit or miss)'),
+    'todo_list_task_cache_evictions_total': ('counter', 'Entries evicted from the full cache of tasks by name'),
+    'todo_list_mongo_pool_connections': ('gauge', 'Open connections of the MongoDb pool'),
+    'todo_list_mongo_pool_checked_out_connections': ('gauge', 'Connections of the MongoDb pool in use'),
+    'todo_list_mongo_pool_checkout_duration_seconds': ('histogram', 'Time waited for a connection of the pool'),
+    'todo_list_mongo_pool_checkout_failures_total': ('counter', 'Failed attempts to get a connection of the pool'),
+    'todo_list_mongo_pool_cleared_total': ('counter', 'Times the MongoDb pool was cleared (e.g. on network errors)'),
+}
+
+
+class Metrics:
+    """
+    Thread-safe storage of metrics.
+
+    Labels are tuples of (name, value) pairs. Histograms keep the (non-cumulative) count of each bucket, the count
+    above the last bucket and the sum of observed values.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        """ Adds a value to a histogram """
+        bucket = bisect.bisect_left(latency_buckets, value)
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(latency_buckets) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += value
+
+    def increment(self, name, labels, amount=1):
+        """ Adds "amount" to a counter """
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add(self, name, labels, amount):
+        """ Adds "amount" (which may be negative) to a gauge """
+        key = (name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def snapshot(self):
+        """ Returns a copy of the metrics that can be written as JSON """
+        with self._lock:
+            return {kind: [[name, [list(label) for label in labels], value if kind != 'histograms' else list(value)]
+                           for (name, labels), value in getattr(self, kind).items()]
+                    for kind in ('histograms', 'counters', 'gauges')}
+
+    def merge(self, snapshot, gauges=True):
+        """ Adds a snapshot (of another process) to these metrics """
+        with self._lock:
+            for name, labels, value in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                histogram = self.histograms.setdefault(key, [0] * len(value))
+                self.histograms[key] = [total + part for total, part in zip(histogram, value)]
+            for kind in ('counters', 'gauges') if gauges else ('counters',):
+                values = getattr(self, kind)
+                for name, labels, value in snapshot[kind]:
+                    key = (name, tuple(tuple(label) for label in labels))
+                    values[key] = values.get(key, 0) + value
+
+    def clear(self):
+        """ Removes all the metrics """
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+
+# Metrics of this process
+registry = Metrics()
+
+# Directory shared by the processes of the server, None when only this process is reported
+directory = None
+
+# Seconds between two writes of the metrics of this process to the directory
+flush_interval = 1.0
+
+_flusher = None
+
+
+def configure(new_directory=None, new_flush_interval=1.0):
+    """ Sets the directory where the processes of the server share their metrics (None for a single process) """
+    global directory, flush_interval
+    directory = new_directory
+    flush_interval = new_flush_interval
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        _start_flusher()
+
+
+def render():
+    """ Returns the metrics (of all processes, if a directory is configured) in the Prometheus text format """
+    metrics = Metrics()
+    if directory is None:
+        metrics.merge(registry.snapshot())
+        return _render(metrics)
+
+    flush()
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+        try:
+            with open(path) as metrics_file:
+                snapshot = json.load(metrics_file)
+        except (OSError, ValueError):
+            continue
+        metrics.merge(snapshot, gauges=pid == os.getpid() or _is_running(pid))
+    return _render(metrics)
+
+
+def flush():
+    """ Writes the metrics of this process to the directory """
+    path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as metrics_file:
+        json.dump(registry.snapshot(), metrics_file)
+    os.replace(temporary_path, path)
+
+
+def _start_flusher():
+    """ Starts the thread that writes the metrics of this process to the directory every "flush_interval" """
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+
+    def run():
+        while directory is not None:
+            time.sleep(flush_interval)
+            flush()
+
+    _flusher = threading.Thread(target=run, name='metrics-flusher', daemon=True)
+    _flusher.start()
+
+
+def _after_fork():
+    """ A forked process (e.g. a gunicorn worker) starts without the metrics of its parent and with its own flusher """
+    registry.clear()
+    if directory is not None:
+        _start_flusher()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _render(metrics):
+    """ Writes the metrics in the Prometheus text format """
+    samples = {}
+    for (name, labels), histogram in metrics.histograms.items():
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for upper_bound, count in zip(latency_buckets + ('+Inf',), histogram):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels + (("le", str(upper_bound)),))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {histogram[-1]}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    for values in (metrics.counters, metrics.gauges):
+        for (name, labels), value in values.items():
+            samples.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+
+    lines = []
+    for name in sorted(samples):
+        kind, description = descriptions[name]
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples[name])
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,279 @@
+import cProfile
+import hmac
+import logging
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from datetime import timezone
+
+from todo_list.services import task_messages
+
+"""
+This module profiles requests on demand, to find where the time of a slow request goes.
+
+Requests with the "X-Profile" header carrying "token" or a sample of "sample_rate" of all requests
+run under cProfile. The top functions of each profiled request and how its time splits between MongoDb, validation,
+JSON and logging are kept in a ring buffer of the last profiles, served by "/profiles", which also serves each
+profile as a pstats file. Profiles may also be dumped as pstats files to "dump_dir".
+
+Profiling is opt-in (see configure()) and needs a token, as profiles hold the paths (e.g. names of tasks) of the
+requests: when it is disabled no hook is installed, and when it is enabled requests that are not profiled only pay a
+header lookup. Only one request is profiled at a time per process, as cProfile sees the
+whole thread and, on the async stack, the coroutines of other requests that run on the event loop in the meantime.
+"""
+
+logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
+
+# Header that asks for a request to be profiled, and the one that returns the id of its profile
+header = 'X-Profile'
+id_header = 'X-Profile-Id'
+
+# Blueprints whose requests are never profiled, as they carry the header to read the profiles
+exempt_blueprints = ('monitoring',)
+
+# Value the header must have to profile a request and to read the profiles, set whenever profiling is enabled
+token = None
+
+# Rate of the requests profiled without the header
+sample_rate = 0.0
+
+# Functions kept in each profile, the ones with the longest own time
+top_size = 20
+
+# Directory where the profiles are dumped as pstats files, None to keep them only in memory
+dump_dir = None
+
+# Profiles of the last requests, newest last, None when profiling is disabled
+profiles = None
+_profiles_lock = threading.Lock()
+
+# Held while a request is profiled
+_profiling = threading.Lock()
+
+# Categories of the time of a request, by fragments of the paths of the modules (or of the names of builtins). The time
+# of other builtins (e.g. reading a socket) goes to the categories of the functions that called them
+categories = (('mongo', ('/pymongo/', '/motor/', '/bson/', 'bson.', '/todo_list/dbs/', 'mongo_engine.py')),
+              ('validation', ('/todo_list/services/task_payloads.py', '/todo_list/models/')),
+              ('json', ('/json/', 'orjson.', '_json.', '/todo_list/services/task_json.py',
+                        '/todo_list/routes/json_provider.py')),
+              ('logging', ('/logging/', '/todo_list/monitoring/logs.py')))
+
+
+class RequestProfile:
+    """ The profiler of a request and what is recorded about it """
+
+    def __init__(self, route, method, path):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.method = method
+        self.path = path
+        self.status = None
+        self.started = datetime.now(timezone.utc)
+        self.profiler = cProfile.Profile()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+
+    def finish(self):
+        """ Stops the profiler and keeps the profile, dumping it if "dump_dir" is set """
+        self.profiler.disable()
+        duration = time.perf_counter() - self._start
+        _profiling.release()
+
+        stats = pstats.Stats(self.profiler).stats
+        record = {'id': self.id, 'route': self.route, 'method': self.method, 'path': self.path,
+                  'status': self.status, 'started': self.started.isoformat(), 'duration': duration,
+                  'split': time_split(stats), 'top': top_functions(stats, top_size)}
+        data = marshal.dumps(stats)
+        if dump_dir is not None:
+            with open(os.path.join(dump_dir, self.id + '.pstats'), 'wb') as file:
+                file.write(data)
+        _keep(record, data)
+
+
+def configure(enabled, new_token=None, new_sample_rate=0.0, buffer_size=32, new_top_size=20, new_dump_dir=None):
+    """
+    Enables (or disables) the profiling of requests, keeping the last "buffer_size" profiles (see the module
+    variables for the other parameters). It is not enabled without a token, so anyone could read the profiles
+    """
+    global profiles, token, sample_rate, top_size, dump_dir
+    if enabled and not new_token:
+        logger.warning('Profiling needs a token, which must be sent on %s to read the profiles, so it was disabled',
+                       header)
+        enabled = False
+    profiles = deque(maxlen=buffer_size) if enabled else None
+    token = new_token
+    sample_rate = new_sample_rate
+    top_size = new_top_size
+    dump_dir = new_dump_dir
+    if enabled and dump_dir is not None:
+        os.makedirs(dump_dir, exist_ok=True)
+
+
+def start_request():
+    """ Runs before each request of the flask app, profiling it if it is asked for or sampled """
+    import flask
+
+    profile = _start(flask.request)
+    if profile is not None:
+        flask.g.profile = profile
+
+
+def record_response(response):
+    """
+    Runs after each request of the flask app, sending the id of its profile. The profile stops once the response is
+    sent (streamed or not)
+    """
+    import flask
+
+    profile = flask.g.pop('profile', None)
+    if profile is not None:
+        profile.status = response.status_code
+        response.headers[id_header] = profile.id
+        response.call_on_close(profile.finish)
+    return response
+
+
+def end_request(error=None):
+    """ Runs at the end of each request of the flask app, stopping the profile of a request that got no response """
+    import flask
+
+    profile = flask.g.pop('profile', None)
+    if profile is not None:
+        profile.finish()
+
+
+async def start_async_request():
+    """ Runs before each request of the quart app, profiling it if it is asked for or sampled """
+    import quart
+
+    profile = _start(quart.request)
+    if profile is not None:
+        quart.g.profile = profile
+
+
+async def record_async_response(response):
+    """ Runs after each request of the quart app, sending the id of its profile """
+    import quart
+
+    profile = quart.g.get('profile')
+    if profile is not None:
+        profile.status = response.status_code
+        response.headers[id_header] = profile.id
+    return response
+
+
+async def end_async_request(error=None):
+    """
+    Runs at the end of each request of the quart app, stopping its profile. As for the slots of admission control,
+    streamed bodies are sent after it (see admission.end_async_request)
+    """
+    import quart
+
+    profile = quart.g.pop('profile', None)
+    if profile is not None:
+        profile.finish()
+
+
+def profiles_response(headers, profile_id=None):
+    """
+    Returns the response (body, status code and headers) of the route of the profiles: the kept profiles, newest
+    first, or the pstats file of the profile "profile_id", which "python -m pstats" reads.
+
+    It may return 404 if profiling is disabled or the profile is no longer kept, and 403 if the request does not
+    carry the token on the header.
+    """
+    current = profiles
+    if current is None:
+        return {'Message': task_messages.profiling_disabled}, 404, {}
+
+    value = headers.get(header)
+    if value is None or not _is_token(value):
+        return {'Message': task_messages.profiling_forbidden}, 403, {}
+
+    with _profiles_lock:
+        kept = list(current)
+    if profile_id is None:
+        return [record for record, _ in reversed(kept)], 200, {}
+
+    for record, data in kept:
+        if record['id'] == profile_id:
+            return data, 200, {'Content-Type': 'application/octet-stream',
+                               'Content-Disposition': f'attachment; filename="{profile_id}.pstats"'}
+    return {'Message': task_messages.profile_not_found}, 404, {}
+
+
+def time_split(stats):
+    """ Returns the seconds spent in each category (see "categories") and in the other functions """
+    split = dict.fromkeys([name for name, _ in categories] + ['other'], 0.0)
+    for function, (_, _, own_time, _, callers) in stats.items():
+        name = category(function)
+        if name is not None or function[0] != '~' or not callers:
+            split[name or 'other'] += own_time
+            continue
+
+        # The own time of builtins without a category goes to the categories of their callers
+        for caller, (_, _, caller_time, _) in callers.items():
+            split[category(caller) or 'other'] += caller_time
+    return split
+
+
+def top_functions(stats, size):
+    """ Returns the "size" functions with the longest own time """
+    functions = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:size]
+    return [{'function': pstats.func_std_string(function), 'calls': calls, 'time': own_time,
+             'cumulative_time': cumulative_time}
+            for function, (_, calls, own_time, cumulative_time, _) in functions]
+
+
+def category(function):
+    """ Returns the category of a function of the stats, a (path, line, name) tuple, or None """
+    path, _, name = function
+    where = name if path == '~' else path.replace(os.sep, '/')
+    for category_name, fragments in categories:
+        if any(fragment in where for fragment in fragments):
+            return category_name
+    return None
+
+
+def _start(req):
+    """ Starts the profile of a request if it is asked for or sampled, unless another request is being profiled """
+    if req.blueprint in exempt_blueprints:
+        return None
+    value = req.headers.get(header)
+    if value is not None:
+        if not _is_token(value):
+            return None
+    elif sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+
+    if not _profiling.acquire(blocking=False):
+        return None
+    try:
+        return RequestProfile(req.endpoint.rsplit('.', 1)[-1] if req.endpoint else None, req.method, req.path)
+    except BaseException:
+        _profiling.release()
+        raise
+
+
+def _is_token(value):
+    """ Verifies if a value of the header is the token, in constant time """
+    return hmac.compare_digest(value.encode(), token.encode())
+
+
+def _keep(record, data):
+    """ Keeps a profile in the ring buffer, removing the file of the profile it evicts """
+    current = profiles
+    if current is None:
+        return
+    with _profiles_lock:
+        if len(current) == current.maxlen and dump_dir is not None:
+            evicted = os.path.join(dump_dir, current[0][0]['id'] + '.pstats')
+            if os.path.exists(evicted):
+                os.remove(evicted)
+        current.append((record, data))
@@ -0,0 +1,327 @@
+import asyncio
+import time
+
+from todo_list.monitoring import instrumentation
+from todo_list.repositories import task_cache
+from todo_list.repositories import task_events
+from todo_list.repositories import task_repository
+from todo_list.repositories.engines.async_engine import AsyncIterable
+from todo_list.repositories.errors import DuplicatedNamesError
+from todo_list.repositories.insert_batching import AsyncInsertBatcher
+from todo_list.repositories.single_flight import AsyncSingleFlight
+
+"""
+This module manipulates the tasks stored by the configured storage engine with asyncio (see configure()).
+
+It has the same functions of task_repository, but awaitable, so one process can keep many queries in flight.
+Page tokens and the cache are the ones of task_repository.
+"""
+
+# Storage engine (e.g. an AsyncMongoEngine) used by the repository
+engine = None
+
+# Seconds during which the counts of tasks by status are reused, i.e. how stale they may be
+counts_ttl = 5.0
+
+# Whether writes change the version of the tasks, which answers conditional requests. It costs a write more
+track_version = False
+
+# Seconds during which the version of the tasks is reused. Writes made by this process are seen at once
+version_ttl = 1.0
+
+# Counts of tasks by status and when they expire
+_counts = None
+
+# Version of the tasks and when it expires
+_version = None
+
+# Groups concurrent inserts into single writes, None when insert batching is disabled
+_insert_batcher = None
+
+# Coalesces identical concurrent reads of lists of tasks, None when read coalescing is disabled
+_flights = None
+
+# Whether prepare() already ran in this process
+_prepared = False
+_prepare_lock = asyncio.Lock()
+
+# Page tokens do not depend on how the page was read
+next_page_token = task_repository.next_page_token
+next_search_token = task_repository.next_search_token
+
+
+def configure(new_engine, new_counts_ttl=5.0, new_version_ttl=1.0, new_track_version=False):
+    """ Sets the storage engine used by the repository, whose methods must be coroutines (see task_repository) """
+    global engine, counts_ttl, version_ttl, track_version, _counts, _version
+    engine = new_engine
+    counts_ttl = new_counts_ttl
+    version_ttl = new_version_ttl
+    track_version = new_track_version
+    _counts = None
+    _version = None
+
+
+async def configure_events(source='auto', history_size=1000, heartbeat=15.0):
+    """ Sets where the changes of tasks come from (see task_repository.configure_events) """
+    use_hub = source == 'hub' or not await engine.supports_change_streams()
+    if use_hub and source == 'change_streams':
+        task_repository.logger.warning(task_repository.change_streams_unsupported_log)
+    task_events.configure(use_hub, history_size, heartbeat)
+
+
+def configure_insert_batching(enabled, max_size=100, max_delay=0.005):
+    """ Enables (or disables) the batching of concurrent inserts (see task_repository.configure_insert_batching) """
+    global _insert_batcher
+    _insert_batcher = AsyncInsertBatcher(insert_many, max_size, max_delay) if enabled else None
+
+
+def configure_read_coalescing(enabled):
+    """ Enables (or disables) the coalescing of identical concurrent reads (see task_repository) """
+    global _flights
+    _flights = AsyncSingleFlight() if enabled else None
+
+
+async def prepare(events_source='auto', events_history_size=1000, events_heartbeat=15.0):
+    """ Ensures the indexes and sets where the changes of tasks come from, once per process (see task_repository) """
+    global _prepared
+    if _prepared:
+        return
+    async with _prepare_lock:
+        if not _prepared:
+            await ensure_indexes()
+            await configure_events(events_source, events_history_size, events_heartbeat)
+            _prepared = True
+
+
+async def ensure_indexes():
+    """ Creates the indexes used by the storage engine, logging how to remove duplicated names (see task_repository) """
+    try:
+        await engine.ensure_indexes()
+    except DuplicatedNamesError as error:
+        task_repository.logger.error(task_repository.duplicated_names_log,
+                                     ', '.join(f'"{name}"' for name in error.names))
+
+
+@instrumentation.timed
+async def is_registered(task_name):
+    """ Verifies if there is a task with the informed name """
+    return await engine.is_registered(task_name)
+
+
+@instrumentation.timed
+async def get_by_name(task_name, at_version=None):
+    """
+    Returns the first task with the informed name.
+
+    When the cache is enabled, both found and not found tasks are read from it, only if they were cached at
+    "at_version" when it is informed (see task_repository).
+    """
+    cache = task_cache.cache
+    if cache is None:
+        return await engine.get_by_name(task_name)
+
+    task = cache.get(task_name, at_version)
+    if task is task_cache.TaskCache.missing:
+        generation = cache.generation()
+        task = await engine.get_by_name(task_name)
+        cache.put(task_name, task, generation, at_version)
+    return task
+
+
+@instrumentation.timed_reads
+async def get_by_status(status, limit=None, after=None):
+    """ Returns an asynchronous iterable over the well formed tasks with matching status (see task_repository) """
+    return await _coalesced(engine.get_by_status, status, limit, task_repository.parse_page_token(after))
+
+
+@instrumentation.timed_reads
+async def get_all(limit=None, after=None):
+    """ Returns an asynchronous iterable over all the well formed tasks (see task_repository) """
+    return await _coalesced(engine.get_all, limit, task_repository.parse_page_token(after))
+
+
+@instrumentation.timed_reads
+async def search(prefix=None, text=None, limit=None, after=None):
+    """
+    Returns an asynchronous iterable over the well formed tasks whose names start with "prefix" and/or that have
+    any of the words of "text" (see task_repository)
+    """
+    if text is None:
+        return await _coalesced(engine.search_by_prefix, prefix, limit, task_repository.parse_page_token(after))
+
+    skip = task_repository.parse_offset_token(after)
+    words = task_repository.search_words(text)
+    if not words:
+        return AsyncIterable([])
+    return await _coalesced(engine.search_text, words, prefix, limit, skip)
+
+
+@instrumentation.timed_reads
+async def export():
+    """ Returns an asynchronous iterable over all the well formed tasks, read in batches (see task_repository) """
+    return await engine.get_all(None, None)
+
+
+@instrumentation.timed
+async def count_by_status():
+    """ Returns a dict with the number of tasks of each status, reused for "counts_ttl" seconds (see task_repository) """
+    global _counts
+    if _counts is None or _counts[1] <= time.monotonic():
+        _counts = (await engine.count_by_status(), time.monotonic() + counts_ttl)
+    return _counts[0]
+
+
+@instrumentation.timed
+async def version():
+    """
+    Returns the version of the tasks and when it changed, reused for "version_ttl" seconds, or None when it is not
+    kept (see task_repository)
+    """
+    global _version
+    if not track_version:
+        return None
+    if _version is None or _version[1] <= time.monotonic():
+        _version = (await engine.version(), time.monotonic() + version_ttl)
+    return _version[0]
+
+
+async def watch(status=None, after=None):
+    """
+    Returns an asynchronous iterator over the changes of tasks after the token "after", of tasks with matching
+    status if it is informed (see task_repository)
+    """
+    if task_events.hub is not None:
+        return task_events.hub.watch_async(status, after, task_events.heartbeat)
+    return engine.watch(status, after, task_events.heartbeat)
+
+
+@instrumentation.timed
+async def update(task_name, task):
+    """
+    Updates a task based on its name.
+
+    It returns False if there is no task with the informed name.
+    It raises DuplicatedTaskError if the new name belongs to another task.
+    """
+    updated = await engine.update(task_name, task)
+
+    task_repository.invalidate_cache(task_name, task.name)
+    await _bump_version()
+    task_events.publish_update(task_name, task, updated)
+    return updated
+
+
+@instrumentation.timed
+async def update_many(updates):
+    """ Updates a list of (task_name, task) pairs with a single write (see task_repository) """
+    matched, modified, duplicated = await engine.update_many(updates)
+
+    task_repository.invalidate_cache(*[name for task_name, task in updates for name in (task_name, task.name)])
+    await _bump_version()
+    task_events.publish_updates(updates, matched, duplicated)
+    return matched, modified, duplicated
+
+
+@instrumentation.timed
+async def update_by_status(status, values):
+    """ Sets "values" on all tasks with matching status. It returns how many tasks were matched and modified """
+    matched, modified = await engine.update_by_status(status, values)
+
+    task_repository.clear_cache()
+    await _bump_version()
+    task_events.publish_status_update(status, values, matched)
+    return matched, modified
+
+
+@instrumentation.timed
+async def insert(task):
+    """
+    Inserts a new task.
+
+    It raises DuplicatedTaskError if there is a task with the same name.
+    When insert batching is enabled, the task is written along with the ones inserted concurrently.
+    """
+    if _insert_batcher is not None:
+        return await _insert_batcher.insert(task)
+
+    await engine.insert(task)
+
+    task_repository.invalidate_cache(task.name)
+    await _bump_version()
+    task_events.publish_insert(task)
+
+
+@instrumentation.timed
+async def insert_many(tasks_to_insert):
+    """ Inserts a list of tasks with a single write (see task_repository) """
+    duplicated = await engine.insert_many(tasks_to_insert)
+
+    task_repository.invalidate_cache(*[task.name for task in tasks_to_insert])
+    await _bump_version()
+    task_events.publish_inserts(tasks_to_insert, duplicated)
+    return duplicated
+
+
+@instrumentation.timed
+async def upsert_many(tasks_to_upsert):
+    """ Inserts a list of tasks with a single write, replacing the ones with registered names (see task_repository) """
+    created, matched, duplicated = await engine.upsert_many(tasks_to_upsert)
+
+    task_repository.invalidate_cache(*[task.name for task in tasks_to_upsert])
+    await _bump_version()
+    task_events.publish_upserts(tasks_to_upsert, created, duplicated)
+    return created, matched, duplicated
+
+
+@instrumentation.timed
+async def delete(task_name):
+    """
+    Deletes a task based on its name.
+
+    It returns False if there is no task with the informed name.
+    """
+    deleted = await engine.delete(task_name)
+
+    task_repository.invalidate_cache(task_name)
+    await _bump_version()
+    task_events.publish_delete(task_name, deleted)
+    return deleted
+
+
+@instrumentation.timed
+async def delete_many(task_names):
+    """ Deletes the tasks with the informed names. It returns how many tasks were deleted """
+    deleted = await engine.delete_many(task_names)
+
+    task_repository.invalidate_cache(*task_names)
+    await _bump_version()
+    task_events.publish_deletes(task_names, deleted)
+    return deleted
+
+
+@instrumentation.timed
+async def delete_by_status(status):
+    """ Deletes all tasks with matching status. It returns how many tasks were deleted """
+    deleted = await engine.delete_by_status(status)
+
+    task_repository.clear_cache()
+    await _bump_version()
+    task_events.publish_status_delete(status, deleted)
+    return deleted
+
+
+async def _coalesced(read, *args):
+    """ Awaits "read" (a list function of the engine), sharing its tasks with the identical calls in flight """
+    if _flights is None:
+        return await read(*args)
+    return await _flights.read((read.__name__,) + args, lambda: read(*args))
+
+
+async def _bump_version():
+    """ Changes the version of the tasks after a write, so later reads do not share the ones made before it """
+    global _version
+    if track_version:
+        await engine.bump_version()
+        _version = None
+    if _flights is not None:
+        _flights.invalidate()
@@ -0,0 +1,49 @@
+"""
+This module adapts a storage engine that does not wait for IO (e.g. MemoryEngine) to the async stack
+"""
+
+
+class AsyncEngine:
+    """
+    Exposes the methods of a TaskEngine (or of another store that does not wait for IO, e.g. a MemoryKeyStore) as
+    coroutines and its pages as asynchronous iterables
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __getattr__(self, name):
+        method = getattr(self.engine, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    async def get_by_status(self, status, limit, after):
+        return AsyncIterable(self.engine.get_by_status(status, limit, after))
+
+    async def get_all(self, limit, after):
+        return AsyncIterable(self.engine.get_all(limit, after))
+
+    async def search_by_prefix(self, prefix, limit, after):
+        return AsyncIterable(self.engine.search_by_prefix(prefix, limit, after))
+
+    async def search_text(self, words, prefix, limit, skip):
+        return AsyncIterable(self.engine.search_text(words, prefix, limit, skip))
+
+
+class AsyncIterable:
+    """ Iterates asynchronously over an iterable """
+
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
@@ -0,0 +1,166 @@
+from pymongo import ASCENDING
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
+
+from todo_list.repositories.engines import mongo_engine
+from todo_list.repositories.errors import DuplicatedNamesError
+from todo_list.repositories.errors import DuplicatedTaskError
+
+"""
+This module stores tasks in a MongoDb collection with asyncio (used by the async stack).
+
+It has the same methods of MongoEngine, but awaitable, and builds the same queries.
+"""
+
+
+class AsyncMongoEngine:
+    """ Stores tasks in a MongoDb collection of an asyncio client, relying on a unique index on name """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.pre_images = False
+
+    @property
+    def versions(self):
+        """ The collection of versions, read from the collection of tasks as it may be created on first use """
+        return self.tasks.database[mongo_engine.versions_collection]
+
+    async def ensure_indexes(self):
+        duplicated = False
+        for index in mongo_engine.indexes:
+            try:
+                await self.tasks.create_index(index['keys'], **index['options'])
+            except OperationFailure as error:
+                if error.code != mongo_engine.duplicate_key_error_code:
+                    raise
+                duplicated = True
+        if duplicated:
+            cursor = await self.tasks.aggregate(mongo_engine.duplicated_names_pipeline)
+            raise DuplicatedNamesError([group['_id'] async for group in cursor])
+
+    async def is_registered(self, task_name):
+        return await self.tasks.count_documents({'name': task_name}, limit=1) > 0
+
+    async def get_by_name(self, task_name):
+        return await self.tasks.find_one({'name': task_name}, mongo_engine.task_projection)
+
+    async def get_by_status(self, status, limit, after):
+        return self._find_page({'status': status}, limit, after)
+
+    async def get_all(self, limit, after):
+        return self._find_page({}, limit, after)
+
+    async def search_by_prefix(self, prefix, limit, after):
+        return self._find_page(mongo_engine.prefix_query(prefix), limit, after)
+
+    async def search_text(self, words, prefix, limit, skip):
+        return await self.tasks.aggregate(mongo_engine.text_search_pipeline(words, prefix, limit, skip),
+                                          batchSize=mongo_engine.batch_size)
+
+    async def count_by_status(self):
+        cursor = await self.tasks.aggregate(mongo_engine.count_by_status_pipeline)
+        return mongo_engine.status_counts([group async for group in cursor])
+
+    async def version(self):
+        return mongo_engine.task_version(await self.versions.find_one({'_id': self.tasks.name}))
+
+    async def bump_version(self):
+        await self.versions.update_one({'_id': self.tasks.name}, mongo_engine.bump_version_update, upsert=True)
+
+    async def update(self, task_name, task):
+        try:
+            updated_task = await self.tasks.find_one_and_update(
+                {'name': task_name}, mongo_engine.set_task(task), projection={'_id': True},
+                return_document=ReturnDocument.BEFORE)
+        except DuplicateKeyError:
+            raise DuplicatedTaskError(task.name)
+        return updated_task is not None
+
+    async def update_many(self, updates):
+        if not updates:
+            return 0, 0, []
+
+        try:
+            result = await self.tasks.bulk_write(mongo_engine.update_operations(updates), ordered=False)
+            return result.matched_count, result.modified_count, []
+        except BulkWriteError as error:
+            return error.details['nMatched'], error.details['nModified'], mongo_engine.duplicated_positions(error)
+
+    async def update_by_status(self, status, values):
+        result = await self.tasks.update_many({'status': status}, {"$set": values})
+        return result.matched_count, result.modified_count
+
+    async def insert(self, task):
+        try:
+            await self.tasks.insert_one(task.to_document())
+        except DuplicateKeyError:
+            raise DuplicatedTaskError(task.name)
+
+    async def insert_many(self, tasks_to_insert):
+        if not tasks_to_insert:
+            return []
+
+        try:
+            await self.tasks.insert_many([task.to_document() for task in tasks_to_insert], ordered=False)
+            return []
+        except BulkWriteError as error:
+            return mongo_engine.duplicated_positions(error)
+
+    async def upsert_many(self, tasks_to_upsert):
+        if not tasks_to_upsert:
+            return [], 0, []
+
+        try:
+            result = await self.tasks.bulk_write(mongo_engine.upsert_operations(tasks_to_upsert), ordered=False)
+            return sorted(result.upserted_ids), result.matched_count, []
+        except BulkWriteError as error:
+            return mongo_engine.upserted_positions(error), error.details['nMatched'], \
+                mongo_engine.duplicated_positions(error)
+
+    async def delete(self, task_name):
+        result = await self.tasks.delete_one({'name': task_name})
+        return result.deleted_count > 0
+
+    async def delete_many(self, task_names):
+        if not task_names:
+            return 0
+        result = await self.tasks.delete_many({'name': {'$in': task_names}})
+        return result.deleted_count
+
+    async def delete_by_status(self, status):
+        result = await self.tasks.delete_many({'status': status})
+        return result.deleted_count
+
+    async def supports_change_streams(self):
+        hello = await self.tasks.database.client.admin.command('isMaster')
+        self.pre_images = hello.get('maxWireVersion', 0) >= mongo_engine.pre_images_wire_version
+        return mongo_engine.is_replicated(hello)
+
+    async def watch(self, status, after, timeout):
+        try:
+            stream = await self.tasks.watch(
+                **mongo_engine.change_stream_options(status, after, timeout, self.pre_images))
+            resumed = True
+        except OperationFailure:
+            if after is None:
+                raise
+            stream = await self.tasks.watch(
+                **mongo_engine.change_stream_options(status, None, timeout, self.pre_images))
+            resumed = False
+
+        async with stream:
+            if not resumed:
+                yield mongo_engine.reset_event(stream.resume_token)
+            while stream.alive:
+                change = await stream.try_next()
+                yield mongo_engine.change_event(change) if change is not None else None
+
+    def _find_page(self, query, limit, after):
+        """ Returns an asyncio cursor over a page of the well formed tasks matching "query" """
+        cursor = self.tasks.find(mongo_engine.page_query(query, after), mongo_engine.task_projection) \
+            .sort('name', ASCENDING).batch_size(mongo_engine.batch_size)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return cursor
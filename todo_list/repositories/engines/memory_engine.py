@@ -0,0 +1,237 @@
+import heapq
+import threading
+from datetime import datetime
+from datetime import timezone
+from bisect import bisect_left
+from bisect import bisect_right
+from bisect import insort
+
+from todo_list.repositories.engines.task_engine import TaskEngine
+from todo_list.repositories.engines.task_engine import text_weights
+from todo_list.repositories.engines.task_engine import text_words
+from todo_list.repositories.errors import DuplicatedTaskError
+
+"""
+This module stores tasks in the memory of the process, without any database.
+
+It is meant for local development, load tests and as the base of caches, as tasks are lost when the process ends
+and are not shared between processes.
+"""
+
+
+class MemoryEngine(TaskEngine):
+    """
+    Stores tasks in a dict by name, plus sorted lists of names (all of them and per status) that serve the pages
+    and an inverted index (the names of the tasks with each word) that serves the text searches.
+
+    Lookups by name are O(1) and a page of k tasks is O(log n + k), also when searching by prefix. Text searches
+    only read the tasks with the searched words. Stored tasks are never changed (writes replace them), so the pages
+    can be returned without copying them. It is thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._names = []
+        self._names_by_status = {}
+        self._names_by_word = {}
+        self._version = (0, datetime.now(timezone.utc))
+
+    def ensure_indexes(self):
+        # The dict, the sorted lists and the inverted index are the indexes
+        pass
+
+    def is_registered(self, task_name):
+        return task_name in self._tasks
+
+    def get_by_name(self, task_name):
+        return self._tasks.get(task_name)
+
+    def get_by_status(self, status, limit, after):
+        with self._lock:
+            return self._page(self._names_by_status.get(status, []), limit, after)
+
+    def get_all(self, limit, after):
+        with self._lock:
+            return self._page(self._names, limit, after)
+
+    def search_by_prefix(self, prefix, limit, after):
+        with self._lock:
+            names = self._names
+            position = bisect_right(names, after) if after is not None and after >= prefix else \
+                bisect_left(names, prefix)
+            page = []
+            while position < len(names) and names[position].startswith(prefix) and \
+                    (limit is None or len(page) < limit):
+                page.append(self._tasks[names[position]])
+                position += 1
+            return page
+
+    def search_text(self, words, prefix, limit, skip):
+        with self._lock:
+            names = set().union(*(self._names_by_word.get(word, ()) for word in words))
+            if prefix:
+                names = [task_name for task_name in names if task_name.startswith(prefix)]
+            ranked = [(-text_score(self._tasks[task_name], words), task_name) for task_name in names]
+            ranked = sorted(ranked) if limit is None else heapq.nsmallest(skip + limit, ranked)
+            return [self._tasks[task_name] for _, task_name in ranked[skip:]]
+
+    def count_by_status(self):
+        # The sorted lists per status are the counters
+        with self._lock:
+            return {status: len(names) for status, names in self._names_by_status.items() if names}
+
+    def version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version = (self._version[0] + 1, datetime.now(timezone.utc))
+
+    def update(self, task_name, task):
+        with self._lock:
+            return self._update(task_name, task)[0]
+
+    def update_many(self, updates):
+        matched, modified, duplicated = 0, 0, []
+        with self._lock:
+            for position, (task_name, task) in enumerate(updates):
+                try:
+                    was_matched, was_modified = self._update(task_name, task)
+                except DuplicatedTaskError:
+                    duplicated.append(position)
+                    continue
+                matched += was_matched
+                modified += was_modified
+        return matched, modified, duplicated
+
+    def update_by_status(self, status, values):
+        modified = 0
+        with self._lock:
+            names = list(self._names_by_status.get(status, []))
+            for task_name in names:
+                current = self._tasks[task_name]
+                new_task = dict(current, **values)
+                if new_task != current:
+                    self._remove(task_name)
+                    self._add(new_task)
+                    modified += 1
+        return len(names), modified
+
+    def insert(self, task):
+        with self._lock:
+            if task.name in self._tasks:
+                raise DuplicatedTaskError(task.name)
+            self._add(task.to_document())
+
+    def insert_many(self, tasks_to_insert):
+        duplicated = []
+        with self._lock:
+            for position, task in enumerate(tasks_to_insert):
+                if task.name in self._tasks:
+                    duplicated.append(position)
+                else:
+                    self._add(task.to_document())
+        return duplicated
+
+    def upsert_many(self, tasks_to_upsert):
+        created, matched = [], 0
+        with self._lock:
+            for position, task in enumerate(tasks_to_upsert):
+                current = self._tasks.get(task.name)
+                if current is None:
+                    created.append(position)
+                    self._add(task.to_document())
+                    continue
+                matched += 1
+                new_task = task.to_document()
+                if new_task != current:
+                    self._remove(task.name)
+                    self._add(new_task)
+        return created, matched, []
+
+    def delete(self, task_name):
+        with self._lock:
+            return self._remove(task_name) is not None
+
+    def delete_many(self, task_names):
+        with self._lock:
+            return sum(self._remove(task_name) is not None for task_name in set(task_names))
+
+    def delete_by_status(self, status):
+        with self._lock:
+            names = list(self._names_by_status.get(status, []))
+            for task_name in names:
+                self._remove(task_name)
+        return len(names)
+
+    def _page(self, names, limit, after):
+        """ Returns the tasks of a page of the sorted list "names" """
+        start = bisect_right(names, after) if after is not None else 0
+        end = len(names) if limit is None else start + limit
+        return [self._tasks[task_name] for task_name in names[start:end]]
+
+    def _update(self, task_name, task):
+        """ Updates a task, returning if it was matched and modified. Must be called holding the lock """
+        current = self._tasks.get(task_name)
+        if current is None:
+            return False, False
+        if task.name != task_name and task.name in self._tasks:
+            raise DuplicatedTaskError(task.name)
+
+        new_task = task.to_document()
+        if new_task == current:
+            return True, False
+
+        self._remove(task_name)
+        self._add(new_task)
+        return True, True
+
+    def _add(self, task):
+        """ Adds a task to the dict, the sorted lists and the inverted index. Must be called holding the lock """
+        self._tasks[task['name']] = task
+        insort(self._names, task['name'])
+        insort(self._names_by_status.setdefault(task['status'], []), task['name'])
+        for word in task_words(task):
+            self._names_by_word.setdefault(word, set()).add(task['name'])
+
+    def _remove(self, task_name):
+        """
+        Removes a task from the dict, the sorted lists and the inverted index, returning it. Must be called holding
+        the lock
+        """
+        task = self._tasks.pop(task_name, None)
+        if task is not None:
+            _remove_name(self._names, task_name)
+            _remove_name(self._names_by_status[task['status']], task_name)
+            for word in task_words(task):
+                names = self._names_by_word[word]
+                names.discard(task_name)
+                if not names:
+                    del self._names_by_word[word]
+        return task
+
+
+def _remove_name(names, task_name):
+    """ Removes a name from a sorted list of names """
+    del names[bisect_left(names, task_name)]
+
+
+def task_words(task):
+    """ Returns the distinct words of the searchable fields of a task """
+    return {word for field in text_weights for word in text_words(task[field])}
+
+
+def text_score(task, words):
+    """
+    Returns the relevance of a task for the searched words, in the way of MongoDb text scores: every word found in
+    a field adds the weight of the field, a little more the larger the share of the field it is
+    """
+    score = 0.0
+    for field, weight in text_weights.items():
+        field_words = text_words(task[field])
+        for word in words:
+            count = field_words.count(word)
+            if count:
+                score += weight * (0.5 + 0.5 * count / len(field_words))
+    return score
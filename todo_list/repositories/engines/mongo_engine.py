@@ -0,0 +1,355 @@
+import re
+from datetime import timezone
+from pymongo import ASCENDING
+from pymongo import TEXT
+from pymongo import ReturnDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
+
+from todo_list.repositories.engines.task_engine import TaskEngine
+from todo_list.repositories.engines.task_engine import text_weights
+from todo_list.repositories.errors import DuplicatedNamesError
+from todo_list.repositories.errors import DuplicatedTaskError
+
+"""
+This module stores tasks in a MongoDb collection
+"""
+
+# Number of tasks fetched per round trip when reading a list of tasks
+batch_size = 500
+
+# Code of the error returned by MongoDb when a write violates a unique index
+duplicate_key_error_code = 11000
+
+# Fields returned by the reads, so MongoDb does not send "_id" nor unknown fields
+task_projection = {'_id': False, 'name': True, 'description': True, 'status': True}
+
+# Filter that only matches tasks with all the necessary fields filled
+well_formed_task = {'name': {'$exists': True, '$ne': ''},
+                    'description': {'$exists': True, '$ne': ''},
+                    'status': {'$exists': True, '$ne': ''}}
+
+# Aggregation that counts the well formed tasks of each status
+count_by_status_pipeline = [{'$match': well_formed_task}, {'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+
+# Aggregation that finds (some of) the names registered more than once
+duplicated_names_pipeline = [{'$group': {'_id': '$name', 'count': {'$sum': 1}}}, {'$match': {'count': {'$gt': 1}}},
+                             {'$limit': 10}]
+
+# Collection with the version of each collection of tasks, by the name of the collection
+versions_collection = 'task_versions'
+
+# Update that changes the version of a collection of tasks
+bump_version_update = {'$inc': {'version': 1}, '$currentDate': {'modified': True}}
+
+# Lowest wire version (MongoDb 6.0) whose change streams can return the documents before the changes
+pre_images_wire_version = 17
+
+# Operations of change streams that carry the changed document (when it still exists)
+document_operations = ['insert', 'update', 'replace']
+
+# Indexes used by the engine. The unique index on name is what the writes rely on to reject duplicated names and
+# also serves the pages of get_all and of the searches by prefix. The index on status and name serves the pages of
+# get_by_status. The text index serves the text searches, splitting words without stemming nor stop words (language
+# "none"), as the other engines do.
+indexes = [{'keys': [('name', ASCENDING)], 'options': {'unique': True}},
+           {'keys': [('status', ASCENDING), ('name', ASCENDING)], 'options': {}},
+           {'keys': [('name', TEXT), ('description', TEXT)],
+            'options': {'name': 'task_text', 'weights': text_weights, 'default_language': 'none'}}]
+
+
+class MongoEngine(TaskEngine):
+    """
+    Stores tasks in a MongoDb collection, relying on a unique index on name.
+
+    The version of the tasks is a document of "versions_collection", so it is shared by all processes.
+    Changes are watched with change streams, which MongoDb only offers on replica sets and sharded clusters.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.pre_images = False
+
+    @property
+    def versions(self):
+        """ The collection of versions, read from the collection of tasks as it may be created on first use """
+        return self.tasks.database[versions_collection]
+
+    def ensure_indexes(self):
+        duplicated = False
+        for index in indexes:
+            try:
+                self.tasks.create_index(index['keys'], **index['options'])
+            except OperationFailure as error:
+                # The other indexes are still created, so reads keep being served
+                if error.code != duplicate_key_error_code:
+                    raise
+                duplicated = True
+        if duplicated:
+            raise DuplicatedNamesError([group['_id'] for group in self.tasks.aggregate(duplicated_names_pipeline)])
+
+    def is_registered(self, task_name):
+        return self.tasks.count_documents({'name': task_name}, limit=1) > 0
+
+    def get_by_name(self, task_name):
+        return self.tasks.find_one({'name': task_name}, task_projection)
+
+    def get_by_status(self, status, limit, after):
+        return self._find_page({'status': status}, limit, after)
+
+    def get_all(self, limit, after):
+        return self._find_page({}, limit, after)
+
+    def search_by_prefix(self, prefix, limit, after):
+        return self._find_page(prefix_query(prefix), limit, after)
+
+    def search_text(self, words, prefix, limit, skip):
+        return self.tasks.aggregate(text_search_pipeline(words, prefix, limit, skip), batchSize=batch_size)
+
+    def count_by_status(self):
+        return status_counts(self.tasks.aggregate(count_by_status_pipeline))
+
+    def version(self):
+        return task_version(self.versions.find_one({'_id': self.tasks.name}))
+
+    def bump_version(self):
+        self.versions.update_one({'_id': self.tasks.name}, bump_version_update, upsert=True)
+
+    def update(self, task_name, task):
+        try:
+            updated_task = self.tasks.find_one_and_update(
+                {'name': task_name}, set_task(task), projection={'_id': True}, return_document=ReturnDocument.BEFORE)
+        except DuplicateKeyError:
+            raise DuplicatedTaskError(task.name)
+        return updated_task is not None
+
+    def update_many(self, updates):
+        if not updates:
+            return 0, 0, []
+
+        # A single unordered write, so a rejected update does not stop the others
+        try:
+            result = self.tasks.bulk_write(update_operations(updates), ordered=False)
+            return result.matched_count, result.modified_count, []
+        except BulkWriteError as error:
+            return error.details['nMatched'], error.details['nModified'], duplicated_positions(error)
+
+    def update_by_status(self, status, values):
+        result = self.tasks.update_many({'status': status}, {"$set": values})
+        return result.matched_count, result.modified_count
+
+    def insert(self, task):
+        try:
+            self.tasks.insert_one(task.to_document())
+        except DuplicateKeyError:
+            raise DuplicatedTaskError(task.name)
+
+    def insert_many(self, tasks_to_insert):
+        if not tasks_to_insert:
+            return []
+
+        # A single unordered write, so a rejected task does not stop the others
+        try:
+            self.tasks.insert_many([task.to_document() for task in tasks_to_insert], ordered=False)
+            return []
+        except BulkWriteError as error:
+            return duplicated_positions(error)
+
+    def upsert_many(self, tasks_to_upsert):
+        if not tasks_to_upsert:
+            return [], 0, []
+
+        # A single unordered write. Only concurrent upserts of the same names may be rejected
+        try:
+            result = self.tasks.bulk_write(upsert_operations(tasks_to_upsert), ordered=False)
+            return sorted(result.upserted_ids), result.matched_count, []
+        except BulkWriteError as error:
+            return upserted_positions(error), error.details['nMatched'], duplicated_positions(error)
+
+    def delete(self, task_name):
+        return self.tasks.delete_one({'name': task_name}).deleted_count > 0
+
+    def delete_many(self, task_names):
+        if not task_names:
+            return 0
+        return self.tasks.delete_many({'name': {'$in': task_names}}).deleted_count
+
+    def delete_by_status(self, status):
+        return self.tasks.delete_many({'status': status}).deleted_count
+
+    def supports_change_streams(self):
+        hello = self.tasks.database.client.admin.command('isMaster')
+        self.pre_images = hello.get('maxWireVersion', 0) >= pre_images_wire_version
+        return is_replicated(hello)
+
+    def watch(self, status, after, timeout):
+        try:
+            stream = self.tasks.watch(**change_stream_options(status, after, timeout, self.pre_images))
+            resumed = True
+        except OperationFailure:
+            # The token is not valid or its changes are no longer in the oplog
+            if after is None:
+                raise
+            stream = self.tasks.watch(**change_stream_options(status, None, timeout, self.pre_images))
+            resumed = False
+
+        with stream:
+            if not resumed:
+                yield reset_event(stream.resume_token)
+            while stream.alive:
+                change = stream.try_next()
+                yield change_event(change) if change is not None else None
+
+    def _find_page(self, query, limit, after):
+        """ Returns a cursor over a page of the well formed tasks matching "query" """
+        cursor = self.tasks.find(page_query(query, after), task_projection).sort('name', ASCENDING) \
+            .batch_size(batch_size)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return cursor
+
+
+def page_query(query, after):
+    """ Returns the query of the well formed tasks matching "query" whose names come after "after" """
+    query = dict(well_formed_task, **query)
+    if after is not None:
+        query['name'] = dict(query['name'], **{'$gt': after})
+    return query
+
+
+def prefix_query(prefix):
+    """ Returns the query of the tasks whose names start with "prefix", which MongoDb answers with the index on name """
+    return {'name': {'$regex': '^' + re.escape(prefix)}}
+
+
+def text_search_pipeline(words, prefix, limit, skip):
+    """
+    Returns the aggregation of a page of the well formed tasks with any of the words (and names starting with
+    "prefix", if informed), ordered by relevance and then by name
+    """
+    query = dict(well_formed_task, **{'$text': {'$search': ' '.join(words)}})
+    if prefix:
+        query.update(prefix_query(prefix))
+
+    pipeline = [{'$match': query}, {'$sort': {'score': {'$meta': 'textScore'}, 'name': ASCENDING}}]
+    if skip:
+        pipeline.append({'$skip': skip})
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline.append({'$project': task_projection})
+    return pipeline
+
+
+def status_counts(groups):
+    """ Returns the dict of counts by status of the groups of the count_by_status pipeline """
+    return {group['_id']: group['count'] for group in groups}
+
+
+def task_version(document):
+    """ Returns the (version, modified) of a document of "versions_collection", which may not exist yet """
+    if document is None:
+        return 0, None
+    # Dates come from MongoDb without timezone, but in UTC
+    return document['version'], document['modified'].replace(tzinfo=timezone.utc)
+
+
+def is_replicated(hello):
+    """ Verifies if the answer of the "isMaster" command comes from a replica set or a sharded cluster """
+    return 'setName' in hello or hello.get('msg') == 'isdbgrid'
+
+
+def change_stream_options(status, after, timeout, pre_images):
+    """
+    Returns the options of the change stream of tasks with matching status (or of all tasks if it is None),
+    resuming after the token "after" and waiting "timeout" seconds for changes
+    """
+    options = {'pipeline': change_stream_pipeline(status, pre_images), 'full_document': 'updateLookup',
+               'max_await_time_ms': int(timeout * 1000)}
+    if pre_images:
+        options['full_document_before_change'] = 'whenAvailable'
+    if after is not None:
+        options['resume_after'] = {'_data': after}
+    return options
+
+
+def change_stream_pipeline(status, pre_images):
+    """
+    Returns the pipeline matching the changes of tasks with "status", before or after the change.
+
+    Documents before the changes are only known when MongoDb may keep them ("pre_images"), otherwise all changes
+    but inserts match. Deletes always match, as the collection may not keep their documents.
+    """
+    if status is None:
+        return []
+    if not pre_images:
+        return [{'$match': {'$or': [{'fullDocument.status': status}, {'operationType': {'$ne': 'insert'}}]}}]
+    return [{'$match': {'$or': [{'fullDocument.status': status},
+                                {'fullDocumentBeforeChange.status': status},
+                                {'operationType': {'$nin': document_operations}}]}}]
+
+
+def change_event(change):
+    """ Returns the event (see repositories.task_events) of a change of a change stream """
+    event_id = change['_id']['_data']
+    operation = change['operationType']
+    document = change.get('fullDocument')
+    before = change.get('fullDocumentBeforeChange')
+
+    if operation == 'insert':
+        return {'id': event_id, 'type': 'create', 'data': {'task': changed_task(document)}}
+    if operation in document_operations:
+        data = {'name': (before or document or {}).get('name')}
+        if document is not None:
+            data['task'] = changed_task(document)
+        return {'id': event_id, 'type': 'update', 'data': data}
+    if operation == 'delete':
+        return {'id': event_id, 'type': 'delete', 'data': {'name': before.get('name') if before else None}}
+
+    # The collection was dropped or renamed
+    return {'id': event_id, 'type': 'reset', 'data': {}}
+
+
+def reset_event(resume_token):
+    """ Returns the event that asks a watcher to read the tasks again, resuming from "resume_token" """
+    return {'id': resume_token['_data'] if resume_token else None, 'type': 'reset', 'data': {}}
+
+
+def changed_task(document):
+    """ Returns the fields of a task from a document of a change stream """
+    return {field: document.get(field) for field in ('name', 'description', 'status')}
+
+
+def set_task(task):
+    """ Returns the update that sets all the fields of a task """
+    return {"$set": task.to_document()}
+
+
+def update_operations(updates):
+    """ Returns the bulk write operations of a list of (task_name, task) pairs """
+    return [UpdateOne({'name': task_name}, set_task(task)) for task_name, task in updates]
+
+
+def upsert_operations(tasks_to_upsert):
+    """ Returns the bulk write operations that insert a list of tasks or replace the ones with registered names """
+    return [UpdateOne({'name': task.name}, set_task(task), upsert=True) for task in tasks_to_upsert]
+
+
+def upserted_positions(error):
+    """ Returns the positions of the operations of a bulk write of upserts that inserted a task """
+    return sorted(upserted['index'] for upserted in error.details['upserted'])
+
+
+def duplicated_positions(error):
+    """
+    Returns the positions of the operations of a bulk write rejected by the unique index on name.
+
+    It raises the error again if any operation was rejected for another reason.
+    """
+    duplicated = []
+    for write_error in error.details['writeErrors']:
+        if write_error['code'] != duplicate_key_error_code:
+            raise error
+        duplicated.append(write_error['index'])
+    return duplicated
@@ -0,0 +1,122 @@
+import re
+from abc import ABC
+from abc import abstractmethod
+
+"""
+This module defines the interface of the storage engines used by the task repository
+"""
+
+# Weight of each field of the tasks in the relevance of a text search
+text_weights = {'name': 2, 'description': 1}
+
+# Words of a text: runs of letters, digits and underscores
+word_pattern = re.compile(r'\w+')
+
+
+class TaskEngine(ABC):
+    """
+    Stores tasks, uniquely identified by their names.
+
+    Tasks are read as dicts with "name", "description" and "status" and lists of tasks are ordered by name.
+    "after" is the name of the last task of the previous page (or None for the first page).
+    Writes reject duplicated names by raising DuplicatedTaskError or by returning the rejected positions.
+    """
+
+    @abstractmethod
+    def ensure_indexes(self):
+        """ Creates whatever the engine needs to answer the other methods efficiently """
+
+    @abstractmethod
+    def is_registered(self, task_name):
+        """ Verifies if there is a task with the informed name """
+
+    @abstractmethod
+    def get_by_name(self, task_name):
+        """ Returns the task with the informed name or None """
+
+    @abstractmethod
+    def get_by_status(self, status, limit, after):
+        """ Returns an iterable over a page of the tasks with matching status """
+
+    @abstractmethod
+    def get_all(self, limit, after):
+        """ Returns an iterable over a page of all the tasks """
+
+    @abstractmethod
+    def search_by_prefix(self, prefix, limit, after):
+        """ Returns an iterable over a page of the tasks whose names start with "prefix" """
+
+    @abstractmethod
+    def search_text(self, words, prefix, limit, skip):
+        """
+        Returns an iterable over a page of the tasks with any of the "words" (see text_words) in their names or
+        descriptions, and whose names start with "prefix" if it is informed. Tasks are ordered by relevance (then
+        by name) and the first "skip" ones are left out
+        """
+
+    @abstractmethod
+    def count_by_status(self):
+        """ Returns a dict with the number of tasks of each status """
+
+    @abstractmethod
+    def version(self):
+        """ Returns the version of the tasks and when it changed (a UTC datetime or None if it never changed) """
+
+    @abstractmethod
+    def bump_version(self):
+        """ Changes the version of the tasks, after they were written """
+
+    @abstractmethod
+    def update(self, task_name, task):
+        """ Updates a task. It returns False if not found and raises DuplicatedTaskError on a registered name """
+
+    @abstractmethod
+    def update_many(self, updates):
+        """ Updates (task_name, task) pairs. It returns the matched and modified counts and the rejected positions """
+
+    @abstractmethod
+    def update_by_status(self, status, values):
+        """ Sets "values" on all tasks with matching status. It returns the matched and modified counts """
+
+    @abstractmethod
+    def insert(self, task):
+        """ Inserts a task. It raises DuplicatedTaskError on a registered name """
+
+    @abstractmethod
+    def insert_many(self, tasks_to_insert):
+        """ Inserts a list of tasks. It returns the rejected positions """
+
+    @abstractmethod
+    def upsert_many(self, tasks_to_upsert):
+        """
+        Inserts a list of tasks, replacing the ones with registered names. It returns the positions of the tasks
+        inserted, how many registered tasks were matched and the rejected positions
+        """
+
+    @abstractmethod
+    def delete(self, task_name):
+        """ Deletes a task. It returns False if not found """
+
+    @abstractmethod
+    def delete_many(self, task_names):
+        """ Deletes the tasks with the informed names. It returns how many tasks were deleted """
+
+    @abstractmethod
+    def delete_by_status(self, status):
+        """ Deletes all tasks with matching status. It returns how many tasks were deleted """
+
+    def supports_change_streams(self):
+        """ Verifies if the engine can watch the changes of tasks made by all processes (see watch()) """
+        return False
+
+    def watch(self, status, after, timeout):
+        """
+        Yields the changes of tasks (events as described in repositories.task_events) after the token "after", of
+        tasks with matching status if it is informed, and None when there are no changes for "timeout" seconds
+        """
+        raise NotImplementedError
+
+
+def text_words(text):
+    """ Returns the words of a text as searched by the engines, in lower case and in the order they appear """
+    return word_pattern.findall(text.lower())
@@ -0,0 +1,19 @@
+"""
+This module centralizes the errors raised by repositories
+"""
+
+
+class DuplicatedTaskError(Exception):
+    """ Raised when a write would leave two tasks with the same name """
+
+
+class DuplicatedNamesError(Exception):
+    """ Raised when the unique index on name cannot be created, as registered tasks share names """
+
+    def __init__(self, names):
+        super().__init__(names)
+        self.names = names
+
+
+class InvalidPageTokenError(Exception):
+    """ Raised when a pagination cursor was not created by the repository """
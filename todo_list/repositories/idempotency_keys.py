@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
+
+"""
+This module stores the responses of write requests by their "Idempotency-Key", so retried requests get the first
+response again instead of being applied twice (see services.idempotent_requests).
+
+A key is claimed by the first request that sends it, which saves its response once it is done (or releases the key if
+it failed). Claims not completed in "claim_timeout" seconds (e.g. by a worker that died) may be claimed again.
+"""
+
+# Collection with the responses of the requests by their keys, in the database of the tasks
+keys_collection = 'idempotency_keys'
+
+# Seconds after which a claim whose response was not saved may be claimed by another request
+claim_timeout = 60.0
+
+# Code of the error returned by MongoDb when an index exists with other options
+index_options_conflict_code = 85
+
+# Fields of the stored records returned by claim()
+record_projection = {'_id': False, 'fingerprint': True, 'status': True, 'body': True}
+
+# Store of the keys used by the services, None when idempotency keys are disabled
+store = None
+
+
+class MemoryKeyStore:
+    """
+    Stores the responses in the memory of the process, keeping at most "max_size" keys (the oldest ones are
+    evicted) for "ttl" seconds. It is thread-safe.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint):
+        """ Claims a key for a request, returning None, or the record of the request that claimed it before """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and not _is_claimable(entry[0], entry[1], now, self.ttl):
+                return entry[0]
+
+            self._records.pop(key, None)
+            if len(self._records) >= self.max_size:
+                self._records.popitem(last=False)
+            self._records[key] = (pending_record(fingerprint), now)
+            return None
+
+    def save(self, key, status, body):
+        """ Saves the response (status code and body) of the request that claimed a key """
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None:
+                self._records[key] = (dict(entry[0], status=status, body=body), entry[1])
+
+    def release(self, key):
+        """ Releases the claim of a request that failed, so the key may be sent again """
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and entry[0]['status'] is None:
+                del self._records[key]
+
+
+class MongoKeyStore:
+    """
+    Stores the responses in a MongoDb collection, shared by all processes, whose documents are removed "ttl" seconds
+    after they were claimed by a TTL index. As MongoDb removes them from time to time, claims also check their age.
+    """
+
+    def __init__(self, tasks, ttl):
+        self.tasks = tasks
+        self.ttl = ttl
+        self._indexed = False
+
+    @property
+    def keys(self):
+        """ The collection of keys, read from the collection of tasks as it may be created on first use """
+        return self.tasks.database[keys_collection]
+
+    def ensure_indexes(self):
+        """ Creates (or changes) the TTL index that removes the expired keys """
+        try:
+            self.keys.create_index([('created', ASCENDING)], expireAfterSeconds=int(self.ttl))
+        except OperationFailure as error:
+            if error.code != index_options_conflict_code:
+                raise
+            self.tasks.database.command(ttl_index_update(self.ttl))
+        self._indexed = True
+
+    def claim(self, key, fingerprint):
+        if not self._indexed:
+            self.ensure_indexes()
+
+        now = datetime.now(timezone.utc)
+        try:
+            self.keys.update_one(claimable_query(key, now, self.ttl), claim_update(fingerprint, now), upsert=True)
+            return None
+        except DuplicateKeyError:
+            # The key was claimed by another request and may be used
+            record = self.keys.find_one({'_id': key}, record_projection)
+
+        # The key was released (or removed) in the meantime
+        return record if record is not None else self.claim(key, fingerprint)
+
+    def save(self, key, status, body):
+        self.keys.update_one({'_id': key}, {'$set': {'status': status, 'body': body}})
+
+    def release(self, key):
+        self.keys.delete_one({'_id': key, 'status': None})
+
+
+class AsyncMongoKeyStore:
+    """ Stores the responses in a MongoDb collection of an asyncio client (see MongoKeyStore) """
+
+    def __init__(self, tasks, ttl):
+        self.tasks = tasks
+        self.ttl = ttl
+        self._indexed = False
+
+    @property
+    def keys(self):
+        """ The collection of keys, read from the collection of tasks as it may be created on first use """
+        return self.tasks.database[keys_collection]
+
+    async def ensure_indexes(self):
+        try:
+            await self.keys.create_index([('created', ASCENDING)], expireAfterSeconds=int(self.ttl))
+        except OperationFailure as error:
+            if error.code != index_options_conflict_code:
+                raise
+            await self.tasks.database.command(ttl_index_update(self.ttl))
+        self._indexed = True
+
+    async def claim(self, key, fingerprint):
+        if not self._indexed:
+            await self.ensure_indexes()
+
+        now = datetime.now(timezone.utc)
+        try:
+            await self.keys.update_one(claimable_query(key, now, self.ttl), claim_update(fingerprint, now),
+                                       upsert=True)
+            return None
+        except DuplicateKeyError:
+            record = await self.keys.find_one({'_id': key}, record_projection)
+
+        return record if record is not None else await self.claim(key, fingerprint)
+
+    async def save(self, key, status, body):
+        await self.keys.update_one({'_id': key}, {'$set': {'status': status, 'body': body}})
+
+    async def release(self, key):
+        await self.keys.delete_one({'_id': key, 'status': None})
+
+
+def configure(new_store):
+    """ Sets the store of the keys used by the services (e.g. a MemoryKeyStore), or None to disable them """
+    global store
+    store = new_store
+
+
+def pending_record(fingerprint):
+    """ Returns the record of a claimed key whose response was not saved yet """
+    return {'fingerprint': fingerprint, 'status': None, 'body': None}
+
+
+def claimable_query(key, now, ttl):
+    """
+    Returns the query that matches the document of a key only if it may be claimed: it expired or it was claimed
+    "claim_timeout" seconds ago and its response was not saved. Upserting with it fails on a duplicated key otherwise
+    """
+    return {'_id': key, '$or': [{'created': {'$lt': now - timedelta(seconds=ttl)}},
+                                {'status': None, 'created': {'$lt': now - timedelta(seconds=claim_timeout)}}]}
+
+
+def claim_update(fingerprint, now):
+    """ Returns the update that claims a key for a request """
+    return {'$set': dict(pending_record(fingerprint), created=now)}
+
+
+def ttl_index_update(ttl):
+    """ Returns the command that changes the seconds after which the TTL index removes the keys """
+    return {'collMod': keys_collection, 'index': {'keyPattern': {'created': ASCENDING}, 'expireAfterSeconds': int(ttl)}}
+
+
+def _is_claimable(record, claimed, now, ttl):
+    """ Verifies if a record claimed at "claimed" (monotonic seconds) may be claimed again "now" """
+    return claimed + ttl <= now or (record['status'] is None and claimed + claim_timeout <= now)
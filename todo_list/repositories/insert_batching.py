@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from todo_list.repositories.errors import DuplicatedTaskError
+
+"""
+This module groups concurrent inserts of single tasks into one write ("group commit"), used by the repositories when
+insert batching is enabled.
+
+The first insert of a batch waits up to "max_delay" seconds for other inserts to join it, unless "max_size" tasks
+join it before, and then the batch is written with a single unordered insert_many. Every insert still returns on its
+own or raises DuplicatedTaskError, so callers do not notice the batching, except for the added latency.
+"""
+
+
+class InsertBatcher:
+    """ Groups the inserts of concurrent threads, written by "insert_many" (e.g. task_repository.insert_many) """
+
+    def __init__(self, insert_many, max_size, max_delay):
+        self.insert_many = insert_many
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._batch = []
+        self._condition = threading.Condition()
+
+    def insert(self, task):
+        """ Inserts a task with the other ones of its batch. It raises DuplicatedTaskError on a registered name """
+        future = Future()
+        with self._condition:
+            batch = self._batch
+            batch.append((task, future))
+
+            if len(batch) >= self.max_size:
+                # A full batch is written by the thread that filled it
+                self._batch = []
+                self._condition.notify_all()
+            elif len(batch) == 1:
+                # The first task waits for the batch to fill up, writing it if that does not happen in time
+                if self._condition.wait_for(lambda: self._batch is not batch, self.max_delay):
+                    batch = None
+                else:
+                    self._batch = []
+            else:
+                batch = None
+
+        if batch is not None:
+            write_batch(self.insert_many, batch)
+        return future.result()
+
+
+class AsyncInsertBatcher:
+    """
+    Groups the inserts of concurrent coroutines, written by "insert_many" (e.g. async_task_repository.insert_many).
+
+    Batches are written by tasks of their own, so a cancelled insert (e.g. a client that disconnected) does not stop
+    the write of the others.
+    """
+
+    def __init__(self, insert_many, max_size, max_delay):
+        self.insert_many = insert_many
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._batch = []
+        self._timer = None
+        self._writes = set()
+
+    async def insert(self, task):
+        """ Inserts a task with the other ones of its batch. It raises DuplicatedTaskError on a registered name """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._batch
+        batch.append((task, future))
+
+        if len(batch) >= self.max_size:
+            self._write(batch)
+        elif len(batch) == 1:
+            self._timer = loop.call_later(self.max_delay, self._write, batch)
+
+        return await future
+
+    def _write(self, batch):
+        """ Starts writing the batch, unless it was already written for being full """
+        if self._batch is not batch:
+            return
+        self._batch = []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        write = asyncio.ensure_future(write_async_batch(self.insert_many, batch))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+
+def write_batch(insert_many, batch):
+    """ Writes a batch of (task, future) pairs with "insert_many" and completes the future of each task """
+    try:
+        duplicated = set(insert_many([task for task, _ in batch]))
+    except Exception as error:
+        duplicated = error
+    _complete(batch, duplicated)
+
+
+async def write_async_batch(insert_many, batch):
+    """ Writes a batch of (task, future) pairs with "insert_many" (a coroutine function) and completes their futures """
+    try:
+        duplicated = set(await insert_many([task for task, _ in batch]))
+    except Exception as error:
+        duplicated = error
+    _complete(batch, duplicated)
+
+
+def _complete(batch, duplicated):
+    """
+    Completes the futures of a written batch, failing the ones at "duplicated" positions, or all of them if
+    "duplicated" is the error that stopped the write
+    """
+    for position, (task, future) in enumerate(batch):
+        if future.done():
+            continue
+        if isinstance(duplicated, Exception):
+            future.set_exception(duplicated)
+        elif position in duplicated:
+            future.set_exception(DuplicatedTaskError(task.name))
+        else:
+            future.set_result(None)
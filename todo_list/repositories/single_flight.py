@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from todo_list.monitoring import instrumentation
+from todo_list.repositories.engines.async_engine import AsyncIterable
+
+"""
+This module coalesces identical concurrent reads of lists of tasks ("single flight"), used by the repositories when
+read coalescing is enabled.
+
+The first caller of a query reads it and the callers that ask for the same query while it is in flight wait for it
+and share its tasks, so N simultaneous callers cost one database query. The tasks are shared as a SharedTasks list,
+which also keeps their encoded JSON, so the response is serialized once. Writes invalidate the flights: callers that
+come after a write never join a query that started before it.
+"""
+
+
+class SharedTasks(list):
+    """
+    The tasks of a query shared by concurrent callers, which must not change them. It is also an asynchronous
+    iterable and keeps the encoded form of the tasks (see encoded())
+    """
+
+    __slots__ = ('_encoded',)
+
+    def __aiter__(self):
+        return AsyncIterable(self)
+
+    def encoded(self, encode):
+        """ Returns the tasks encoded by "encode" (e.g. task_json.encode_tasks), encoding them on the first call """
+        try:
+            return self._encoded
+        except AttributeError:
+            self._encoded = encode(self)
+            return self._encoded
+
+
+class SingleFlight:
+    """ Coalesces the reads of concurrent threads by query. It is thread-safe """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def read(self, key, read):
+        """
+        Returns the tasks of the query "key", read by calling "read" (which returns an iterable of tasks) unless the
+        same query is in flight, in which case its tasks are returned
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+
+        if not leader:
+            instrumentation.record_coalesced(key[0])
+            return flight.result()
+
+        try:
+            tasks = SharedTasks(read())
+            flight.set_result(tasks)
+            return tasks
+        except BaseException as error:
+            flight.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def invalidate(self):
+        """ Forgets the queries in flight, so later callers read them again (e.g. after a write) """
+        with self._lock:
+            self._flights.clear()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces the reads of concurrent coroutines by query. Queries are read by tasks of their own, so a cancelled
+    caller (e.g. a client that disconnected) does not cancel the read of the others
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    async def read(self, key, read):
+        """
+        Returns the tasks of the query "key", read by awaiting "read()" (which returns an asynchronous iterable of
+        tasks) unless the same query is in flight, in which case its tasks are returned
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(_read_async(read))
+            flight.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            instrumentation.record_coalesced(key[0])
+        return await asyncio.shield(flight)
+
+    def invalidate(self):
+        """ Forgets the queries in flight, so later callers read them again (e.g. after a write) """
+        self._flights.clear()
+
+    def _forget(self, key, flight):
+        """ Forgets a query once it was read, unless a later read of the same query is in flight """
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # The error is raised to the callers, if they are still waiting
+        if not flight.cancelled():
+            flight.exception()
+
+
+async def _read_async(read):
+    """ Reads the tasks of an asynchronous query """
+    return SharedTasks([task async for task in await read()])
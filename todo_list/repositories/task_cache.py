@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+from todo_list.monitoring import instrumentation
+
+"""
+This module maintains an in-process cache of tasks by name, used by the repository to avoid a round trip to
+MongoDb on every lookup.
+
+The cache is only invalidated by writes made by this process, so the TTL is what bounds how stale an entry can be
+when other processes (e.g. other gunicorn workers) change the same task. Its hits, misses and evictions are reported
+on "/metrics".
+"""
+
+
+class TaskCache:
+    """
+    A thread-safe LRU cache whose entries expire after "ttl" seconds.
+
+    A task read while a write invalidates its name must not be cached, as it may be the task before the write. So
+    reads take a generation() before reading and put() drops the task if its name was invalidated since then. The
+    generations of the last "max_size" invalidated names are kept; a read older than the ones that were dropped is
+    never cached.
+
+    Lookups and evictions are reported on "/metrics" unless "instrumented" is False, so other caches built on this
+    class (e.g. the one of compressed responses) do not change the hit ratio of the cache of tasks.
+    """
+
+    # Returned by get() when the name is not cached, as None is a cached "not found"
+    missing = object()
+
+    def __init__(self, max_size, ttl, instrumented=True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.instrumented = instrumented
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._oldest_generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, task_name, version=None):
+        """
+        Returns the cached task (or None if it was not found) or TaskCache.missing if there is no valid entry. Entries
+        are only valid for the version of the tasks they were cached at
+        """
+        with self._lock:
+            entry = self._entries.get(task_name)
+            hit = entry is not None and entry[1] >= time.monotonic() and entry[2] == version
+            if hit:
+                self._entries.move_to_end(task_name)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if self.instrumented:
+            instrumentation.record_cache_lookup(hit)
+        return entry[0] if hit else TaskCache.missing
+
+    def generation(self):
+        """ Returns the generation to pass to put() for a task read from now on """
+        return self._generation
+
+    def put(self, task_name, task, generation=None, version=None):
+        """
+        Caches a task (or None if it was not found) read at a version of the tasks, evicting the least recently used
+        entry if it is full. The task is dropped if its name was invalidated after "generation", when it is informed
+        """
+        with self._lock:
+            if generation is not None and (generation < self._oldest_generation or
+                                           self._invalidated.get(task_name, 0) > generation):
+                return
+
+            self._entries[task_name] = (task, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(task_name)
+            evicted = len(self._entries) > self.max_size
+            if evicted:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        if evicted and self.instrumented:
+            instrumentation.record_cache_eviction()
+
+    def invalidate(self, *task_names):
+        """ Removes the entries of the informed names """
+        with self._lock:
+            self._generation += 1
+            for task_name in task_names:
+                self._entries.pop(task_name, None)
+                self._invalidated.pop(task_name, None)
+                self._invalidated[task_name] = self._generation
+            while len(self._invalidated) > self.max_size:
+                self._oldest_generation = self._invalidated.popitem(last=False)[1]
+
+    def clear(self):
+        """ Removes all the entries """
+        with self._lock:
+            self._generation += 1
+            self._oldest_generation = self._generation
+            self._invalidated.clear()
+            self._entries.clear()
+
+    def stats(self):
+        """ Returns the cache counters """
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class FragmentCache:
+    """
+    A cache of the encoded JSON of tasks by name, holding at most "max_size" entries (the oldest ones are evicted).
+
+    Reads do not lock nor track usage, as they happen once per task of every list.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_name):
+        """ Returns the cached entry or None """
+        return self._entries.get(task_name)
+
+    def put(self, task_name, entry):
+        """ Caches an entry, evicting the oldest one if it is full """
+        with self._lock:
+            self._entries.pop(task_name, None)
+            if len(self._entries) >= self.max_size:
+                del self._entries[next(iter(self._entries))]
+            self._entries[task_name] = entry
+
+    def invalidate(self, *task_names):
+        """ Removes the entries of the informed names """
+        with self._lock:
+            for task_name in task_names:
+                self._entries.pop(task_name, None)
+
+    def clear(self):
+        """ Removes all the entries """
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache used by the repository, None when caching is disabled
+cache = None
+
+# Cache of the JSON of tasks (see services.task_json), None when it is disabled
+fragments = None
+
+
+def configure(enabled, max_size=1024, ttl=5.0):
+    """ Enables (or disables) the cache used by the repository """
+    global cache
+    cache = TaskCache(max_size, ttl) if enabled else None
+
+
+def configure_fragments(enabled, max_size=100000):
+    """ Enables (or disables) the cache of the JSON of tasks, which the repository invalidates on writes """
+    global fragments
+    fragments = FragmentCache(max_size) if enabled else None
+
+
+def stats():
+    """ Returns the counters of the cache used by the repository or None if caching is disabled """
+    return cache.stats() if cache is not None else None
@@ -0,0 +1,239 @@
+import asyncio
+import queue
+import threading
+import uuid
+from collections import deque
+
+"""
+This module keeps the in-process feed of changes of tasks, used by "/task/events" when MongoDb change streams are not
+available (e.g. a standalone MongoDb or the memory engine).
+
+The repository publishes an event after every write. Each event has an "id" (the token to resume after it), a
+"type" ("create", "update", "delete" or "reset", which asks clients to read the tasks again) and "data". As events
+only come from the writes of this process, the hub is meant for a single process (e.g. one gunicorn worker).
+"""
+
+# Hub of events, None when events come from MongoDb change streams
+hub = None
+
+# Seconds without events after which watchers receive None, so keep-alives can be sent
+heartbeat = 15.0
+
+
+class EventHub:
+    """
+    Publishes events to the subscribed watchers and keeps the last "history_size" ones, so watchers can resume
+    after an event they received. It is thread-safe.
+    """
+
+    def __init__(self, history_size):
+        # Tokens are "<hub id>-<sequence>", so tokens of another process (or of a restarted one) are detected
+        self.id = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, **data):
+        """ Publishes an event to all subscribers """
+        with self._lock:
+            self._sequence += 1
+            event = {'id': f'{self.id}-{self._sequence}', 'type': event_type, 'data': data}
+            self._history.append((self._sequence, event))
+            subscribers = list(self._subscribers)
+
+        for put in subscribers:
+            put(event)
+
+    def subscribe(self, put, after=None):
+        """
+        Calls "put" with every event published from now on and returns the events published after the token
+        "after". If those events are no longer kept (or the token is unknown), a reset event is returned instead.
+        """
+        with self._lock:
+            self._subscribers.add(put)
+            if after is None:
+                return []
+
+            hub_id, _, sequence = after.rpartition('-')
+            if hub_id != self.id or not sequence.isdigit() or int(sequence) > self._sequence:
+                return [self._reset()]
+
+            sequence = int(sequence)
+            if sequence < self._sequence and (not self._history or self._history[0][0] > sequence + 1):
+                return [self._reset()]
+            return [event for event_sequence, event in self._history if event_sequence > sequence]
+
+    def unsubscribe(self, put):
+        """ Stops calling "put" with the published events """
+        with self._lock:
+            self._subscribers.discard(put)
+
+    def watch(self, status=None, after=None, timeout=15.0):
+        """
+        Returns an iterator over the events published after "after" (see subscribe()) and the following ones, of
+        tasks with matching status if it is informed. It yields None when there are no events for "timeout" seconds.
+
+        The watcher is subscribed at once, so no event is lost before the iteration starts.
+        """
+        events = queue.SimpleQueue()
+        missed = self.subscribe(events.put, after)
+        return self._watch(events.put, missed, events.get, status, timeout)
+
+    def watch_async(self, status=None, after=None, timeout=15.0):
+        """ Does the same as watch(), returning an asynchronous iterator that does not block the event loop """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def put(event):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        missed = self.subscribe(put, after)
+        return self._watch_async(put, missed, events.get, status, timeout)
+
+    def _watch(self, put, missed, get, status, timeout):
+        """ Yields the missed events and then the ones got from the queue of the watcher, until it is closed """
+        try:
+            for event in missed:
+                if matches(event, status):
+                    yield event
+
+            while True:
+                try:
+                    event = get(timeout=timeout)
+                except queue.Empty:
+                    yield None
+                    continue
+                if matches(event, status):
+                    yield event
+        finally:
+            self.unsubscribe(put)
+
+    async def _watch_async(self, put, missed, get, status, timeout):
+        """ Does the same as _watch(), awaiting the queue of the watcher """
+        try:
+            for event in missed:
+                if matches(event, status):
+                    yield event
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if matches(event, status):
+                    yield event
+        finally:
+            self.unsubscribe(put)
+
+    def _reset(self):
+        """ Returns the event that asks a watcher to read the tasks again, resuming from the last event """
+        return {'id': f'{self.id}-{self._sequence}', 'type': 'reset', 'data': {}}
+
+
+def matches(event, status):
+    """
+    Verifies if an event may concern tasks with "status" (or any status if it is None).
+
+    Updates and deletes of single tasks always match, as the status of the task before them is not known, so
+    watchers can drop tasks that left the status.
+    """
+    if status is None or event['type'] == 'reset':
+        return True
+
+    data = event['data']
+    if event['type'] == 'create':
+        return data['task']['status'] == status
+    if 'status' in data:
+        return data['status'] == status or data.get('set', {}).get('status') == status
+    return True
+
+
+def configure(enabled, history_size=1000, new_heartbeat=15.0):
+    """ Enables (or disables) the in-process hub of events """
+    global hub, heartbeat
+    hub = EventHub(history_size) if enabled else None
+    heartbeat = new_heartbeat
+
+
+def publish_insert(task):
+    """ Publishes the creation of a task """
+    if hub is not None:
+        hub.publish('create', task=task.to_document())
+
+
+def publish_inserts(tasks, duplicated):
+    """ Publishes the creation of a list of tasks, except the ones at "duplicated" positions """
+    if hub is not None:
+        duplicated = set(duplicated)
+        for position, task in enumerate(tasks):
+            if position not in duplicated:
+                hub.publish('create', task=task.to_document())
+
+
+def publish_update(task_name, task, updated):
+    """ Publishes the update of the task "task_name", if it was updated """
+    if hub is not None and updated:
+        hub.publish('update', name=task_name, task=task.to_document())
+
+
+def publish_updates(updates, matched, duplicated):
+    """
+    Publishes the updates of a list of (task_name, task) pairs, except the ones at "duplicated" positions.
+
+    Bulk writes do not tell which names were matched, so if some of them were not, a reset event is published.
+    """
+    if hub is None:
+        return
+
+    duplicated = set(duplicated)
+    accepted = [update for position, update in enumerate(updates) if position not in duplicated]
+    if matched != len(accepted):
+        hub.publish('reset')
+        return
+
+    for task_name, task in accepted:
+        hub.publish('update', name=task_name, task=task.to_document())
+
+
+def publish_upserts(tasks, created, duplicated):
+    """
+    Publishes the creation of the tasks of a list at "created" positions and the update of the others, except the
+    ones at "duplicated" positions
+    """
+    if hub is None:
+        return
+
+    created = set(created)
+    duplicated = set(duplicated)
+    for position, task in enumerate(tasks):
+        if position in created:
+            hub.publish('create', task=task.to_document())
+        elif position not in duplicated:
+            hub.publish('update', name=task.name, task=task.to_document())
+
+
+def publish_status_update(status, values, matched):
+    """ Publishes that "values" were set on all tasks with "status", if any task was matched """
+    if hub is not None and matched:
+        hub.publish('update', status=status, set=values)
+
+
+def publish_delete(task_name, deleted):
+    """ Publishes the deletion of a task, if it was deleted """
+    if hub is not None and deleted:
+        hub.publish('delete', name=task_name)
+
+
+def publish_deletes(task_names, deleted):
+    """ Publishes the deletion of a list of tasks, if any task was deleted """
+    if hub is not None and deleted:
+        for task_name in dict.fromkeys(task_names):
+            hub.publish('delete', name=task_name)
+
+
+def publish_status_delete(status, deleted):
+    """ Publishes the deletion of all tasks with "status", if any task was deleted """
+    if hub is not None and deleted:
+        hub.publish('delete', status=status)
@@ -1,44 +1,475 @@
-from todo_list.dbs.mongo import tasks
+import base64
+import binascii
+import logging
+import os
+import threading
+import time
+
+from todo_list.monitoring import instrumentation
+from todo_list.repositories import task_cache
+from todo_list.repositories import task_events
+from todo_list.repositories.engines.task_engine import text_words
+from todo_list.repositories.errors import DuplicatedNamesError
+from todo_list.repositories.errors import InvalidPageTokenError
+from todo_list.repositories.insert_batching import InsertBatcher
+from todo_list.repositories.single_flight import SingleFlight
 
 """
-This module manipulates the instance of a collection from MongoDb
+This module manipulates the tasks stored by the configured storage engine (see configure())
 """
 
+logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
+
+# Logged when the unique index on name cannot be created, with some of the duplicated names
+duplicated_names_log = ('Tasks share names (e.g. %s), so the unique index on name was not created and writes do not '
+                        'reject duplicated names. Remove the duplicates (see "Duplicated names" on the README) and '
+                        'restart the app')
+
+# Logged when change streams are forced but the storage engine does not support them
+change_streams_unsupported_log = ('TASK_EVENTS_SOURCE is "change_streams", but the storage engine does not support '
+                                  'change streams (MongoDb must be a replica set), so the changes of tasks come from '
+                                  'the writes of this process')
+
+# Storage engine (a TaskEngine) used by the repository
+engine = None
+
+# Seconds during which the counts of tasks by status are reused, i.e. how stale they may be
+counts_ttl = 5.0
+
+# Whether writes change the version of the tasks, which answers conditional requests. It costs a write more
+track_version = False
+
+# Seconds during which the version of the tasks is reused. Writes made by this process are seen at once
+version_ttl = 1.0
+
+# Counts of tasks by status and when they expire
+_counts = None
+_counts_lock = threading.Lock()
+
+# Version of the tasks and when it expires
+_version = None
+
+# Groups concurrent inserts into single writes, None when insert batching is disabled
+_insert_batcher = None
+
+# Coalesces identical concurrent reads of lists of tasks, None when read coalescing is disabled
+_flights = None
+
+# Whether prepare() already ran in this process
+_prepared = False
+_prepare_lock = threading.Lock()
+
+
+def configure(new_engine, new_counts_ttl=5.0, new_version_ttl=1.0, new_track_version=False):
+    """
+    Sets the storage engine used by the repository, how long the counts of tasks by status and the version of the
+    tasks are reused and whether the version is kept (see version())
+    """
+    global engine, counts_ttl, version_ttl, track_version, _counts, _version
+    engine = new_engine
+    counts_ttl = new_counts_ttl
+    version_ttl = new_version_ttl
+    track_version = new_track_version
+    _counts = None
+    _version = None
+
+
+def configure_events(source='auto', history_size=1000, heartbeat=15.0):
+    """
+    Sets where the changes of tasks (see watch()) come from: "change_streams" (the storage engine, which sees the
+    writes of all processes), "hub" (the in-process hub, which sees the writes of this process) or "auto" (the
+    storage engine when it supports change streams). The hub keeps the last "history_size" events. If change streams
+    are forced but not supported, the hub is used and a warning is logged.
+    """
+    use_hub = source == 'hub' or not engine.supports_change_streams()
+    if use_hub and source == 'change_streams':
+        logger.warning(change_streams_unsupported_log)
+    task_events.configure(use_hub, history_size, heartbeat)
+
+
+def configure_insert_batching(enabled, max_size=100, max_delay=0.005):
+    """
+    Enables (or disables) the batching of concurrent inserts (see insert_batching): an insert waits up to "max_delay"
+    seconds for others to join it, and up to "max_size" tasks are written at once
+    """
+    global _insert_batcher
+    _insert_batcher = InsertBatcher(insert_many, max_size, max_delay) if enabled else None
+
+
+def configure_read_coalescing(enabled):
+    """
+    Enables (or disables) the coalescing of identical concurrent reads of lists of tasks (see single_flight): callers
+    of a query in flight share its tasks instead of reading it again. Lists are then read whole, even when streamed
+    """
+    global _flights
+    _flights = SingleFlight() if enabled else None
+
+
+def prepare(events_source='auto', events_history_size=1000, events_heartbeat=15.0):
+    """
+    Ensures the indexes and sets where the changes of tasks come from (see configure_events()), once per process.
+
+    It is meant to run before every request, so starting the app (e.g. before gunicorn forks its workers) does not
+    wait for the storage engine. If the engine fails, the next call tries again.
+    """
+    global _prepared
+    if _prepared:
+        return
+    with _prepare_lock:
+        if not _prepared:
+            ensure_indexes()
+            configure_events(events_source, events_history_size, events_heartbeat)
+            _prepared = True
+
 
+def ensure_indexes():
+    """
+    Creates the indexes used by the storage engine. If tasks share names, it logs how to remove the duplicates
+    instead of failing every request until they are removed
+    """
+    try:
+        engine.ensure_indexes()
+    except DuplicatedNamesError as error:
+        logger.error(duplicated_names_log, ', '.join(f'"{name}"' for name in error.names))
+
+
+@instrumentation.timed
 def is_registered(task_name):
     """ Verifies if there is a task with the informed name """
-    if tasks.find({'name': task_name}).count() > 0:
-        return True
-    else:
-        return False
+    return engine.is_registered(task_name)
+
+
+@instrumentation.timed
+def get_by_name(task_name, at_version=None):
+    """
+    Returns the first task with the informed name.
+
+    When the cache is enabled, both found and not found tasks are read from it. If "at_version" (a version()) is
+    informed, only tasks cached at that version are read, so a task cached before a write of another process is never
+    sent with the version after it.
+    """
+    cache = task_cache.cache
+    if cache is None:
+        return engine.get_by_name(task_name)
+
+    task = cache.get(task_name, at_version)
+    if task is task_cache.TaskCache.missing:
+        generation = cache.generation()
+        task = engine.get_by_name(task_name)
+        cache.put(task_name, task, generation, at_version)
+    return task
+
+
+@instrumentation.timed_reads
+def get_by_status(status, limit=None, after=None):
+    """
+    Returns an iterable (e.g. a MongoDb cursor) over the well formed tasks with matching status.
+
+    Tasks are ordered by name; "limit" bounds how many tasks are returned and "after" is a token from
+    next_page_token() telling where the previous page stopped. When read coalescing is enabled, the tasks are a list
+    shared with the identical calls made at the same time.
+    """
+    return _coalesced(engine.get_by_status, status, limit, parse_page_token(after))
+
+
+@instrumentation.timed_reads
+def get_all(limit=None, after=None):
+    """
+    Returns an iterable (e.g. a MongoDb cursor) over all the well formed tasks.
+
+    Tasks are ordered by name; "limit" bounds how many tasks are returned and "after" is a token from
+    next_page_token() telling where the previous page stopped. When read coalescing is enabled, the tasks are a list
+    shared with the identical calls made at the same time.
+    """
+    return _coalesced(engine.get_all, limit, parse_page_token(after))
+
+
+@instrumentation.timed_reads
+def search(prefix=None, text=None, limit=None, after=None):
+    """
+    Returns an iterable over the well formed tasks whose names start with "prefix" and/or that have any of the
+    words of "text" in their names or descriptions.
+
+    Tasks found by prefix are ordered by name and tasks found by text are ordered by relevance, then by name.
+    "limit" bounds how many tasks are returned and "after" is a token from next_search_token() telling where the
+    previous page stopped.
+    """
+    if text is None:
+        return _coalesced(engine.search_by_prefix, prefix, limit, parse_page_token(after))
+
+    skip = parse_offset_token(after)
+    words = search_words(text)
+    if not words:
+        return []
+    return _coalesced(engine.search_text, words, prefix, limit, skip)
+
+
+@instrumentation.timed_reads
+def export():
+    """
+    Returns an iterable (e.g. a MongoDb cursor) over all the well formed tasks, ordered by name.
+
+    Unlike get_all(), the tasks are never read whole by coalesced reads, so the storage engine reads them in batches
+    while they are consumed and any number of tasks can be exported in constant memory.
+    """
+    return engine.get_all(None, None)
+
+
+@instrumentation.timed
+def count_by_status():
+    """
+    Returns a dict with the number of tasks of each status.
+
+    Counting may read the whole collection, so the counts are reused for "counts_ttl" seconds, even if tasks are
+    written in the meantime. Only one thread counts when they expire.
+    """
+    global _counts
+    counts = _counts
+    if counts is None or counts[1] <= time.monotonic():
+        with _counts_lock:
+            counts = _counts
+            if counts is None or counts[1] <= time.monotonic():
+                counts = _counts = (engine.count_by_status(), time.monotonic() + counts_ttl)
+    return counts[0]
+
 
+@instrumentation.timed
+def version():
+    """
+    Returns the version of the tasks, which changes on every write, and when it changed (a UTC datetime or None).
+    It returns None when the version is not kept ("track_version").
 
-def get_by_name(task_name):
-    """ Returns the first task with the informed name """
-    return tasks.find_one({'name': task_name})
+    It is reused for "version_ttl" seconds, so writes made by other processes may take that long to be seen.
+    """
+    global _version
+    if not track_version:
+        return None
+    current = _version
+    if current is None or current[1] <= time.monotonic():
+        current = _version = (engine.version(), time.monotonic() + version_ttl)
+    return current[0]
 
 
-def get_by_status(status):
-    """ Returns all tasks with matching status """
-    return list(tasks.find({'status': status}))
+def watch(status=None, after=None):
+    """
+    Returns an iterator over the changes of tasks (see task_events) after the token "after", of tasks with matching
+    status if it is informed. It yields None when there are no changes for "task_events.heartbeat" seconds.
 
+    Changes come from the in-process hub of events when it is enabled, otherwise from the storage engine.
+    """
+    if task_events.hub is not None:
+        return task_events.hub.watch(status, after, task_events.heartbeat)
+    return engine.watch(status, after, task_events.heartbeat)
 
-def get_all():
-    """ Returns all the tasks """
-    return list(tasks.find({}))
 
+def next_page_token(task):
+    """ Returns the opaque token of the page that starts after the informed task """
+    return base64.urlsafe_b64encode(task['name'].encode()).decode()
 
+
+def next_search_token(text, after, tasks_found):
+    """
+    Returns the opaque token of the page of a search (see search()) that starts after "tasks_found", the tasks of
+    the page read with the token "after"
+    """
+    if text is None:
+        return next_page_token(tasks_found[-1])
+    # Pages ordered by relevance are told apart by how many tasks come before them
+    offset = parse_offset_token(after) + len(tasks_found)
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def search_words(text):
+    """ Returns the distinct words searched in "text", in the order they appear """
+    return tuple(dict.fromkeys(text_words(text)))
+
+
+@instrumentation.timed
 def update(task_name, task):
-    """ Updates a task based on its name """
-    tasks.update(
-        {'name': task_name}, {"$set": {'name': task.name, 'description': task.description, 'status': task.status}})
+    """
+    Updates a task based on its name.
+
+    It returns False if there is no task with the informed name.
+    It raises DuplicatedTaskError if the new name belongs to another task.
+    """
+    updated = engine.update(task_name, task)
+
+    invalidate_cache(task_name, task.name)
+    _bump_version()
+    task_events.publish_update(task_name, task, updated)
+    return updated
+
+
+@instrumentation.timed
+def update_many(updates):
+    """
+    Updates a list of tasks based on their names with a single write, so a rejected update does not stop the others.
+
+    "updates" is a list of (task_name, task) pairs. It returns how many tasks were matched and modified and the
+    positions (in "updates") of the updates rejected for renaming a task to a registered name.
+    """
+    matched, modified, duplicated = engine.update_many(updates)
+
+    invalidate_cache(*[name for task_name, task in updates for name in (task_name, task.name)])
+    _bump_version()
+    task_events.publish_updates(updates, matched, duplicated)
+    return matched, modified, duplicated
+
 
+@instrumentation.timed
+def update_by_status(status, values):
+    """
+    Sets "values" (a dict with description and/or status) on all tasks with matching status.
 
+    It returns how many tasks were matched and modified.
+    """
+    matched, modified = engine.update_by_status(status, values)
+
+    clear_cache()
+    _bump_version()
+    task_events.publish_status_update(status, values, matched)
+    return matched, modified
+
+
+@instrumentation.timed
 def insert(task):
-    """ Inserts a new task """
-    tasks.insert_one(task.__dict__)
+    """
+    Inserts a new task.
+
+    It raises DuplicatedTaskError if there is a task with the same name.
+    When insert batching is enabled, the task is written along with the ones inserted concurrently.
+    """
+    if _insert_batcher is not None:
+        return _insert_batcher.insert(task)
+
+    engine.insert(task)
+
+    invalidate_cache(task.name)
+    _bump_version()
+    task_events.publish_insert(task)
+
+
+@instrumentation.timed
+def insert_many(tasks_to_insert):
+    """
+    Inserts a list of tasks with a single write, so a rejected task does not stop the others.
+
+    It returns the positions (in "tasks_to_insert") of the tasks rejected for having a registered name.
+    """
+    duplicated = engine.insert_many(tasks_to_insert)
+
+    invalidate_cache(*[task.name for task in tasks_to_insert])
+    _bump_version()
+    task_events.publish_inserts(tasks_to_insert, duplicated)
+    return duplicated
+
 
+@instrumentation.timed
+def upsert_many(tasks_to_upsert):
+    """
+    Inserts a list of tasks with a single write, replacing the ones with registered names, so a rejected task does not
+    stop the others.
 
+    It returns the positions (in "tasks_to_upsert") of the tasks created, how many registered tasks were replaced and
+    the positions of the tasks rejected by concurrent writes of the same names.
+    """
+    created, matched, duplicated = engine.upsert_many(tasks_to_upsert)
+
+    invalidate_cache(*[task.name for task in tasks_to_upsert])
+    _bump_version()
+    task_events.publish_upserts(tasks_to_upsert, created, duplicated)
+    return created, matched, duplicated
+
+
+@instrumentation.timed
 def delete(task_name):
-    """ Deletes a task based on its name """
-    tasks.delete_one({'name': task_name})
+    """
+    Deletes a task based on its name.
+
+    It returns False if there is no task with the informed name.
+    """
+    deleted = engine.delete(task_name)
+
+    invalidate_cache(task_name)
+    _bump_version()
+    task_events.publish_delete(task_name, deleted)
+    return deleted
+
+
+@instrumentation.timed
+def delete_many(task_names):
+    """ Deletes the tasks with the informed names. It returns how many tasks were deleted """
+    deleted = engine.delete_many(task_names)
+
+    invalidate_cache(*task_names)
+    _bump_version()
+    task_events.publish_deletes(task_names, deleted)
+    return deleted
+
+
+@instrumentation.timed
+def delete_by_status(status):
+    """ Deletes all tasks with matching status. It returns how many tasks were deleted """
+    deleted = engine.delete_by_status(status)
+
+    clear_cache()
+    _bump_version()
+    task_events.publish_status_delete(status, deleted)
+    return deleted
+
+
+def parse_page_token(token):
+    """ Returns the name encoded by next_page_token() (or None if there is no token) """
+    if token is None:
+        return None
+    try:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+    except (binascii.Error, ValueError):
+        raise InvalidPageTokenError(token)
+
+
+def parse_offset_token(token):
+    """ Returns the number of tasks before the page of a text search encoded by next_search_token() (0 if no token) """
+    if token is None:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(token.encode()).decode())
+    except (binascii.Error, ValueError):
+        raise InvalidPageTokenError(token)
+    if offset < 0:
+        raise InvalidPageTokenError(token)
+    return offset
+
+
+def _coalesced(read, *args):
+    """
+    Calls "read" (a list function of the engine), sharing its tasks with the identical calls in flight when read
+    coalescing is enabled
+    """
+    if _flights is None:
+        return read(*args)
+    return _flights.read((read.__name__,) + args, lambda: read(*args))
+
+
+def _bump_version():
+    """ Changes the version of the tasks after a write, so later reads do not share the ones made before it """
+    global _version
+    if track_version:
+        engine.bump_version()
+        _version = None
+    if _flights is not None:
+        _flights.invalidate()
+
+
+def invalidate_cache(*task_names):
+    """ Removes the informed names from the caches, if they are enabled """
+    for cache in (task_cache.cache, task_cache.fragments):
+        if cache is not None:
+            cache.invalidate(*task_names)
+
+
+def clear_cache():
+    """ Removes all names from the caches, if they are enabled. Used by writes that do not know the changed names """
+    for cache in (task_cache.cache, task_cache.fragments):
+        if cache is not None:
+            cache.clear()
@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections import deque
+
+from todo_list.monitoring import instrumentation
+from todo_list.services import task_messages
+
+"""
+This module limits how many requests of each task route are handled at once (admission control), so when MongoDb
+slows down the excess requests are answered at once with 503, instead of piling up in the workers until all of them
+time out.
+
+Each route has its own limit, so cheap routes (e.g. get_by_name) keep being served when expensive ones (e.g.
+get_all) are saturated. A request over the limit waits in a bounded queue for at most "queue_timeout" seconds, which
+bounds the latency added to the admitted requests; when the queue is full or the wait times out, it is answered with
+503 and "Retry-After". Clients may also be limited to a rate of requests (token buckets), answered with 429.
+
+Limits are kept by each process, so the limits and rates configured for the server are shared between its workers
+(see configure_workers()). Only the queue is per worker, as it bounds the latency each worker adds.
+"""
+
+logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
+
+# Routes (view names) that are never limited, as they hold the request on purpose (the stream of changes)
+exempt_routes = ('events',)
+
+# Name of the blueprint whose routes are limited
+blueprint = 'task'
+
+# Limit of requests handled at once by route, and of the routes that are not in it, for the whole server
+limits = {}
+default_limit = 32
+
+# Workers of the server, which share the limits and the rates
+workers = 1
+
+# Requests of a route that may wait for a slot, and for how many seconds
+queue_size = 16
+queue_timeout = 0.5
+
+# Seconds sent on "Retry-After" when a request is shed
+retry_after = 1
+
+# Limiters by route, created on first use, None when admission control is disabled
+limiters = None
+_limiters_lock = threading.Lock()
+_limiter_class = None
+
+# Limits the rate of requests of each client, None when rate limiting is disabled
+rate_limiter = None
+
+# Rate of requests per second of each client and its bursts, for the whole server
+rate = 0
+burst = None
+
+# Header that identifies the clients (e.g. "X-Api-Key"), or None to tell them by address
+client_header = None
+
+
+class ConcurrencyLimiter:
+    """ Admits at most "limit" threads at once, queueing at most "queue_size" threads for "queue_timeout" seconds """
+
+    def __init__(self, route, limit, queue_size, queue_timeout):
+        self.labels = (('route', route),)
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Waits for a slot, returning None if it was admitted or the reason why it was not """
+        start = time.perf_counter()
+        with self._condition:
+            if self.active < self.limit and self.waiting == 0:
+                self.active += 1
+                instrumentation.record_admission(self.labels, 0.0)
+                return None
+
+            if self.waiting >= self.queue_size:
+                instrumentation.record_rejection(self.labels, 'queue_full')
+                return 'queue_full'
+
+            self.waiting += 1
+            instrumentation.record_queued(self.labels, 1)
+            try:
+                admitted = self._condition.wait_for(lambda: self.active < self.limit, self.queue_timeout)
+            finally:
+                self.waiting -= 1
+                instrumentation.record_queued(self.labels, -1)
+
+            if not admitted:
+                instrumentation.record_rejection(self.labels, 'queue_timeout')
+                return 'queue_timeout'
+            self.active += 1
+            instrumentation.record_admission(self.labels, time.perf_counter() - start)
+            return None
+
+    def release(self):
+        """ Frees the slot of an admitted request, waking up the oldest waiting one """
+        with self._condition:
+            self.active -= 1
+            instrumentation.record_release(self.labels)
+            self._condition.notify()
+
+
+class AsyncConcurrencyLimiter:
+    """
+    Admits at most "limit" coroutines at once, queueing at most "queue_size" coroutines for "queue_timeout" seconds.
+    Released slots are handed over to the queued coroutines in order
+    """
+
+    def __init__(self, route, limit, queue_size, queue_timeout):
+        self.labels = (('route', route),)
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        """ Waits for a slot, returning None if it was admitted or the reason why it was not """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            instrumentation.record_admission(self.labels, 0.0)
+            return None
+
+        if len(self._waiters) >= self.queue_size:
+            instrumentation.record_rejection(self.labels, 'queue_full')
+            return 'queue_full'
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        instrumentation.record_queued(self.labels, 1)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over right before the wait timed out, so the request is admitted with it
+            if not waiter.done() or waiter.cancelled():
+                instrumentation.record_rejection(self.labels, 'queue_timeout')
+                return 'queue_timeout'
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before the request was cancelled
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            instrumentation.record_queued(self.labels, -1)
+
+        instrumentation.record_admission(self.labels, time.perf_counter() - start)
+        return None
+
+    def release(self):
+        """ Frees the slot of an admitted request, handing it over to the oldest waiting one """
+        instrumentation.record_release(self.labels)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimiter:
+    """
+    Limits each client to "rate" requests per second, allowing bursts of "burst" requests, with a token bucket per
+    client. At most "max_clients" buckets are kept (the least recently used ones are dropped). It is thread-safe.
+    """
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """ Takes a token of the client, returning 0 or, if there are none, in how many seconds there will be one """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+def configure(enabled, new_limits=None, new_default_limit=32, new_queue_size=16, new_queue_timeout=0.5,
+              new_retry_after=1, async_stack=False):
+    """
+    Enables (or disables) the limits of requests handled at once by route (see parse_limits()) by the whole server,
+    for the sync or the async stack
+    """
+    global limits, default_limit, queue_size, queue_timeout, retry_after, limiters, _limiter_class
+    limits = new_limits or {}
+    default_limit = new_default_limit
+    queue_size = new_queue_size
+    queue_timeout = new_queue_timeout
+    retry_after = new_retry_after
+    limiters = {} if enabled else None
+    _limiter_class = AsyncConcurrencyLimiter if async_stack else ConcurrencyLimiter
+
+
+def configure_rate_limit(new_rate, new_burst=None, new_client_header=None, max_clients=10000):
+    """
+    Limits each client to "new_rate" requests per second (disabled if it is 0), with bursts of "new_burst" requests.
+    Clients are told by "new_client_header" or, if it is None, by address
+    """
+    global rate, burst, rate_limiter, client_header
+    rate = new_rate
+    burst = new_burst or max(1.0, new_rate)
+    client_header = new_client_header
+    rate_limiter = RateLimiter(rate / workers, max(1.0, burst / workers), max_clients) if rate > 0 else None
+
+
+def configure_workers(worker_count, concurrent=True):
+    """
+    Shares the limits and the rates between the "worker_count" workers of the server, as each one keeps its own (e.g.
+    from the post_worker_init hook of gunicorn.conf.py). Each worker gets its share, of at least one request.
+
+    Workers that handle one request at a time (not "concurrent", e.g. the sync worker of gunicorn) can never exceed a
+    limit of requests at once, so the limits are disabled, with a warning. Rates still apply.
+    """
+    global workers, limiters
+    workers = max(1, worker_count)
+    if limiters is not None:
+        if concurrent:
+            limiters = {}
+        else:
+            logger.warning('Admission limits have no effect on workers that handle one request at a time, so they '
+                           'were disabled. Use a worker with threads (e.g. "--threads 8") or the async stack')
+            limiters = None
+    if rate_limiter is not None:
+        configure_rate_limit(rate, burst, client_header, rate_limiter.max_clients)
+
+
+def parse_limits(text):
+    """ Reads limits written as "route=limit,route=limit" (e.g. "get_by_name=64,get_all=8") """
+    parsed = {}
+    for item in text.split(','):
+        if item.strip():
+            route, limit = item.split('=')
+            parsed[route.strip()] = int(limit)
+    return parsed
+
+
+def admit_request():
+    """
+    Runs before each request of the flask app (see flask_app.create_app), answering it with 429 or 503 when it is
+    not admitted
+    """
+    import flask
+
+    route = _limited_route(flask.request)
+    if route is None:
+        return None
+
+    shed = _take_token(flask.request)
+    if shed is not None:
+        return shed
+
+    limiter = _limiter(route)
+    if limiter is None:
+        return None
+    reason = limiter.acquire()
+    if reason is not None:
+        return _overloaded()
+    flask.g.admission_limiter = limiter
+    return None
+
+
+def release_request(response):
+    """ Runs after each request of the flask app, freeing its slot once the response is sent (streamed or not) """
+    import flask
+
+    limiter = flask.g.pop('admission_limiter', None)
+    if limiter is not None:
+        response.call_on_close(limiter.release)
+    return response
+
+
+def end_request(error=None):
+    """ Runs at the end of each request of the flask app, freeing the slot of a request that got no response """
+    import flask
+
+    limiter = flask.g.pop('admission_limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+
+async def admit_async_request():
+    """ Runs before each request of the quart app, answering it with 429 or 503 when it is not admitted """
+    import quart
+
+    route = _limited_route(quart.request)
+    if route is None:
+        return None
+
+    shed = _take_token(quart.request)
+    if shed is not None:
+        return shed
+
+    limiter = _limiter(route)
+    if limiter is None:
+        return None
+    reason = await limiter.acquire()
+    if reason is not None:
+        return _overloaded()
+    quart.g.admission_limiter = limiter
+    return None
+
+
+async def end_async_request(error=None):
+    """
+    Runs at the end of each request of the quart app, freeing its slot. Unlike on the flask app, the slot is freed
+    before streamed bodies are sent, as quart does not tell when they end if the client disconnects first
+    """
+    import quart
+
+    limiter = quart.g.pop('admission_limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+
+def _limited_route(req):
+    """ Returns the route (view name) of a request that may be limited, or None """
+    if req.blueprint != blueprint or (limiters is None and rate_limiter is None):
+        return None
+    route = req.endpoint.rsplit('.', 1)[-1]
+    return route if route not in exempt_routes else None
+
+
+def _limiter(route):
+    """ Returns the limiter of a route, creating it on first use, or None if admission control is disabled """
+    current = limiters
+    if current is None:
+        return None
+    limiter = current.get(route)
+    if limiter is None:
+        with _limiters_lock:
+            limit = max(1, limits.get(route, default_limit) // workers)
+            limiter = current.setdefault(route, _limiter_class(route, limit, queue_size, queue_timeout))
+    return limiter
+
+
+def _take_token(req):
+    """ Returns the 429 response of a client over its rate, or None """
+    if rate_limiter is None:
+        return None
+
+    client = req.headers.get(client_header) if client_header is not None else None
+    wait = rate_limiter.take(client or req.remote_addr)
+    if wait == 0:
+        return None
+
+    instrumentation.record_rejection((('route', req.endpoint.rsplit('.', 1)[-1]),), 'rate_limited')
+    return {'Message': task_messages.rate_limited}, 429, {'Retry-After': str(math.ceil(wait))}
+
+
+def _overloaded():
+    """ Returns the 503 response of a request that was shed """
+    return {'Message': task_messages.overloaded}, 503, {'Retry-After': str(retry_after)}
+
@@ -0,0 +1,31 @@
+from quart import Blueprint
+from quart import request
+
+from todo_list.monitoring import metrics
+from todo_list.monitoring import profiling
+from todo_list.routes import urls
+from todo_list.routes.monitoring_routes import metrics_content_type
+
+"""
+This module maintains the quart's routes that monitor the application (the async stack)
+"""
+
+monitoring = Blueprint('monitoring', __name__)
+
+
+@monitoring.route(urls.metrics)
+async def get_metrics():
+    """ Method for the route that returns the metrics in the Prometheus text format """
+    return metrics.render(), 200, {'Content-Type': metrics_content_type}
+
+
+@monitoring.route(urls.profiles)
+async def get_profiles():
+    """ Method for the route that returns the profiles of the last profiled requests """
+    return profiling.profiles_response(request.headers)
+
+
+@monitoring.route(urls.profiles + '/<string:profile_id>')
+async def get_profile(profile_id):
+    """ Method for the route that returns the profile of a request as a pstats file """
+    return profiling.profiles_response(request.headers, profile_id)
@@ -0,0 +1,31 @@
+from quart import Request
+
+"""
+This module bounds the size of the bodies of the requests of the quart app.
+
+Quart bounds every body by MAX_CONTENT_LENGTH (16 MB by default) when it creates the request, before it is routed.
+Imports read their body in chunks that are not kept, so they are bound by "max_import_content_length" instead, which
+is set by the app (see flask_app.create_async_app).
+"""
+
+# Paths of the routes whose body is bound by "max_import_content_length"
+import_paths = ()
+
+# Maximum size (in bytes) of the body of an import, None when it is not bound
+max_import_content_length = None
+
+
+def configure(new_import_paths, new_max_import_content_length=None):
+    """ Sets the paths of the import routes and the maximum size of their bodies """
+    global import_paths, max_import_content_length
+    import_paths = tuple(new_import_paths)
+    max_import_content_length = new_max_import_content_length
+
+
+class TaskRequest(Request):
+    """ A quart request whose body is bound by "max_import_content_length" when it is sent to an import route """
+
+    def __init__(self, method, scheme, path, *args, max_content_length=None, **kwargs):
+        if method == 'POST' and path in import_paths:
+            max_content_length = max_import_content_length
+        super().__init__(method, scheme, path, *args, max_content_length=max_content_length, **kwargs)
@@ -0,0 +1,95 @@
+from quart import request
+from quart import Blueprint
+
+from todo_list.services import async_task_service
+from todo_list.routes import urls
+
+"""
+This module maintains the quart's routes (the async stack). They are the same routes of task_routes
+"""
+
+task = Blueprint('task', __name__)
+
+
+@task.route(urls.add_task, methods=['POST'])
+async def add():
+    """ Method for the route that adds a new task """
+    return await async_task_service.add(request)
+
+
+@task.route(urls.add_tasks_in_bulk, methods=['POST'])
+async def add_bulk():
+    """ Method for the route that adds a list of new tasks """
+    return await async_task_service.add_bulk(request)
+
+
+@task.route(urls.get_task_by_name + '/<string:task_name>')
+async def get_by_name(task_name):
+    """ Method for the route that returns a task based on its name """
+    return await async_task_service.get_by_name(request, task_name)
+
+
+@task.route(urls.get_task_by_status + '/<string:status>')
+async def get_by_status(status):
+    """ Method for the route that returns tasks based on its status """
+    return await async_task_service.get_by_status(request, status)
+
+
+@task.route(urls.get_all_tasks)
+async def get_all():
+    """ Method for the route that returns all tasks """
+    return await async_task_service.get_all(request)
+
+
+@task.route(urls.search_tasks)
+async def search():
+    """ Method for the route that searches tasks by name prefix and/or text """
+    return await async_task_service.search(request)
+
+
+@task.route(urls.task_stats)
+async def stats():
+    """ Method for the route that returns how many tasks there are of each status """
+    return await async_task_service.stats(request)
+
+
+@task.route(urls.task_events)
+async def events():
+    """ Method for the route that streams the changes of tasks """
+    return await async_task_service.events(request)
+
+
+@task.route(urls.export_tasks)
+async def export():
+    """ Method for the route that streams all the tasks as NDJSON """
+    return await async_task_service.export(request)
+
+
+@task.route(urls.import_tasks, methods=['POST'])
+async def import_tasks():
+    """ Method for the route that imports tasks from a NDJSON body """
+    return await async_task_service.import_tasks(request)
+
+
+@task.route(urls.update_task + '/<string:task_name>', methods=['PUT'])
+async def update(task_name):
+    """ Method for the route that updates a task based on its name """
+    return await async_task_service.update(request, task_name)
+
+
+@task.route(urls.update_tasks_in_bulk, methods=['PUT'])
+async def update_bulk():
+    """ Method for the route that updates a list of tasks or all tasks with a status """
+    return await async_task_service.update_bulk(request)
+
+
+@task.route(urls.delete_task + '/<string:task_name>', methods=['DELETE'])
+async def delete(task_name):
+    """ Method for the route that deletes a task based on its name """
+    return await async_task_service.delete(request, task_name)
+
+
+@task.route(urls.delete_tasks_in_bulk, methods=['DELETE'])
+async def delete_bulk():
+    """ Method for the route that deletes a list of tasks or all tasks with a status """
+    return await async_task_service.delete_bulk(request)
@@ -0,0 +1,192 @@
+import hashlib
+import zlib
+
+from todo_list.repositories.task_cache import TaskCache
+
+"""
+This module compresses responses with the best encoding accepted by the client ("Accept-Encoding").
+
+gzip and deflate are always available; br and zstd are used when brotli and zstandard are installed. Streamed
+responses are compressed chunk by chunk. Other responses are cached compressed, by a hash of their body and encoding,
+so a list that did not change is not compressed again. Hashing the body costs much less than compressing it.
+"""
+
+# Mimetypes of the responses that are compressed
+compressible_mimetypes = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+# Level of gzip and deflate (from 1, faster, to 9, smaller)
+level = 6
+
+# Responses smaller than this (in bytes) are not compressed, as it would not pay off
+min_size = 1024
+
+# Cache of compressed responses, None when it is disabled
+cache = None
+
+
+def _zlib_compressor(wbits):
+    def create():
+        return _ZlibCompressor(zlib.compressobj(level, zlib.DEFLATED, wbits))
+    return create
+
+
+class _ZlibCompressor:
+    """ Compresses a body in chunks with zlib """
+
+    def __init__(self, compressobj):
+        self.compressobj = compressobj
+
+    def compress(self, data):
+        return self.compressobj.compress(data)
+
+    def flush(self):
+        return self.compressobj.flush()
+
+
+# Encoding -> function that creates a compressor, in order of preference
+compressors = {}
+
+try:
+    import zstandard
+
+    class _ZstdCompressor:
+        """ Compresses a body in chunks with zstandard """
+
+        def __init__(self):
+            self.compressobj = zstandard.ZstdCompressor(level=3).compressobj()
+
+        def compress(self, data):
+            return self.compressobj.compress(data)
+
+        def flush(self):
+            return self.compressobj.flush()
+
+    compressors['zstd'] = _ZstdCompressor
+except ImportError:
+    pass
+
+try:
+    import brotli
+
+    class _BrotliCompressor:
+        """ Compresses a body in chunks with brotli """
+
+        def __init__(self):
+            self.compressor = brotli.Compressor(quality=5)
+
+        def compress(self, data):
+            return self.compressor.process(data)
+
+        def flush(self):
+            return self.compressor.finish()
+
+    compressors['br'] = _BrotliCompressor
+except ImportError:
+    pass
+
+# "deflate" in HTTP is the zlib format, not raw deflate
+compressors['gzip'] = _zlib_compressor(16 + zlib.MAX_WBITS)
+compressors['deflate'] = _zlib_compressor(zlib.MAX_WBITS)
+
+# Encodings that may be chosen, in order of preference
+encodings = list(compressors)
+
+
+def configure(new_level=6, new_min_size=1024, cache_size=128, cache_ttl=60.0):
+    """ Sets the level, the minimum size of compressed responses and the cache of compressed responses """
+    global level, min_size, cache
+    level = new_level
+    min_size = new_min_size
+    cache = TaskCache(cache_size, cache_ttl, instrumented=False) if cache_size > 0 else None
+
+
+def compress_response(response):
+    """ Runs after each request of the flask app (see flask_app.create_app), compressing its response """
+    import flask
+
+    encoding = _choose_encoding(flask.request, response)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_chunks(encoding, response.response)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(_compress(encoding, data))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+async def compress_async_response(response):
+    """ Runs after each request of the quart app, compressing its response """
+    import quart
+    from quart.wrappers.response import IterableBody
+
+    encoding = _choose_encoding(quart.request, response)
+    if encoding is None:
+        return response
+
+    if isinstance(response.response, IterableBody):
+        response.response = IterableBody(_compress_async_chunks(encoding, response.response))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = await response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(_compress(encoding, data))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _choose_encoding(req, response):
+    """ Returns the encoding of the response or None if it must not be compressed """
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers \
+            or response.mimetype not in compressible_mimetypes:
+        return None
+
+    # The response depends on "Accept-Encoding" even when it is not compressed
+    response.vary.add('Accept-Encoding')
+    return req.accept_encodings.best_match(encodings)
+
+
+def _compress(encoding, data):
+    """ Returns the compressed data, from the cache if the same body was compressed with the same encoding """
+    if cache is None:
+        return _compress_data(encoding, data)
+
+    key = (hashlib.blake2b(data, digest_size=16).digest(), encoding)
+    compressed = cache.get(key)
+    if compressed is TaskCache.missing:
+        compressed = _compress_data(encoding, data)
+        cache.put(key, compressed)
+    return compressed
+
+
+def _compress_data(encoding, data):
+    compressor = compressors[encoding]()
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_chunks(encoding, chunks):
+    """ Yields the compressed chunks of a streamed body """
+    compressor = compressors[encoding]()
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _compress_async_chunks(encoding, chunks):
+    """ Yields the compressed chunks of a streamed body of the quart app """
+    compressor = compressors[encoding]()
+    async with chunks as body:
+        async for chunk in body:
+            compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
@@ -0,0 +1,35 @@
+from flask.json.provider import DefaultJSONProvider
+
+from todo_list.services import task_json
+
+"""
+This module maintains the JSON provider of the apps (flask and quart), behind jsonify() and request.get_json()
+"""
+
+
+class TaskJSONProvider(DefaultJSONProvider):
+    """
+    Encodes and decodes JSON with services.task_json, so orjson is used when it is installed.
+
+    Keys are not sorted, so tasks keep the order of their fields. Pretty printed responses (debug mode) are left to
+    the standard library.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return task_json.dumps(obj, self.default).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return task_json.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(task_json.dumps(obj, self.default) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,33 @@
+from flask import Blueprint
+from flask import request
+
+from todo_list.monitoring import metrics
+from todo_list.monitoring import profiling
+from todo_list.routes import urls
+
+"""
+This module maintains the flask's routes that monitor the application
+"""
+
+monitoring = Blueprint('monitoring', __name__)
+
+# Content type of the Prometheus text format
+metrics_content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@monitoring.route(urls.metrics)
+def get_metrics():
+    """ Method for the route that returns the metrics in the Prometheus text format """
+    return metrics.render(), 200, {'Content-Type': metrics_content_type}
+
+
+@monitoring.route(urls.profiles)
+def get_profiles():
+    """ Method for the route that returns the profiles of the last profiled requests """
+    return profiling.profiles_response(request.headers)
+
+
+@monitoring.route(urls.profiles + '/<string:profile_id>')
+def get_profile(profile_id):
+    """ Method for the route that returns the profile of a request as a pstats file """
+    return profiling.profiles_response(request.headers, profile_id)
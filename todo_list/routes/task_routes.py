@@ -17,6 +17,12 @@ def add():
     return task_service.add(request)
 
 
+@task.route(urls.add_tasks_in_bulk, methods=['POST'])
+def add_bulk():
+    """ Method for the route that adds a list of new tasks """
+    return task_service.add_bulk(request)
+
+
 @task.route(urls.get_task_by_name + '/<string:task_name>')
 def get_by_name(task_name):
     """ Method for the route that returns a task based on its name """
@@ -35,13 +41,55 @@ def get_all():
     return task_service.get_all(request)
 
 
+@task.route(urls.search_tasks)
+def search():
+    """ Method for the route that searches tasks by name prefix and/or text """
+    return task_service.search(request)
+
+
+@task.route(urls.task_stats)
+def stats():
+    """ Method for the route that returns how many tasks there are of each status """
+    return task_service.stats(request)
+
+
+@task.route(urls.task_events)
+def events():
+    """ Method for the route that streams the changes of tasks """
+    return task_service.events(request)
+
+
+@task.route(urls.export_tasks)
+def export():
+    """ Method for the route that streams all the tasks as NDJSON """
+    return task_service.export(request)
+
+
+@task.route(urls.import_tasks, methods=['POST'])
+def import_tasks():
+    """ Method for the route that imports tasks from a NDJSON body """
+    return task_service.import_tasks(request)
+
+
 @task.route(urls.update_task + '/<string:task_name>', methods=['PUT'])
 def update(task_name):
     """ Method for the route that updates a task based on its name """
     return task_service.update(request, task_name)
 
 
+@task.route(urls.update_tasks_in_bulk, methods=['PUT'])
+def update_bulk():
+    """ Method for the route that updates a list of tasks or all tasks with a status """
+    return task_service.update_bulk(request)
+
+
 @task.route(urls.delete_task + '/<string:task_name>', methods=['DELETE'])
 def delete(task_name):
     """ Method for the route that deletes a task based on its name """
     return task_service.delete(request, task_name)
+
+
+@task.route(urls.delete_tasks_in_bulk, methods=['DELETE'])
+def delete_bulk():
+    """ Method for the route that deletes a list of tasks or all tasks with a status """
+    return task_service.delete_bulk(request)
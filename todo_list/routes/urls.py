@@ -3,8 +3,18 @@ This module centralizes the URIs used from routes
 """
 
 add_task = '/add'
+add_tasks_in_bulk = '/add_bulk'
 get_task_by_name = '/get_by_name'
 get_task_by_status = '/get_by_status'
 get_all_tasks = '/get_all'
+search_tasks = '/search'
+task_stats = '/stats'
+task_events = '/events'
+export_tasks = '/export'
+import_tasks = '/import'
 update_task = '/update'
+update_tasks_in_bulk = '/update_bulk'
 delete_task = '/delete'
+delete_tasks_in_bulk = '/delete_bulk'
+metrics = '/metrics'
+profiles = '/profiles'
@@ -0,0 +1,497 @@
+import functools
+import logging
+import os
+from quart import Response
+from quart import jsonify
+from quart import make_response
+from quart import request
+
+from todo_list.repositories import async_task_repository
+from todo_list.repositories import idempotency_keys
+from todo_list.repositories.errors import DuplicatedTaskError
+from todo_list.repositories.errors import InvalidPageTokenError
+from todo_list.repositories.single_flight import SharedTasks
+from todo_list.services import conditional_requests
+from todo_list.services import idempotent_requests
+from todo_list.services import task_json
+from todo_list.services import task_messages
+from todo_list.services import task_payloads
+from todo_list.services import task_transfer
+
+"""
+This module contains the business rule for manipulating tasks on the async stack.
+
+Every function answers the same way as its task_service counterpart, but awaits the repository.
+"""
+
+logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
+
+
+def _idempotent(function):
+    """ Makes a write safe to retry with an "Idempotency-Key" header (see task_service._idempotent) """
+
+    @functools.wraps(function)
+    async def wrapper(req: request, *args):
+        key, message = idempotent_requests.read_key(req.headers)
+        if message is not None:
+            logger.info('Invalid idempotency key')
+            return jsonify({'Message': message}), 400
+
+        store = idempotency_keys.store
+        if key is None or store is None:
+            return await function(req, *args)
+
+        # Claims the key, unless a previous request did it
+        request_fingerprint = idempotent_requests.fingerprint(req.method, req.path, await req.get_data())
+        record = await store.claim(key, request_fingerprint)
+        if record is not None:
+            status_code, message, headers = idempotent_requests.replay(record, request_fingerprint)
+            logger.info('Answering a repeated idempotency key with %s', status_code)
+            if message is not None:
+                return jsonify({'Message': message}), status_code, headers
+            return Response(record['body'], status=status_code, mimetype='application/json', headers=headers)
+
+        # Saves the response to be replayed, or releases the key so the request can be retried (also when the client
+        # disconnected and the request was cancelled)
+        try:
+            response = await make_response(await function(req, *args))
+        except BaseException:
+            await store.release(key)
+            raise
+        if idempotent_requests.is_saved(response.status_code):
+            await store.save(key, response.status_code, await response.get_data())
+        else:
+            await store.release(key)
+        return response
+
+    return wrapper
+
+
+@_idempotent
+async def add(req: request):
+    """ Adds a new task (see task_service.add) """
+    logger.debug('HTTP Request to add a new task with data: %s', req)
+    request_payload = await req.get_json()
+    logger.debug('HTTP Request to add a new task with payload: %s', request_payload)
+
+    # Verifies if payload is a valid task
+    new_task, message, errors = task_payloads.read_task(request_payload)
+    if message is not None:
+        logger.info(message)
+        return jsonify(task_payloads.error_payload(message, errors)), 400
+
+    # Creates the task! The unique index on "name" rejects duplicated names
+    try:
+        await async_task_repository.insert(new_task)
+    except DuplicatedTaskError:
+        logger.info('Duplicated task name')
+        return jsonify({'Message': task_messages.duplicated}), 400
+    logger.info('Task created')
+    return jsonify({'Message': task_messages.created}), 201
+
+
+async def add_bulk(req: request):
+    """ Adds a list of new tasks (see task_service.add_bulk) """
+    logger.debug('HTTP Request to add a list of tasks with data: %s', req)
+
+    request_payload = await _get_bulk_payload(req)
+
+    # Verifies if payload is a list
+    if request_payload is None:
+        logger.info('Incorrect parameters')
+        return jsonify({'Message': task_messages.incorrect_parameters}), 400
+
+    results, new_tasks, positions = task_payloads.read_new_tasks(request_payload)
+
+    # Creates the tasks! The unique index on "name" rejects the ones already registered
+    duplicated = await async_task_repository.insert_many(new_tasks)
+
+    logger.info('%s of %s tasks created', len(new_tasks) - len(duplicated), len(results))
+    return jsonify(task_payloads.add_bulk_results(results, positions, duplicated)), 200
+
+
+async def get_by_name(req: request, task_name: str):
+    """ Returns a task based on its name (see task_service.get_by_name) """
+    logger.debug('HTTP Request to get a task by name with data: %s', req)
+    logger.info('Looking for a task with name "%s"', task_name)
+
+    # Answers clients that already have the current tasks, without reading them
+    version = await async_task_repository.version()
+    if conditional_requests.is_not_modified(req, version):
+        logger.info('Task not modified')
+        return '', 304, conditional_requests.validators(version)
+
+    # Gets a task by its name
+    task_found = await async_task_repository.get_by_name(task_name, version)
+
+    # Verifies if task exists
+    if task_found is None:
+        logger.info('Task not found')
+        return jsonify({'Message': task_messages.not_found}), 404
+
+    # Returns the task!
+    logger.info('Returning task')
+    return jsonify({'name': task_found['name'], 'description': task_found['description'],
+                    'status': task_found['status']}), 200, conditional_requests.validators(version)
+
+
+async def get_by_status(req: request, status: str):
+    """ Returns a list of tasks based on its status (see task_service.get_by_status) """
+    logger.debug('HTTP Request to get tasks by status with data: %s', req)
+    logger.info('Looking for tasks with status equal to "%s"', status)
+
+    status = status.lower()
+
+    # Verifies if status is valid
+    if not task_payloads.is_status_valid(status):
+        logger.info('Invalid status')
+        return jsonify({'Message': task_messages.invalid_status}), 400
+
+    # Gets tasks by status
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
+
+        # Answers clients that already have the current tasks, without reading them
+        version = await async_task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = await async_task_repository.get_by_status(status, limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
+
+    # Returns tasks!
+    logger.info('Returning tasks')
+    return await _tasks_response(tasks_found, limit, stream, version)
+
+
+async def get_all(req: request):
+    """ Returns a list with all the tasks (see task_service.get_all) """
+    logger.debug('HTTP Request to get all tasks with data: %s', req)
+    logger.info('Returning all tasks')
+
+    # Gets all tasks
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
+
+        # Answers clients that already have the current tasks, without reading them
+        version = await async_task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = await async_task_repository.get_all(limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
+
+    # Returns all tasks!
+    return await _tasks_response(tasks_found, limit, stream, version)
+
+
+async def search(req: request):
+    """ Returns the tasks found by name prefix and/or by the words of "q" (see task_service.search) """
+    logger.debug('HTTP Request to search tasks with data: %s', req)
+
+    prefix, text, message = task_payloads.read_search_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid search parameters')
+        return jsonify({'Message': message}), 400
+    logger.info('Searching tasks with prefix "%s" and text "%s"', prefix, text)
+
+    # Searches tasks
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
+
+        # Answers clients that already have the current tasks, without reading them
+        version = await async_task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = await async_task_repository.search(prefix, text, limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
+
+    # Returns the tasks found!
+    return await _tasks_response(tasks_found, limit, stream, version,
+                                 lambda return_list: async_task_repository.next_search_token(text, after, return_list))
+
+
+async def export(req: request):
+    """ Streams all the tasks as NDJSON, gzip-compressed if "compress" is "gzip" (see task_service.export) """
+    logger.debug('HTTP Request to export the tasks with data: %s', req)
+
+    compressed, message = task_transfer.read_export_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid export parameters')
+        return jsonify({'Message': message}), 400
+
+    estimated_count = sum((await async_task_repository.count_by_status()).values())
+    chunks = _stream_export(await async_task_repository.export())
+    if compressed:
+        chunks = task_transfer.gzip_async_chunks(chunks)
+
+    logger.info('Exporting about %s tasks', estimated_count)
+    response = Response(chunks, mimetype=task_transfer.gzip_mimetype if compressed else task_payloads.ndjson_mimetype)
+
+    # The export lasts as long as the tasks take to be read, instead of Quart's response timeout
+    response.timeout = None
+    return response, 200, task_transfer.export_headers(compressed, estimated_count)
+
+
+async def import_tasks(req: request):
+    """ Imports tasks from a NDJSON body, in chunks of lines (see task_service.import_tasks) """
+    logger.debug('HTTP Request to import tasks with data: %s', req)
+
+    upsert, message = task_transfer.read_import_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid import parameters')
+        return jsonify({'Message': message}), 400
+
+    reader = task_transfer.NdjsonReader(task_transfer.is_compressed(req.mimetype, req.headers))
+    progress = task_transfer.ImportProgress()
+    items = []
+    try:
+        async for data in req.body:
+            for item in reader.feed(data):
+                items.append(item)
+                if len(items) == task_transfer.chunk_size:
+                    await _import_chunk(items, upsert, progress)
+                    items = []
+        items.extend(reader.close())
+        message, status_code = task_messages.imported, 200
+    except ValueError:
+        logger.info('Invalid gzip body')
+        message, status_code = task_messages.invalid_import_body, 400
+
+    # Writes the last chunk, also when the body was cut short
+    await _import_chunk(items, upsert, progress)
+
+    logger.info('Import finished with %s lines read', progress.read)
+    return jsonify(progress.payload(message)), status_code
+
+
+async def stats(req: request):
+    """ Returns how many tasks there are of each status and their total (see task_service.stats) """
+    logger.debug('HTTP Request to get the stats of tasks with data: %s', req)
+
+    counts = await async_task_repository.count_by_status()
+
+    logger.info('Returning stats')
+    return jsonify(task_payloads.status_counts(counts)), 200
+
+
+async def events(req: request):
+    """ Streams the changes of tasks as Server-Sent Events (see task_service.events) """
+    logger.debug('HTTP Request to watch the changes of tasks with data: %s', req)
+
+    status, after, message = task_payloads.read_events_parameters(req.args, req.headers)
+    if message is not None:
+        logger.info('Invalid status')
+        return jsonify({'Message': message}), 400
+
+    changes = await async_task_repository.watch(status, after)
+
+    logger.info('Streaming changes of tasks')
+    response = Response(_stream_events(changes), mimetype=task_payloads.event_stream_mimetype)
+
+    # The stream lasts until the client disconnects, instead of Quart's response timeout
+    response.timeout = None
+    return response, 200, task_payloads.event_stream_headers
+
+
+@_idempotent
+async def update(req: request, task_name: str):
+    """ Updates an existing task (see task_service.update) """
+    logger.debug('HTTP Request to update a task with data: %s', req)
+    request_payload = await req.get_json()
+    logger.debug('HTTP Request to update task with name %s with payload: %s', task_name, request_payload)
+
+    # Verifies if payload is a valid task
+    task_with_new_values, message, errors = task_payloads.read_task(request_payload)
+    if message is not None:
+        logger.info(message)
+        return jsonify(task_payloads.error_payload(message, errors)), 400
+
+    # Updates the task! The unique index on "name" rejects renaming to a registered name
+    try:
+        task_found = await async_task_repository.update(task_name, task_with_new_values)
+    except DuplicatedTaskError:
+        logger.info('Duplicated task name')
+        return jsonify({'Message': task_messages.duplicated}), 400
+
+    # Verifies if task exists
+    if not task_found:
+        logger.info('Task not found')
+        return jsonify({'Message': task_messages.not_found}), 404
+
+    logger.info('Task updated')
+    return jsonify({'Message': task_messages.updated}), 200
+
+
+async def update_bulk(req: request):
+    """ Updates a list of tasks or all tasks with a status (see task_service.update_bulk) """
+    logger.debug('HTTP Request to update a list of tasks with data: %s', req)
+
+    request_payload = await req.get_json(silent=True) if req.mimetype != task_payloads.ndjson_mimetype else None
+
+    # Updates all tasks with a status
+    if isinstance(request_payload, dict):
+        status, values, message = task_payloads.read_status_update(request_payload)
+        if message is not None:
+            logger.info(message)
+            return jsonify({'Message': message}), 400
+
+        matched, modified = await async_task_repository.update_by_status(status, values)
+
+        logger.info('%s tasks matched and %s tasks updated', matched, modified)
+        return jsonify({'Message': task_messages.updated, 'Matched': matched, 'Modified': modified,
+                        'Results': []}), 200
+
+    request_payload = await _get_bulk_payload(req)
+
+    # Verifies if payload is a list
+    if request_payload is None:
+        logger.info('Incorrect parameters')
+        return jsonify({'Message': task_messages.incorrect_parameters}), 400
+
+    results, updates, positions = task_payloads.read_updates(request_payload)
+
+    # Updates the tasks! The unique index on "name" rejects renaming to a registered name
+    matched, modified, duplicated = await async_task_repository.update_many(updates)
+
+    logger.info('%s tasks matched and %s tasks updated', matched, modified)
+    return jsonify({'Message': task_messages.updated, 'Matched': matched, 'Modified': modified,
+                    'Results': task_payloads.update_bulk_results(results, positions, duplicated)}), 200
+
+
+async def delete(req: request, task_name: str):
+    """ Deletes a task (see task_service.delete) """
+    logger.debug('HTTP Request to delete a task with data: %s', req)
+    logger.info('HTTP Request to delete task with name %s', task_name)
+
+    # Deletes the task! Nothing is deleted if there is no task with the informed name
+    if not await async_task_repository.delete(task_name):
+        logger.info('Task not found')
+        return jsonify({'Message': task_messages.not_found}), 404
+
+    logger.info('Task deleted')
+    return jsonify({'Message': task_messages.deleted}), 200
+
+
+async def delete_bulk(req: request):
+    """ Deletes a list of tasks or all tasks with a status (see task_service.delete_bulk) """
+    logger.debug('HTTP Request to delete a list of tasks with data: %s', req)
+
+    status, task_names, message = task_payloads.read_bulk_delete(await req.get_json(silent=True))
+    if message is not None:
+        logger.info(message)
+        return jsonify({'Message': message}), 400
+
+    if status is not None:
+        deleted = await async_task_repository.delete_by_status(status)
+    else:
+        deleted = await async_task_repository.delete_many(task_names)
+
+    logger.info('%s tasks deleted', deleted)
+    return jsonify({'Message': task_messages.deleted, 'Deleted': deleted}), 200
+
+
+async def _get_bulk_payload(req: request):
+    """ Returns the list of items sent to a bulk route (as a JSON array or NDJSON) or None if it is not a list """
+
+    if req.mimetype == task_payloads.ndjson_mimetype:
+        return task_payloads.read_ndjson(await req.get_data(as_text=True))
+
+    request_payload = await req.get_json(silent=True)
+    return request_payload if isinstance(request_payload, list) else None
+
+
+async def _tasks_response(tasks_found, limit: int, stream: str, version, next_token=None):
+    """ Creates the response for a list of tasks (see task_service._tasks_response) """
+
+    if stream is not None:
+        return Response(stream_formats[stream](tasks_found), mimetype=task_payloads.stream_mimetypes[stream]), 200, \
+            conditional_requests.validators(version)
+
+    # Tasks come from the repository with only the returned fields. Tasks shared by coalesced reads are encoded once
+    if isinstance(tasks_found, SharedTasks):
+        return_list, encoded = tasks_found, tasks_found.encoded(task_json.encode_tasks)
+    else:
+        return_list = [t async for t in tasks_found]
+        encoded = task_json.encode_tasks(return_list)
+
+    # Tasks are encoded as they were read, keeping the order of their fields
+    response = Response(encoded + b'\n', mimetype='application/json')
+    if limit is not None and len(return_list) == limit:
+        response.headers['X-Next-Cursor'] = async_task_repository.next_page_token(return_list[-1]) \
+            if next_token is None else next_token(return_list)
+    return response, 200, conditional_requests.validators(version)
+
+
+async def _stream_json_array(tasks_found):
+    """ Yields the tasks as chunks of a JSON array """
+
+    separator = b'['
+    async for t in tasks_found:
+        yield separator + task_json.fragment(t)
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+
+async def _stream_ndjson(tasks_found):
+    """ Yields the tasks as lines of a NDJSON document """
+
+    async for t in tasks_found:
+        yield task_json.fragment(t) + b'\n'
+
+
+async def _stream_export(tasks_found):
+    """ Yields the tasks as lines of a NDJSON document, in chunks of task_transfer.chunk_size tasks """
+
+    # The JSON of the tasks is not cached, so exports do not evict the tasks that are read often
+    lines = []
+    exported = 0
+    async for t in tasks_found:
+        lines.append(task_json.dumps(t) + b'\n')
+        if len(lines) == task_transfer.chunk_size:
+            yield b''.join(lines)
+            exported += len(lines)
+            if exported // task_transfer.progress_interval > (exported - len(lines)) // task_transfer.progress_interval:
+                logger.info('%s tasks exported', exported)
+            lines = []
+    yield b''.join(lines)
+    logger.info('Export finished with %s tasks', exported + len(lines))
+
+
+async def _import_chunk(items, upsert, progress):
+    """ Writes the tasks of a chunk of (line number, value) items of an import with a single write """
+
+    new_tasks, skipped, errors = task_transfer.read_chunk(items, upsert)
+
+    # Tasks rejected for having registered names are skipped
+    created, updated, rejected = 0, 0, 0
+    if new_tasks and upsert:
+        created_positions, updated, duplicated = await async_task_repository.upsert_many(new_tasks)
+        created, rejected = len(created_positions), len(duplicated)
+    elif new_tasks:
+        rejected = len(await async_task_repository.insert_many(new_tasks))
+        created = len(new_tasks) - rejected
+
+    if progress.add(len(items), created, updated, skipped + rejected, errors):
+        logger.info('%s lines imported', progress.read)
+
+
+async def _stream_events(changes):
+    """ Yields the changes of tasks as Server-Sent Events, starting with a keep-alive so the client gets the headers """
+
+    yield task_payloads.keep_alive_event
+    async for event in changes:
+        yield task_payloads.server_sent_event(event)
+
+
+stream_formats = {'json': _stream_json_array, 'ndjson': _stream_ndjson}
@@ -0,0 +1,53 @@
+from werkzeug.http import http_date
+from werkzeug.http import quote_etag
+
+"""
+This module answers conditional requests ("If-None-Match" and "If-Modified-Since") with the version of the tasks.
+When the version is not kept (it is None, see task_repository.version), responses have no validators and requests are
+never answered with 304.
+
+It does not depend on the web framework, as flask and quart requests parse those headers the same way.
+"""
+
+
+def validators(version):
+    """ Returns the "ETag" and "Last-Modified" headers of a response built with the informed version of the tasks """
+
+    if version is None:
+        return {}
+    headers = {'ETag': etag(version)}
+    _, modified = version
+    if modified is not None:
+        headers['Last-Modified'] = http_date(modified)
+    return headers
+
+
+def etag(version):
+    """
+    Returns the (weak) entity tag of a version of the tasks.
+
+    It has when the version changed, so versions with the same number (e.g. after the tasks were dropped) differ.
+    """
+
+    return quote_etag(_tag(version), weak=True)
+
+
+def is_not_modified(req, version):
+    """
+    Verifies if the client already has the response for the informed version of the tasks, so 304 can be returned
+    without reading any task. "If-None-Match" takes precedence over "If-Modified-Since".
+    """
+
+    if version is None:
+        return False
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(_tag(version))
+
+    _, modified = version
+    return req.if_modified_since is not None and modified is not None and \
+        modified.replace(microsecond=0) <= req.if_modified_since
+
+
+def _tag(version):
+    number, modified = version
+    return f'{number}-{modified.timestamp() if modified is not None else 0}'
@@ -0,0 +1,63 @@
+import hashlib
+
+from todo_list.services import task_messages
+
+"""
+This module answers requests that repeat an "Idempotency-Key", so clients can retry writes (e.g. after a timeout)
+without applying them twice.
+
+It does not depend on the web framework nor on the database: the responses are kept by repositories.idempotency_keys.
+"""
+
+# Header with the key of a request, chosen by the client (e.g. a UUID) and sent again on its retries
+key_header = 'Idempotency-Key'
+
+# Header sent on the responses replayed from a previous request
+replayed_header = 'Idempotent-Replayed'
+
+# Maximum length of a key
+max_key_length = 255
+
+# Seconds a client should wait before retrying a request whose key is still in progress
+retry_after = 1
+
+
+def read_key(headers):
+    """
+    Reads the key of a request. It returns the key (None if it was not sent) and None if it is valid. Otherwise, it
+    returns None and the message explaining why it is not.
+    """
+
+    key = headers.get(key_header)
+    if key is not None and not 0 < len(key) <= max_key_length:
+        return None, task_messages.invalid_idempotency_key
+    return key, None
+
+
+def fingerprint(method: str, path: str, body: bytes):
+    """ Returns what identifies a request, so a key sent again with another request is rejected """
+
+    digest = hashlib.sha256(body)
+    return f'{method} {path} {digest.hexdigest()}'
+
+
+def replay(record: dict, request_fingerprint: str):
+    """
+    Returns how to answer a request whose key was claimed by a previous request ("record"): the status code, the
+    message of the error (None if the saved response of the previous request is replayed) and the headers.
+
+    The previous response is replayed if it was saved, otherwise the request is rejected with 409 (the previous
+    one is still in progress) or 422 (the key was sent with another request).
+    """
+
+    if record['fingerprint'] != request_fingerprint:
+        return 422, task_messages.idempotency_key_reused, {}
+    if record['status'] is None:
+        return 409, task_messages.idempotency_key_in_progress, {'Retry-After': str(retry_after)}
+    return record['status'], None, {replayed_header: 'true'}
+
+
+def is_saved(status_code: int):
+    """ Verifies if a response is saved to be replayed. Server errors are not, so the request can be retried """
+
+    return status_code < 500
@@ -0,0 +1,57 @@
+import json
+
+from todo_list.repositories import task_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+This module encodes tasks as JSON, with orjson when it is installed and with the standard library otherwise.
+
+Keys are never sorted, so tasks keep the order of their fields (name, description and status). When enabled (see
+task_cache.configure_fragments()), the JSON of each task is kept by name, so lists are assembled by joining the
+JSON of their tasks instead of encoding every task again.
+"""
+
+
+def dumps(obj, default=None):
+    """ Returns the compact JSON (as bytes) of "obj". "default" encodes the objects that are not JSON types """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default)
+    return json.dumps(obj, default=default, separators=(',', ':')).encode()
+
+
+def loads(data):
+    """ Returns the value of a JSON document (str or bytes). It raises ValueError if it is not valid JSON """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_tasks(tasks: list):
+    """ Returns the JSON array (as bytes) of a list of tasks """
+    if task_cache.fragments is None:
+        return dumps(tasks)
+    return b'[' + b','.join([fragment(task) for task in tasks]) + b']'
+
+
+def fragment(task: dict):
+    """
+    Returns the JSON (as bytes) of a task, from the cache of fragments when it is enabled.
+
+    A cached fragment is only used if it was encoded from the same fields, as other processes may have changed
+    the task without invalidating the cache of this one.
+    """
+    fragments = task_cache.fragments
+    if fragments is None:
+        return dumps(task)
+
+    cached = fragments.get(task['name'])
+    if cached is not None and (cached[0] is task or cached[0] == task):
+        return cached[1]
+
+    encoded = dumps(task)
+    fragments.put(task['name'], (task, encoded))
+    return encoded
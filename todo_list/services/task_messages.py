@@ -3,9 +3,32 @@ This module centralizes the return messages for tasks
 """
 
 incorrect_parameters = "Incorrect parameters"
+invalid_page = "Invalid pagination parameters"
+invalid_search = "Please inform a name prefix ('prefix') and/or a text to search ('q')"
 invalid_status = "Invalid status. Please use 'to_do', 'doing' or 'done'"
 duplicated = "Duplicated task name"
 not_found = "Task not found"
 created = "Task created"
 updated = "Task updated"
 deleted = "Task deleted"
+overloaded = "The service is overloaded, please retry later"
+rate_limited = "Too many requests, please retry later"
+imported = "Tasks imported"
+invalid_export = "Invalid export parameters. Please use 'compress=gzip' or no parameters"
+invalid_import = "Invalid import mode. Please use 'skip' or 'upsert'"
+invalid_import_body = "Invalid gzip body. Only the lines read before the error were imported"
+
+# Errors of the fields of an invalid task, sent by name on "Errors"
+required_field = "Required"
+not_a_string = "Must be a non empty string"
+not_a_status = "Must be 'to_do', 'doing' or 'done'"
+
+# Errors of the route of the profiles of requests
+profiling_disabled = "Profiling is disabled"
+profiling_forbidden = "Please inform the profiling token on X-Profile"
+profile_not_found = "Profile not found"
+
+# Errors of requests with an "Idempotency-Key" header
+invalid_idempotency_key = "Idempotency-Key must have from 1 to 255 characters"
+idempotency_key_reused = "Idempotency-Key was already sent with another request"
+idempotency_key_in_progress = "A request with this Idempotency-Key is still in progress"
@@ -0,0 +1,363 @@
+from todo_list.models.task import Task
+from todo_list.services import task_json
+from todo_list.services import task_messages
+
+"""
+This module validates and reads the payloads sent to task routes.
+
+It does not depend on the web framework nor on the database, so the same rules are used by the sync
+(task_service) and the async (async_task_service) stacks.
+"""
+
+# Mimetype of bodies and responses with one JSON value per line
+ndjson_mimetype = 'application/x-ndjson'
+
+# Formats in which a list of tasks can be streamed and their mimetypes
+stream_mimetypes = {'json': 'application/json', 'ndjson': ndjson_mimetype}
+
+# Mimetype of the Server-Sent Events of the changes of tasks
+event_stream_mimetype = 'text/event-stream'
+
+# Headers of the Server-Sent Events, so neither caches nor proxies hold the events back
+event_stream_headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Comment sent when there are no changes, so idle connections are kept and closed ones are noticed
+keep_alive_event = b': keep-alive\n\n'
+
+# Fields that can be set on all tasks with a status
+bulk_update_fields = ('description', 'status')
+
+
+def compile_task_validator(valid_status: frozenset):
+    """
+    Returns the validator of the task payloads (dicts), which checks all their fields in a single pass.
+
+    The validator returns the task (with lower case status) and None if the payload is valid. Otherwise, it returns
+    None and the errors of the invalid fields by name. Errors are only allocated for invalid payloads.
+    """
+
+    required_field = task_messages.required_field
+    not_a_string = task_messages.not_a_string
+    not_a_status = task_messages.not_a_status
+
+    # Builds the tuple of the task directly, as its fields are already checked
+    new_tuple = tuple.__new__
+
+    def validate(obj: dict):
+        name = obj.get('name')
+        description = obj.get('description')
+        status = obj.get('status')
+        errors = None
+
+        if type(name) is not str or name == '':
+            errors = {'name': required_field if name is None else not_a_string}
+        if type(description) is not str or description == '':
+            errors = errors or {}
+            errors['description'] = required_field if description is None else not_a_string
+        if type(status) is not str or status == '':
+            errors = errors or {}
+            errors['status'] = required_field if status is None else not_a_string
+        elif status not in valid_status:
+            status = status.lower()
+            if status not in valid_status:
+                errors = errors or {}
+                errors['status'] = not_a_status
+
+        if errors is not None:
+            return None, errors
+        return new_tuple(Task, (name, description, status)), None
+
+    return validate
+
+
+# Validates the payloads of tasks (see compile_task_validator)
+validate_task = compile_task_validator(Task.valid_status)
+
+
+def read_task(obj):
+    """
+    Reads a task from a payload.
+
+    It returns the task (with lower case status), None and None if the payload is valid. Otherwise, it returns None,
+    the message explaining why it is not and the errors of its fields (None if the payload is not an object).
+    """
+
+    # Verifies if payload is an object
+    if type(obj) is not dict:
+        return None, task_messages.incorrect_parameters, None
+
+    task, errors = validate_task(obj)
+    if errors is None:
+        return task, None, None
+
+    # Only a valid payload with an unknown status is reported as an invalid status
+    if len(errors) == 1 and errors.get('status') is task_messages.not_a_status:
+        return None, task_messages.invalid_status, errors
+    return None, task_messages.incorrect_parameters, errors
+
+
+def read_new_tasks(items: list):
+    """
+    Reads the tasks sent to a bulk add.
+
+    It returns the result of each item (None for the ones to be created), the tasks to be created and their
+    positions in "items". Items with the same name of a previous item are rejected as duplicated.
+    """
+
+    results = [None] * len(items)
+    new_tasks = []
+    positions = []
+    names = set()
+    for position, item in enumerate(items):
+        new_task, message, errors = read_task(item)
+
+        # Verifies if there is another item with same name
+        if message is None and new_task.name in names:
+            message = task_messages.duplicated
+
+        if message is not None:
+            results[position] = bulk_result(400, message, errors=errors)
+            continue
+
+        new_tasks.append(new_task)
+        positions.append(position)
+        names.add(new_task.name)
+
+    return results, new_tasks, positions
+
+
+def add_bulk_results(results: list, positions: list, duplicated: list):
+    """ Fills the results of a bulk add with the tasks created and the ones rejected by the repository """
+
+    duplicated = set(duplicated)
+    for index, position in enumerate(positions):
+        if index in duplicated:
+            results[position] = bulk_result(400, task_messages.duplicated)
+        else:
+            results[position] = bulk_result(201, task_messages.created)
+    return results
+
+
+def read_updates(items: list):
+    """
+    Reads the {"task_name": ..., "task": {...}} items sent to a bulk update.
+
+    It returns the results of the rejected items, the (task_name, task) pairs to be updated and their positions in
+    "items". Items that rename a task to the same name of a previous item are rejected as duplicated.
+    """
+
+    results = []
+    updates = []
+    positions = []
+    new_names = set()
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not is_task_name(item.get('task_name')):
+            task_with_new_values, message, errors = None, task_messages.incorrect_parameters, None
+        else:
+            task_with_new_values, message, errors = read_task(item.get('task'))
+
+        # Verifies if another item renames a task to the same name
+        if message is None and task_with_new_values.name in new_names:
+            message = task_messages.duplicated
+
+        if message is not None:
+            results.append(bulk_result(400, message, position, errors))
+            continue
+
+        updates.append((item['task_name'], task_with_new_values))
+        positions.append(position)
+        new_names.add(task_with_new_values.name)
+
+    return results, updates, positions
+
+
+def update_bulk_results(results: list, positions: list, duplicated: list):
+    """ Adds to the results of a bulk update the updates rejected by the repository, sorted by position """
+
+    for index in duplicated:
+        results.append(bulk_result(400, task_messages.duplicated, positions[index]))
+    results.sort(key=lambda result: result['Position'])
+    return results
+
+
+def read_status_update(obj: dict):
+    """
+    Reads a {"status": ..., "set": {...}} payload, which sets "description" and/or "status" on all tasks with a
+    status. Names are not set, as the tasks would end up with the same name.
+
+    It returns the (lower case) status, the values to set and None if the payload is valid. Otherwise, it returns
+    None, None and the message explaining why it is not.
+    """
+
+    values = obj.get('set')
+
+    # Verifies if payload is valid
+    if not isinstance(obj.get('status'), str) or not isinstance(values, dict) or not values or \
+            any(field not in bulk_update_fields or not isinstance(value, str) or value == ''
+                for field, value in values.items()):
+        return None, None, task_messages.incorrect_parameters
+
+    status = obj['status'].lower()
+    if 'status' in values:
+        values = dict(values, status=values['status'].lower())
+
+    # Verifies if both status are valid
+    if not is_status_valid(status) or not is_status_valid(values.get('status', status)):
+        return None, None, task_messages.invalid_status
+
+    return status, values, None
+
+
+def read_bulk_delete(obj):
+    """
+    Reads the payload of a bulk delete, a list of task names or a {"status": ...} object.
+
+    It returns the (lower case) status or the names, the other one being None, and None if the payload is valid.
+    Otherwise, it returns None, None and the message explaining why it is not.
+    """
+
+    if isinstance(obj, dict) and isinstance(obj.get('status'), str):
+        status = obj['status'].lower()
+
+        # Verifies if status is valid
+        if not is_status_valid(status):
+            return None, None, task_messages.invalid_status
+        return status, None, None
+
+    if isinstance(obj, list) and all(is_task_name(name) for name in obj):
+        return None, obj, None
+
+    return None, None, task_messages.incorrect_parameters
+
+
+def read_ndjson(text: str):
+    """
+    Reads the values of a NDJSON body, ignoring blank lines.
+
+    Lines that are not valid JSON are returned as None, so they are reported as incorrect items.
+    """
+
+    return [_loads_or_none(line) for line in text.splitlines() if line.strip()]
+
+
+def read_page_parameters(args):
+    """
+    Reads the pagination and streaming parameters from the query string.
+
+    "limit" is the maximum number of tasks to return, "after" is the opaque cursor returned on "X-Next-Cursor"
+    and "stream" is either "json" (a chunked JSON array) or "ndjson" (one task per line).
+
+    It raises ValueError if any of them is invalid.
+    """
+
+    limit = args.get('limit', type=int)
+    if 'limit' in args and (limit is None or limit <= 0):
+        raise ValueError('limit must be a positive integer')
+
+    stream = args.get('stream')
+    if stream is not None and stream not in stream_mimetypes:
+        raise ValueError('stream must be one of ' + ', '.join(stream_mimetypes))
+
+    return limit, args.get('after'), stream
+
+
+def read_search_parameters(args):
+    """
+    Reads the parameters of a search: "prefix" is the start of the names and "q" the text whose words are searched
+    in names and descriptions.
+
+    It returns the prefix, the text (None if they are not informed) and None if at least one of them is informed.
+    Otherwise, it returns None, None and the message explaining what is missing.
+    """
+
+    prefix = args.get('prefix') or None
+    text = args.get('q') or None
+    if prefix is None and text is None:
+        return None, None, task_messages.invalid_search
+    return prefix, text, None
+
+
+def read_events_parameters(args, headers):
+    """
+    Reads the parameters of the changes of tasks: "status" filters the changes and "after" (or the "Last-Event-ID"
+    header sent by reconnecting clients) is the id of the last event received.
+
+    It returns the (lower case) status, the token to resume after and None if they are valid. Otherwise, it returns
+    None, None and the message explaining why they are not.
+    """
+
+    status = args.get('status')
+    if status is not None:
+        status = status.lower()
+
+        # Verifies if status is valid
+        if not is_status_valid(status):
+            return None, None, task_messages.invalid_status
+
+    return status, headers.get('Last-Event-ID') or args.get('after'), None
+
+
+def server_sent_event(event):
+    """ Returns a change of tasks (see repositories.task_events) as a Server-Sent Event, a keep-alive if it is None """
+
+    if event is None:
+        return keep_alive_event
+
+    event_id = b'id: ' + event['id'].encode() + b'\n' if event['id'] is not None else b''
+    return event_id + b'event: ' + event['type'].encode() + b'\ndata: ' + task_json.dumps(event['data']) + b'\n\n'
+
+
+def status_counts(counts: dict):
+    """ Returns the number of tasks of each expected status (including the ones without tasks) and their total """
+
+    result = {status: counts.get(status, 0) for status in Task.expected_status}
+    result['Total'] = sum(result.values())
+    return result
+
+
+def bulk_result(status_code: int, message: str, position: int = None, errors: dict = None):
+    """
+    Returns the result of an item of a bulk route. "position" is only informed when not all items are returned and
+    "errors" when the fields of the item are invalid.
+    """
+
+    result = {'Status': status_code, 'Message': message} if position is None else \
+        {'Position': position, 'Status': status_code, 'Message': message}
+    if errors is not None:
+        result['Errors'] = errors
+    return result
+
+
+def error_payload(message: str, errors: dict = None):
+    """ Returns the payload of an error response, with the errors of the fields of the task if they are informed """
+
+    if errors is None:
+        return {'Message': message}
+    return {'Message': message, 'Errors': errors}
+
+
+def is_task_name(obj):
+    """ Verifies if the parameter "obj" may be the name of a task (a non empty string) """
+
+    return isinstance(obj, str) and obj != ''
+
+
+def is_status_valid(status: str):
+    """
+    Verifies if the parameter "status" is valid.
+
+    The status is valid if it is in "Task.valid_status", in any case.
+
+    It returns True if "status" is valid and return False if does not.
+    """
+
+    return status in Task.valid_status or status.lower() in Task.valid_status
+
+
+def _loads_or_none(line: str):
+    """ Returns the JSON value of "line" or None if it is not valid JSON """
+
+    try:
+        return task_json.loads(line)
+    except ValueError:
+        return None
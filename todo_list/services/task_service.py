@@ -1,11 +1,23 @@
+import functools
 import logging
 import os
+from flask import Response
 from flask import jsonify
+from flask import make_response
 from flask import request
 
+from todo_list.repositories import idempotency_keys
 from todo_list.repositories import task_repository
+from todo_list.repositories.errors import DuplicatedTaskError
+from todo_list.repositories.errors import InvalidPageTokenError
+from todo_list.repositories.single_flight import SharedTasks
 from todo_list.models.task import Task
+from todo_list.services import conditional_requests
+from todo_list.services import idempotent_requests
+from todo_list.services import task_json
 from todo_list.services import task_messages
+from todo_list.services import task_payloads
+from todo_list.services import task_transfer
 
 """
 This module contains the business rule for manipulating tasks
@@ -14,55 +26,127 @@ This module contains the business rule for manipulating tasks
 logger = logging.getLogger(os.environ.get('LOGGER_NAME'))
 
 
+def _idempotent(function):
+    """
+    Makes a write safe to retry, when idempotency keys are enabled: the response to the first request with an
+    "Idempotency-Key" header is saved and replayed to the requests that send the key again (see idempotent_requests).
+
+    It may return 400 if the key is invalid, 409 if the first request is still in progress or 422 if the key was sent
+    with another request.
+    """
+
+    @functools.wraps(function)
+    def wrapper(req: request, *args):
+        key, message = idempotent_requests.read_key(req.headers)
+        if message is not None:
+            logger.info('Invalid idempotency key')
+            return jsonify({'Message': message}), 400
+
+        store = idempotency_keys.store
+        if key is None or store is None:
+            return function(req, *args)
+
+        # Claims the key, unless a previous request did it
+        request_fingerprint = idempotent_requests.fingerprint(req.method, req.path, req.get_data())
+        record = store.claim(key, request_fingerprint)
+        if record is not None:
+            status_code, message, headers = idempotent_requests.replay(record, request_fingerprint)
+            logger.info('Answering a repeated idempotency key with %s', status_code)
+            if message is not None:
+                return jsonify({'Message': message}), status_code, headers
+            return Response(record['body'], status=status_code, mimetype='application/json', headers=headers)
+
+        # Saves the response to be replayed, or releases the key so the request can be retried
+        try:
+            response = make_response(function(req, *args))
+        except Exception:
+            store.release(key)
+            raise
+        if idempotent_requests.is_saved(response.status_code):
+            store.save(key, response.status_code, response.get_data())
+        else:
+            store.release(key)
+        return response
+
+    return wrapper
+
+
+@_idempotent
 def add(req: request):
     """
     Adds a new task.
 
     It may return 400 if payload does not contain the necessary fields (name, description and status).
-    It may return 400 if payload contains the name of a task that is already registered.
     It may return 400 if payload contains status with invalid value.
+    It may return 400 if payload contains the name of a task that is already registered.
     If everything goes well, it returns 201.
+    A retry with the same "Idempotency-Key" header gets the same response (see _idempotent).
     """
-    logger.info(f'HTTP Request to add a new task with data: {req}')
+    logger.debug('HTTP Request to add a new task with data: %s', req)
     request_payload = req.get_json()
-    logger.info(f'HTTP Request to add a new task with payload: {request_payload}')
+    logger.debug('HTTP Request to add a new task with payload: %s', request_payload)
+
+    # Verifies if payload is a valid task
+    new_task, message, errors = task_payloads.read_task(request_payload)
+    if message is not None:
+        logger.info(message)
+        return jsonify(task_payloads.error_payload(message, errors)), 400
+
+    # Creates the task! The unique index on "name" rejects duplicated names
+    try:
+        task_repository.insert(new_task)
+    except DuplicatedTaskError:
+        logger.info('Duplicated task name')
+        return jsonify({'Message': task_messages.duplicated}), 400
+    logger.info('Task created')
+    return jsonify({'Message': task_messages.created}), 201
+
+
+def add_bulk(req: request):
+    """
+    Adds a list of new tasks, sent as a JSON array or as NDJSON (one task per line).
 
-    # Verifies if payload is valid
-    if not _is_a_task(request_payload):
+    Every task is validated by the same rules of "add" and the valid ones are created with a single write.
+    It may return 400 if the body is not a list of tasks.
+    Otherwise, it returns 200 with the result of each task, in the order they were sent.
+    """
+    logger.debug('HTTP Request to add a list of tasks with data: %s', req)
+
+    request_payload = _get_bulk_payload(req)
+
+    # Verifies if payload is a list
+    if request_payload is None:
         logger.info('Incorrect parameters')
         return jsonify({'Message': task_messages.incorrect_parameters}), 400
 
-    new_task: Task = Task(request_payload['name'], request_payload['description'],
-                          request_payload['status'].lower())
+    results, new_tasks, positions = task_payloads.read_new_tasks(request_payload)
 
-    # Verifies if there is a task with same name
-    if task_repository.is_registered(new_task.name):
-        logger.info('Duplicated task name')
-        return jsonify({'Message': task_messages.duplicated}), 400
-
-    # Verifies if payload "status" is valid
-    if not _is_status_valid(new_task.status):
-        logger.info('Invalid status')
-        return jsonify({'Message': task_messages.invalid_status}), 400
+    # Creates the tasks! The unique index on "name" rejects the ones already registered
+    duplicated = task_repository.insert_many(new_tasks)
 
-    # Creates the task!
-    task_repository.insert(new_task)
-    logger.info('Task created')
-    return jsonify({'Message': task_messages.created}), 201
+    logger.info('%s of %s tasks created', len(new_tasks) - len(duplicated), len(results))
+    return jsonify(task_payloads.add_bulk_results(results, positions, duplicated)), 200
 
 
 def get_by_name(req: request, task_name: str):
     """
     Returns a task based on its name.
 
+    It may return 304 if the client already has the current tasks ("If-None-Match" or "If-Modified-Since").
     It may return 404 if task was not found.
     If the task was found, returns 200.
     """
-    logger.info(f'HTTP Request to get a task by name with data: {req}')
-    logger.info(f'Looking for a task with name "{task_name}"')
+    logger.debug('HTTP Request to get a task by name with data: %s', req)
+    logger.info('Looking for a task with name "%s"', task_name)
+
+    # Answers clients that already have the current tasks, without reading them
+    version = task_repository.version()
+    if conditional_requests.is_not_modified(req, version):
+        logger.info('Task not modified')
+        return '', 304, conditional_requests.validators(version)
 
     # Gets a task by its name
-    task_found: Task = task_repository.get_by_name(task_name)
+    task_found: Task = task_repository.get_by_name(task_name, version)
 
     # Verifies if task exists
     if task_found is None:
@@ -72,105 +156,314 @@ def get_by_name(req: request, task_name: str):
     # Returns the task!
     logger.info('Returning task')
     return jsonify({'name': task_found['name'], 'description': task_found['description'],
-                    'status': task_found['status']}), 200
+                    'status': task_found['status']}), 200, conditional_requests.validators(version)
 
 
 def get_by_status(req: request, status: str):
     """
     Returns a list of tasks based on its status.
 
+    The list may be paginated ("limit" and "after" parameters) or streamed ("stream" parameter).
+
     It may return 400 if the status is invalid
+    It may return 400 if pagination parameters are invalid.
+    It may return 304 if the client already has the current tasks ("If-None-Match" or "If-Modified-Since").
     If the status is valid, returns 200.
     """
-    logger.info(f'HTTP Request to get tasks by status with data: {req}')
-    logger.info(f'Looking for tasks with status equal to "{status}"')
+    logger.debug('HTTP Request to get tasks by status with data: %s', req)
+    logger.info('Looking for tasks with status equal to "%s"', status)
 
     status = status.lower()
 
     # Verifies if status is valid
-    if not _is_status_valid(status):
+    if not task_payloads.is_status_valid(status):
         logger.info('Invalid status')
         return jsonify({'Message': task_messages.invalid_status}), 400
 
     # Gets tasks by status
-    tasks_found: list = task_repository.get_by_status(status)
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
 
-    # Creates list to return tasks
-    logger.info('Returning tasks')
-    return_list = []
-    for t in tasks_found:
-        if _is_a_task(t):
-            return_list.append({'name': t['name'], 'description': t['description'],
-                                'status': t['status']})
+        # Answers clients that already have the current tasks, without reading them
+        version = task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = task_repository.get_by_status(status, limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
 
     # Returns tasks!
-    return jsonify(return_list), 200
+    logger.info('Returning tasks')
+    return _tasks_response(tasks_found, limit, stream, version)
 
 
 def get_all(req: request):
     """
     Returns a list with all the tasks.
 
-    It always returns 200.
+    The list may be paginated ("limit" and "after" parameters) or streamed ("stream" parameter).
+
+    It may return 400 if pagination parameters are invalid.
+    It may return 304 if the client already has the current tasks ("If-None-Match" or "If-Modified-Since").
+    Otherwise, it returns 200.
     """
-    logger.info(f'HTTP Request to get all tasks with data: {req}')
+    logger.debug('HTTP Request to get all tasks with data: %s', req)
     logger.info('Returning all tasks')
 
     # Gets all tasks
-    tasks_found: list = task_repository.get_all()
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
 
-    # Creates list to return tasks
-    return_list = []
-    for t in tasks_found:
-        if _is_a_task(t):
-            return_list.append({'name': t['name'], 'description': t['description'],
-                                'status': t['status']})
+        # Answers clients that already have the current tasks, without reading them
+        version = task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = task_repository.get_all(limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
 
     # Returns all tasks!
-    return jsonify(return_list), 200
+    return _tasks_response(tasks_found, limit, stream, version)
+
+
+def search(req: request):
+    """
+    Returns the tasks whose names start with "prefix" and/or that have any of the words of "q" in their names or
+    descriptions. Tasks are ordered by name or, when "q" is informed, by relevance.
+
+    The list may be paginated ("limit" and "after" parameters) or streamed ("stream" parameter).
+
+    It may return 400 if neither "prefix" nor "q" are informed.
+    It may return 400 if pagination parameters are invalid.
+    It may return 304 if the client already has the current tasks ("If-None-Match" or "If-Modified-Since").
+    Otherwise, it returns 200.
+    """
+    logger.debug('HTTP Request to search tasks with data: %s', req)
+
+    prefix, text, message = task_payloads.read_search_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid search parameters')
+        return jsonify({'Message': message}), 400
+    logger.info('Searching tasks with prefix "%s" and text "%s"', prefix, text)
+
+    # Searches tasks
+    try:
+        limit, after, stream = task_payloads.read_page_parameters(req.args)
+
+        # Answers clients that already have the current tasks, without reading them
+        version = task_repository.version()
+        if conditional_requests.is_not_modified(req, version):
+            logger.info('Tasks not modified')
+            return '', 304, conditional_requests.validators(version)
+
+        tasks_found = task_repository.search(prefix, text, limit, after)
+    except (ValueError, InvalidPageTokenError):
+        logger.info('Invalid pagination parameters')
+        return jsonify({'Message': task_messages.invalid_page}), 400
+
+    # Returns the tasks found!
+    return _tasks_response(tasks_found, limit, stream, version,
+                           lambda return_list: task_repository.next_search_token(text, after, return_list))
+
+
+def export(req: request):
+    """
+    Streams all the tasks as NDJSON (one task per line, ordered by name), gzip-compressed if "compress" is "gzip", so
+    they can be backed up or imported by "import_tasks" in another environment.
+
+    Tasks are encoded while they are read, so any number of tasks is exported in constant memory. How many tasks
+    there should be is sent on "X-Estimated-Count", from the counts of "stats", so clients can show the progress.
+
+    It may return 400 if "compress" is invalid.
+    Otherwise, it returns 200.
+    """
+    logger.debug('HTTP Request to export the tasks with data: %s', req)
+
+    compressed, message = task_transfer.read_export_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid export parameters')
+        return jsonify({'Message': message}), 400
+
+    estimated_count = sum(task_repository.count_by_status().values())
+    chunks = _stream_export(task_repository.export())
+    if compressed:
+        chunks = task_transfer.gzip_chunks(chunks)
+
+    logger.info('Exporting about %s tasks', estimated_count)
+    return Response(chunks, mimetype=task_transfer.gzip_mimetype if compressed else task_payloads.ndjson_mimetype), \
+        200, task_transfer.export_headers(compressed, estimated_count)
+
+
+def import_tasks(req: request):
+    """
+    Imports tasks from a NDJSON body (one task per line, as sent by "export"), which may be gzip-compressed
+    ("Content-Encoding: gzip" or "application/gzip").
+
+    The body is read in chunks of task_transfer.chunk_size lines, whose tasks are validated by the same rules of
+    "add" and written with a single write, so any number of tasks is imported in constant memory. Tasks with
+    registered names are skipped or, if "mode" is "upsert", replaced.
+
+    It may return 400 if "mode" is invalid.
+    It may return 400 if the body is not valid gzip, after importing the lines read before the error.
+    Otherwise, it returns 200 with how many lines were read, created, updated, skipped and invalid, and the errors of
+    the first invalid lines.
+    """
+    logger.debug('HTTP Request to import tasks with data: %s', req)
+
+    upsert, message = task_transfer.read_import_parameters(req.args)
+    if message is not None:
+        logger.info('Invalid import parameters')
+        return jsonify({'Message': message}), 400
+
+    reader = task_transfer.NdjsonReader(task_transfer.is_compressed(req.mimetype, req.headers))
+    progress = task_transfer.ImportProgress()
+    items = []
+    try:
+        for data in iter(functools.partial(req.stream.read, task_transfer.read_size), b''):
+            for item in reader.feed(data):
+                items.append(item)
+                if len(items) == task_transfer.chunk_size:
+                    _import_chunk(items, upsert, progress)
+                    items = []
+        items.extend(reader.close())
+        message, status_code = task_messages.imported, 200
+    except ValueError:
+        logger.info('Invalid gzip body')
+        message, status_code = task_messages.invalid_import_body, 400
+
+    # Writes the last chunk, also when the body was cut short
+    _import_chunk(items, upsert, progress)
+
+    logger.info('Import finished with %s lines read', progress.read)
+    return jsonify(progress.payload(message)), status_code
+
+
+def stats(req: request):
+    """
+    Returns how many tasks there are of each status and their total, always with 200.
+
+    The counts may be a few seconds stale (see task_repository.count_by_status), so dashboards do not read every task.
+    """
+    logger.debug('HTTP Request to get the stats of tasks with data: %s', req)
+
+    counts = task_repository.count_by_status()
+
+    logger.info('Returning stats')
+    return jsonify(task_payloads.status_counts(counts)), 200
+
+
+def events(req: request):
+    """
+    Streams the changes of tasks as Server-Sent Events, so clients do not need to poll get_all.
 
+    Events are "create", "update", "delete" and "reset" (the client should read the tasks again). They may be
+    filtered by "status" and reconnecting clients resume after the "Last-Event-ID" header (or "after" parameter).
 
+    It may return 400 if the status is invalid.
+    Otherwise, it returns 200 and keeps streaming until the client disconnects.
+    """
+    logger.debug('HTTP Request to watch the changes of tasks with data: %s', req)
+
+    status, after, message = task_payloads.read_events_parameters(req.args, req.headers)
+    if message is not None:
+        logger.info('Invalid status')
+        return jsonify({'Message': message}), 400
+
+    changes = task_repository.watch(status, after)
+
+    logger.info('Streaming changes of tasks')
+    return Response(_stream_events(changes), mimetype=task_payloads.event_stream_mimetype), 200, \
+        task_payloads.event_stream_headers
+
+
+@_idempotent
 def update(req: request, task_name: str):
     """
     Updates an existing task.
 
-    It may return 404 if task was not found.
     It may return 400 if payload does not contain the necessary fields (name, description and status).
-    It may return 400 if payload contains the name of a task that is already registered.
     It may return 400 if payload contains status with invalid value.
+    It may return 400 if payload contains the name of a task that is already registered.
+    It may return 404 if task was not found.
     If everything goes well, it returns 200.
+    A retry with the same "Idempotency-Key" header gets the same response (see _idempotent).
     """
-    logger.info(f'HTTP Request to update a task with data: {req}')
+    logger.debug('HTTP Request to update a task with data: %s', req)
     request_payload = req.get_json()
-    logger.info(f'HTTP Request to update task with name {task_name} with payload: {request_payload}')
+    logger.debug('HTTP Request to update task with name %s with payload: %s', task_name, request_payload)
+
+    # Verifies if payload is a valid task
+    task_with_new_values, message, errors = task_payloads.read_task(request_payload)
+    if message is not None:
+        logger.info(message)
+        return jsonify(task_payloads.error_payload(message, errors)), 400
+
+    # Updates the task! The unique index on "name" rejects renaming to a registered name
+    try:
+        task_found = task_repository.update(task_name, task_with_new_values)
+    except DuplicatedTaskError:
+        logger.info('Duplicated task name')
+        return jsonify({'Message': task_messages.duplicated}), 400
 
     # Verifies if task exists
-    if not task_repository.is_registered(task_name):
+    if not task_found:
         logger.info('Task not found')
         return jsonify({'Message': task_messages.not_found}), 404
 
-    # Verifies if payload is valid
-    if not _is_a_task(request_payload):
+    logger.info('Task updated')
+    return jsonify({'Message': task_messages.updated}), 200
+
+
+def update_bulk(req: request):
+    """
+    Updates a list of tasks or all tasks with a status.
+
+    The body may be a list (JSON array or NDJSON) of {"task_name": ..., "task": {...}} items, each validated by the
+    same rules of "update", or an object {"status": ..., "set": {...}} that sets "description" and/or "status" on
+    all tasks with "status". Either way, tasks are updated with a single write.
+
+    It may return 400 if the body is neither of them.
+    It may return 400 if any of the status of the object is invalid.
+    Otherwise, it returns 200 with how many tasks were matched and modified and the result of rejected items.
+    """
+    logger.debug('HTTP Request to update a list of tasks with data: %s', req)
+
+    request_payload = req.get_json(silent=True) if req.mimetype != task_payloads.ndjson_mimetype else None
+
+    # Updates all tasks with a status
+    if isinstance(request_payload, dict):
+        status, values, message = task_payloads.read_status_update(request_payload)
+        if message is not None:
+            logger.info(message)
+            return jsonify({'Message': message}), 400
+
+        matched, modified = task_repository.update_by_status(status, values)
+
+        logger.info('%s tasks matched and %s tasks updated', matched, modified)
+        return jsonify({'Message': task_messages.updated, 'Matched': matched, 'Modified': modified,
+                        'Results': []}), 200
+
+    request_payload = _get_bulk_payload(req)
+
+    # Verifies if payload is a list
+    if request_payload is None:
         logger.info('Incorrect parameters')
         return jsonify({'Message': task_messages.incorrect_parameters}), 400
 
-    task_with_new_values: Task = Task(request_payload['name'], request_payload['description'],
-                                      request_payload['status'].lower())
+    results, updates, positions = task_payloads.read_updates(request_payload)
 
-    # Verifies if there is a task with same name
-    if task_repository.is_registered(task_with_new_values.name) and task_with_new_values.name != task_name:
-        logger.info('Duplicated task name')
-        return jsonify({'Message': task_messages.duplicated}), 400
+    # Updates the tasks! The unique index on "name" rejects renaming to a registered name
+    matched, modified, duplicated = task_repository.update_many(updates)
 
-    # Verifies if payload "status" is valid
-    if not _is_status_valid(task_with_new_values.status):
-        logger.info('Invalid status')
-        return jsonify({'Message': task_messages.invalid_status}), 400
-
-    # Updates the task!
-    task_repository.update(task_name, task_with_new_values)
-    logger.info('Task updated')
-    return jsonify({'Message': task_messages.updated}), 200
+    logger.info('%s tasks matched and %s tasks updated', matched, modified)
+    return jsonify({'Message': task_messages.updated, 'Matched': matched, 'Modified': modified,
+                    'Results': task_payloads.update_bulk_results(results, positions, duplicated)}), 200
 
 
 def delete(req: request, task_name: str):
@@ -180,42 +473,143 @@ def delete(req: request, task_name: str):
     It may return 404 if task was not found.
     It returns 200 if task was delete.
     """
-    logger.info(f'HTTP Request to delete a task with data: {req}')
-    logger.info(f'HTTP Request to delete task with name {task_name}')
+    logger.debug('HTTP Request to delete a task with data: %s', req)
+    logger.info('HTTP Request to delete task with name %s', task_name)
 
-    if not task_repository.is_registered(task_name):
+    # Deletes the task! Nothing is deleted if there is no task with the informed name
+    if not task_repository.delete(task_name):
         logger.info('Task not found')
         return jsonify({'Message': task_messages.not_found}), 404
 
     logger.info('Task deleted')
-    task_repository.delete(task_name)
     return jsonify({'Message': task_messages.deleted}), 200
 
 
-def _is_a_task(obj):
+def delete_bulk(req: request):
     """
-    Verifies if the parameter "obj" contains the necessary fields do be a task.
+    Deletes a list of tasks or all tasks with a status.
 
-    The necessary fields are "name", "description" and "status"
+    The body may be a JSON array of task names or an object {"status": ...}. Either way, tasks are deleted with a
+    single write.
 
-    If returns True if "obj" contains all fields and returns "False" if does not.
+    It may return 400 if the body is neither of them.
+    It may return 400 if the status is invalid.
+    Otherwise, it returns 200 with how many tasks were deleted.
     """
+    logger.debug('HTTP Request to delete a list of tasks with data: %s', req)
 
-    if 'name' not in obj or 'description' not in obj or 'status' not in obj or \
-            obj['name'] == '' or obj['description'] == '' or obj['status'] == '':
-        return False
-    return True
+    status, task_names, message = task_payloads.read_bulk_delete(req.get_json(silent=True))
+    if message is not None:
+        logger.info(message)
+        return jsonify({'Message': message}), 400
 
+    if status is not None:
+        deleted = task_repository.delete_by_status(status)
+    else:
+        deleted = task_repository.delete_many(task_names)
 
-def _is_status_valid(status: str):
-    """
-    Verifies if the parameter "status" is valid.
+    logger.info('%s tasks deleted', deleted)
+    return jsonify({'Message': task_messages.deleted, 'Deleted': deleted}), 200
+
+
+def _get_bulk_payload(req: request):
+    """ Returns the list of items sent to a bulk route (as a JSON array or NDJSON) or None if it is not a list """
 
-    The status is valid if it is in "Task.expected_status".
+    if req.mimetype == task_payloads.ndjson_mimetype:
+        return task_payloads.read_ndjson(req.get_data(as_text=True))
+
+    request_payload = req.get_json(silent=True)
+    return request_payload if isinstance(request_payload, list) else None
+
+
+def _tasks_response(tasks_found, limit: int, stream: str, version, next_token=None):
+    """
+    Creates the response for a list of tasks.
 
-    It returns True if "status" is valid and return False if does not.
+    If "stream" is informed, tasks are encoded one by one while the cursor is read, so the list is never held
+    in memory. Otherwise, a JSON array is returned and, if the page is full, the cursor of the next page is sent
+    on "X-Next-Cursor" header. The cursor is the page token of the last task, unless "next_token" returns another
+    one for the tasks of the page. The version of the tasks read is sent on "ETag" and "Last-Modified" headers.
     """
 
-    if status.lower() in Task.expected_status:
-        return True
-    return False
+    if stream is not None:
+        return Response(stream_formats[stream](tasks_found), mimetype=task_payloads.stream_mimetypes[stream]), 200, \
+            conditional_requests.validators(version)
+
+    # Tasks come from the repository with only the returned fields. Tasks shared by coalesced reads are encoded once
+    if isinstance(tasks_found, SharedTasks):
+        return_list, encoded = tasks_found, tasks_found.encoded(task_json.encode_tasks)
+    else:
+        return_list = list(tasks_found)
+        encoded = task_json.encode_tasks(return_list)
+
+    # Tasks are encoded as they were read, keeping the order of their fields
+    response = Response(encoded + b'\n', mimetype='application/json')
+    if limit is not None and len(return_list) == limit:
+        response.headers['X-Next-Cursor'] = task_repository.next_page_token(return_list[-1]) \
+            if next_token is None else next_token(return_list)
+    return response, 200, conditional_requests.validators(version)
+
+
+def _stream_json_array(tasks_found):
+    """ Yields the tasks as chunks of a JSON array """
+
+    separator = b'['
+    for t in tasks_found:
+        yield separator + task_json.fragment(t)
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+
+def _stream_ndjson(tasks_found):
+    """ Yields the tasks as lines of a NDJSON document """
+
+    for t in tasks_found:
+        yield task_json.fragment(t) + b'\n'
+
+
+def _stream_export(tasks_found):
+    """ Yields the tasks as lines of a NDJSON document, in chunks of task_transfer.chunk_size tasks """
+
+    # The JSON of the tasks is not cached, so exports do not evict the tasks that are read often
+    lines = []
+    exported = 0
+    for t in tasks_found:
+        lines.append(task_json.dumps(t) + b'\n')
+        if len(lines) == task_transfer.chunk_size:
+            yield b''.join(lines)
+            exported += len(lines)
+            if exported // task_transfer.progress_interval > (exported - len(lines)) // task_transfer.progress_interval:
+                logger.info('%s tasks exported', exported)
+            lines = []
+    yield b''.join(lines)
+    logger.info('Export finished with %s tasks', exported + len(lines))
+
+
+def _import_chunk(items, upsert, progress):
+    """ Writes the tasks of a chunk of (line number, value) items of an import with a single write """
+
+    new_tasks, skipped, errors = task_transfer.read_chunk(items, upsert)
+
+    # Tasks rejected for having registered names are skipped
+    created, updated, rejected = 0, 0, 0
+    if new_tasks and upsert:
+        created_positions, updated, duplicated = task_repository.upsert_many(new_tasks)
+        created, rejected = len(created_positions), len(duplicated)
+    elif new_tasks:
+        rejected = len(task_repository.insert_many(new_tasks))
+        created = len(new_tasks) - rejected
+
+    if progress.add(len(items), created, updated, skipped + rejected, errors):
+        logger.info('%s lines imported', progress.read)
+
+
+def _stream_events(changes):
+    """ Yields the changes of tasks as Server-Sent Events, starting with a keep-alive so the client gets the headers """
+
+    yield task_payloads.keep_alive_event
+    for event in changes:
+        yield task_payloads.server_sent_event(event)
+
+
+stream_formats = {'json': _stream_json_array, 'ndjson': _stream_ndjson}
@@ -0,0 +1,239 @@
+import zlib
+
+from todo_list.services import task_json
+from todo_list.services import task_messages
+from todo_list.services import task_payloads
+
+"""
+This module reads and writes the NDJSON documents of "/task/export" and "/task/import", used to back up the tasks
+and to move them between environments.
+
+Both run in constant memory, whatever the number of tasks: exports are encoded while the cursor is read and imports
+are read from the body in chunks of "chunk_size" tasks, each one written with a single write. Like the other pure
+helpers of the services, it does not depend on the web framework, so both stacks share it.
+"""
+
+# Mimetype of gzip-compressed exports and imports
+gzip_mimetype = 'application/gzip'
+
+# Name of the file of an export, without the extension of the compression
+export_filename = 'tasks.ndjson'
+
+# What an import does with a task whose name is registered: keep the registered task or replace it
+import_modes = ('skip', 'upsert')
+
+# Tasks read from the body of an import before they are written, and encoded by an export before they are sent
+chunk_size = 1000
+
+# Bytes read at a time from the body of an import (and produced at a time by its decompression)
+read_size = 65536
+
+# Longest line of an import, in bytes. Longer lines are reported as invalid without being held in memory
+max_line_size = 65536
+
+# Invalid lines of an import reported on "Errors". The others are only counted
+max_reported_errors = 100
+
+# Tasks exported or imported between the logs of the progress
+progress_interval = 100000
+
+
+class NdjsonReader:
+    """
+    Splits the chunks of a NDJSON body into its values, decompressing them if the body is gzip-compressed. It yields
+    (line number, value) pairs, the value being None for lines that are not valid JSON, and skips blank lines
+    """
+
+    def __init__(self, compressed=False):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+        self._pending = b''
+        self._oversized = False
+        self._line = 0
+
+    def feed(self, data):
+        """ Yields the values of the lines completed by a chunk of the body. It raises ValueError on invalid gzip """
+        if self._decompressor is None:
+            yield from self._split(data)
+            return
+
+        # Decompresses a bounded amount at a time, so a small chunk never expands into a large one
+        try:
+            while data:
+                decompressed = self._decompressor.decompress(data, read_size)
+                data = self._decompressor.unconsumed_tail
+                yield from self._split(decompressed)
+        except zlib.error as error:
+            raise ValueError(str(error))
+
+    def close(self):
+        """ Yields the value of the last line of the body, which may not end with a newline """
+        if self._decompressor is not None:
+            try:
+                yield from self._split(self._decompressor.flush())
+            except zlib.error as error:
+                raise ValueError(str(error))
+            if not self._decompressor.eof:
+                raise ValueError('truncated gzip body')
+
+        if self._pending.strip() or self._oversized:
+            yield self._value(self._pending)
+
+    def _split(self, data):
+        """ Yields the values of the complete lines of "data", keeping its last (incomplete) line pending """
+        lines = data.split(b'\n')
+        lines[0] = self._pending + lines[0]
+        self._pending = lines.pop()
+
+        for line in lines:
+            if line.strip() or self._oversized:
+                yield self._value(line)
+            self._oversized = False
+
+        # Drops a line that grew too long, reporting it once it ends
+        if len(self._pending) > max_line_size:
+            self._pending = b''
+            self._oversized = True
+
+    def _value(self, line):
+        """ Returns the (line number, value) of a line, counting the lines that were not blank """
+        self._line += 1
+        if self._oversized:
+            return self._line, None
+        try:
+            return self._line, task_json.loads(line)
+        except ValueError:
+            return self._line, None
+
+
+class ImportProgress:
+    """ Counts the lines of an import by outcome and keeps the errors of the first invalid ones """
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []
+
+    def add(self, read, created, updated, skipped, errors):
+        """
+        Counts the lines of a chunk, keeping the errors of the invalid ones while there are less than
+        max_reported_errors. It returns whether the progress should be logged
+        """
+        self.read += read
+        self.created += created
+        self.updated += updated
+        self.skipped += skipped
+        self.invalid += len(errors)
+        self.errors.extend(errors[:max(0, max_reported_errors - len(self.errors))])
+        return self.read // progress_interval > (self.read - read) // progress_interval
+
+    def payload(self, message):
+        """ Returns the payload of the response of the import """
+        return {'Message': message, 'Read': self.read, 'Created': self.created, 'Updated': self.updated,
+                'Skipped': self.skipped, 'Invalid': self.invalid, 'Errors': self.errors}
+
+
+def configure(new_chunk_size=1000, new_max_reported_errors=100):
+    """ Sets how many tasks of an import are written at once and how many invalid lines are reported """
+    global chunk_size, max_reported_errors
+    chunk_size = new_chunk_size
+    max_reported_errors = new_max_reported_errors
+
+
+def read_export_parameters(args):
+    """
+    Reads the parameters of an export: "compress" may be "gzip".
+
+    It returns whether the export is compressed and None if the parameters are valid. Otherwise, it returns None and
+    the message explaining why they are not.
+    """
+
+    compress = args.get('compress')
+    if compress not in (None, '', 'gzip'):
+        return None, task_messages.invalid_export
+    return compress == 'gzip', None
+
+
+def read_import_parameters(args):
+    """
+    Reads the parameters of an import: "mode" is "skip" (default) or "upsert".
+
+    It returns whether registered tasks are replaced and None if the parameters are valid. Otherwise, it returns None
+    and the message explaining why they are not.
+    """
+
+    mode = args.get('mode') or 'skip'
+    if mode not in import_modes:
+        return None, task_messages.invalid_import
+    return mode == 'upsert', None
+
+
+def is_compressed(mimetype, headers):
+    """ Verifies if the body of an import is gzip-compressed ("Content-Encoding: gzip" or "application/gzip") """
+
+    return mimetype == gzip_mimetype or headers.get('Content-Encoding', '').lower() == 'gzip'
+
+
+def export_headers(compressed, estimated_count):
+    """
+    Returns the headers of an export: the file it should be saved as and the number of tasks it should have (read
+    from the counts by status, which may be a few seconds stale), so clients can show the progress
+    """
+
+    filename = export_filename + '.gz' if compressed else export_filename
+    return {'Content-Disposition': f'attachment; filename="{filename}"', 'X-Estimated-Count': str(estimated_count)}
+
+
+def read_chunk(items, upsert):
+    """
+    Reads the (line number, value) items of a chunk of an import, each one validated by the same rules of "add".
+
+    It returns the tasks to be written, how many items were skipped for having the name of another item of the chunk
+    (the first one is kept or, when upserting, the last one) and the errors of the invalid items.
+    """
+
+    tasks = {}
+    skipped = 0
+    errors = []
+    for line, value in items:
+        task, message, task_errors = task_payloads.read_task(value)
+        if message is not None:
+            error = {'Line': line, 'Message': message}
+            if task_errors is not None:
+                error['Errors'] = task_errors
+            errors.append(error)
+            continue
+
+        if task.name in tasks:
+            skipped += 1
+            if not upsert:
+                continue
+            del tasks[task.name]
+        tasks[task.name] = task
+
+    return list(tasks.values()), skipped, errors
+
+
+def gzip_chunks(chunks):
+    """ Yields the gzip-compressed chunks of a streamed body """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def gzip_async_chunks(chunks):
+    """ Yields the gzip-compressed chunks of a streamed body of the async stack """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+